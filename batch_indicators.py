@@ -0,0 +1,301 @@
+"""
+Vectorized indicators for many symbols at once.
+
+All symbols' recent prices are held in one 2-D NumPy array (one row per symbol,
+oldest price first, newest in the last column). Rows with a shorter history are
+left-padded with NaN. Every function below works on the whole array in one pass:
+recursive indicators (EMA, Wilder RSI) loop over the time axis only, so the cost
+per cycle grows with the window length, not with the number of symbols. When all
+rows start at the same column (e.g. a long backtest series) the recursions are
+solved blockwise with matrix products instead (ema_scan).
+
+The values follow the per-symbol calculate_* helpers in cb-trading-db.py,
+including how calculate_macd lines up the short and long EMA series.
+
+Usage:
+    matrix = PriceMatrix(["ETH", "XRP"], window=200)
+    matrix.load("ETH", eth_history)
+    matrix.append({"ETH": 2510.2, "XRP": 0.61})
+    latest = compute_latest(matrix, coins_config)  # {"ETH": {"rsi": ..., ...}, ...}
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LONG_TERM_MA_PERIOD = 200
+SCAN_BLOCK = 128  # Columns per matrix product in ema_scan()
+
+
+class PriceMatrix:
+    """Recent prices of many symbols as one (symbols x window) array, newest price last."""
+
+    def __init__(self, symbols, window):
+        self.symbols = list(symbols)
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.prices = np.full((len(self.symbols), window), np.nan)
+
+    def load(self, symbol, prices):
+        """Replace a symbol's row with its price history (oldest first)."""
+        prices = np.asarray(list(prices), dtype=float)[-self.prices.shape[1]:]
+        row = self.prices[self.index[symbol]]
+        row[:] = np.nan
+        if len(prices):
+            row[-len(prices):] = prices
+
+    def append(self, prices):
+        """Append one new price per symbol from a {symbol: price} dict; other rows are left untouched."""
+        prices = {symbol: price for symbol, price in prices.items() if symbol in self.index and price}
+        if not prices:
+            return
+        rows = np.fromiter((self.index[symbol] for symbol in prices), dtype=np.intp, count=len(prices))
+        self.prices[rows, :-1] = self.prices[rows, 1:]
+        self.prices[rows, -1] = np.fromiter(prices.values(), dtype=float, count=len(prices))
+
+    def lengths(self):
+        """Number of prices held per symbol."""
+        return np.count_nonzero(~np.isnan(self.prices), axis=1)
+
+
+def rolling(values, window, reducer, **kwargs):
+    """Apply `reducer` (np.mean, np.std, np.min, ...) over a trailing window of every row.
+
+    Columns without a full window, or with a NaN inside it, are NaN (pandas .rolling() semantics).
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if window <= values.shape[1]:
+        out[:, window - 1:] = reducer(sliding_window_view(values, window, axis=1), axis=-1, **kwargs)
+    return out
+
+
+def available(values, required):
+    """Mask of columns where a row has seen at least `required` values."""
+    return np.cumsum(~np.isnan(values), axis=1) >= required
+
+
+def common_start(values):
+    """First column from which every row is valid, when all rows share the same leading-NaN prefix (else None)."""
+    valid = ~np.isnan(values)
+    column_valid = valid.all(axis=0)
+    start = int(np.argmax(column_valid)) if column_valid.any() else values.shape[1]
+    if column_valid[start:].all() and not valid[:, :start].any():
+        return start
+    return None
+
+
+def ema_scan(values, alpha, initial):
+    """e[t] = (1 - alpha) * e[t-1] + alpha * values[t] along every row, starting from e[-1] = initial.
+
+    The recurrence is solved SCAN_BLOCK columns at a time with one matrix product
+    (powers of the decay never exceed the block length), so only block boundaries
+    are carried in Python. `values` must not contain NaN.
+    """
+    rows, columns = values.shape
+    if columns == 0:
+        return np.empty((rows, 0))
+    block = min(SCAN_BLOCK, columns)
+    blocks = -(-columns // block)
+    padded = np.zeros((rows, blocks * block))
+    padded[:, :columns] = values
+
+    decay = 1 - alpha
+    lag = np.arange(block)[:, None] - np.arange(block)[None, :]
+    weights = np.where(lag >= 0, decay ** np.maximum(lag, 0), 0.0)  # weights[i, j] = decay^(i-j), j <= i
+    carry = decay ** np.arange(1, block + 1)  # Weight of the state before the block at each position
+
+    out = alpha * (padded.reshape(rows, blocks, block) @ weights.T)
+    state = np.asarray(initial, dtype=float)
+    for b in range(blocks):
+        out[:, b, :] += state[:, None] * carry
+        state = out[:, b, -1]
+    return out.reshape(rows, -1)[:, :columns]
+
+
+def ema(values, period):
+    """EMA of every row, seeded with the SMA of the row's first `period` values (as calculate_ema)."""
+    values = np.asarray(values, dtype=float)
+    rows, columns = values.shape
+    alpha = 2 / (period + 1)
+    out = np.full(values.shape, np.nan)
+
+    start = common_start(values)
+    if start is not None:
+        # All rows start together: seed, then solve the recurrence blockwise
+        if columns - start >= period:
+            seed = values[:, start:start + period].sum(axis=1) / period
+            out[:, start + period - 1] = seed
+            out[:, start + period:] = ema_scan(values[:, start + period:], alpha, seed)
+        return out
+
+    seen = np.zeros(rows, dtype=np.int64)
+    seed = np.zeros(rows)
+    value = np.full(rows, np.nan)
+    for t in range(columns):
+        column = values[:, t]
+        valid = ~np.isnan(column)
+        seen += valid
+        seeding = valid & (seen <= period)
+        seed[seeding] += column[seeding]
+        ready = valid & (seen == period)
+        value[ready] = seed[ready] / period
+        step = valid & (seen > period)
+        value[step] += (column[step] - value[step]) * alpha
+        out[:, t] = value
+    return out
+
+
+def macd(prices, short_window=12, long_window=26, signal_window=9):
+    """MACD line, signal line and histogram series for every row.
+
+    Like calculate_macd, the two EMA series are paired from their first values, so
+    each long EMA meets the short EMA from (long_window - short_window) prices earlier,
+    and nothing is reported before a row has long_window + signal_window prices.
+    """
+    prices = np.asarray(prices, dtype=float)
+    short_ema = ema(prices, short_window)
+    long_ema = ema(prices, long_window)
+    lag = long_window - short_window
+    if lag > 0:
+        short_ema = np.concatenate([np.full((prices.shape[0], lag), np.nan), short_ema[:, :-lag]], axis=1)
+    elif lag < 0:
+        long_ema = np.concatenate([np.full((prices.shape[0], -lag), np.nan), long_ema[:, :lag]], axis=1)
+
+    macd_line = short_ema - long_ema
+    signal_line = ema(macd_line, signal_window)
+    histogram = macd_line - signal_line
+
+    ready = available(prices, long_window + signal_window)
+    return (np.where(ready, macd_line, np.nan),
+            np.where(ready, signal_line, np.nan),
+            np.where(ready, histogram, np.nan))
+
+
+def rsi(prices, period=14):
+    """Wilder RSI series for every row, seeded with the mean gain/loss of the first `period` changes."""
+    prices = np.asarray(prices, dtype=float)
+    changes = np.diff(prices, axis=1)
+    gains = np.maximum(changes, 0)
+    losses = np.maximum(-changes, 0)
+
+    rows = prices.shape[0]
+    out = np.full(prices.shape, np.nan)
+
+    start = common_start(changes)
+    if start is not None:
+        # All rows start together: Wilder smoothing is an EMA with alpha = 1 / period
+        if changes.shape[1] - start >= period:
+            avg_gain = np.full(changes.shape, np.nan)
+            avg_loss = np.full(changes.shape, np.nan)
+            seed_gain = gains[:, start:start + period].sum(axis=1) / period
+            seed_loss = losses[:, start:start + period].sum(axis=1) / period
+            avg_gain[:, start + period - 1] = seed_gain
+            avg_loss[:, start + period - 1] = seed_loss
+            avg_gain[:, start + period:] = ema_scan(gains[:, start + period:], 1 / period, seed_gain)
+            avg_loss[:, start + period:] = ema_scan(losses[:, start + period:], 1 / period, seed_loss)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                # An average loss of 0 means RS = inf, i.e. an RSI of 100
+                out[:, 1:] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+        return out
+
+    seen = np.zeros(rows, dtype=np.int64)
+    gain_sum = np.zeros(rows)
+    loss_sum = np.zeros(rows)
+    avg_gain = np.full(rows, np.nan)
+    avg_loss = np.full(rows, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for t in range(changes.shape[1]):
+            valid = ~np.isnan(changes[:, t])
+            seen += valid
+            seeding = valid & (seen <= period)
+            gain_sum[seeding] += gains[seeding, t]
+            loss_sum[seeding] += losses[seeding, t]
+            ready = valid & (seen == period)
+            avg_gain[ready] = gain_sum[ready] / period
+            avg_loss[ready] = loss_sum[ready] / period
+            step = valid & (seen > period)
+            avg_gain[step] = (avg_gain[step] * (period - 1) + gains[step, t]) / period
+            avg_loss[step] = (avg_loss[step] * (period - 1) + losses[step, t]) / period
+            # An average loss of 0 means RS = inf, i.e. an RSI of 100
+            out[:, t + 1] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    return out
+
+
+def stochastic_rsi(rsi_values, period=14, k_period=3, d_period=3):
+    """%K and %D series of the stochastic RSI for every row (as calculate_stochastic_rsi)."""
+    rsi_values = np.asarray(rsi_values, dtype=float)
+    lowest = rolling(rsi_values, period, np.min)
+    highest = rolling(rsi_values, period, np.max)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stoch_rsi = (rsi_values - lowest) / (highest - lowest)
+    k_line = rolling(stoch_rsi, k_period, np.mean)
+    d_line = rolling(k_line, d_period, np.mean)
+    return k_line, d_line
+
+
+def bollinger_bands(prices, period=20, num_std_dev=2):
+    """Middle, upper and lower Bollinger band series for every row (sample std, as pandas)."""
+    middle_band = rolling(prices, period, np.mean)
+    std_dev = rolling(prices, period, np.std, ddof=1)
+    return middle_band, middle_band + num_std_dev * std_dev, middle_band - num_std_dev * std_dev
+
+
+def volatility(prices, volatility_window):
+    """Standard deviation of returns over the last `volatility_window` prices; 0.0 until a row has them."""
+    prices = np.asarray(prices, dtype=float)
+    out = np.zeros(prices.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(prices, axis=1) / prices[:, :-1]
+    out[:, 1:] = np.nan_to_num(rolling(returns, volatility_window - 1, np.std), nan=0.0)
+    return out
+
+
+def moving_average(prices, window):
+    return rolling(prices, window, np.mean)
+
+
+def compute_series(prices, macd_short_window=12, macd_long_window=26, macd_signal_window=9,
+                   rsi_period=14, volatility_window=20, trend_window=50):
+    """Every indicator series for a (symbols x time) price array that shares one set of settings."""
+    macd_line, signal_line, macd_histogram = macd(prices, macd_short_window, macd_long_window, macd_signal_window)
+    rsi_values = rsi(prices, rsi_period)
+    stoch_k, stoch_d = stochastic_rsi(rsi_values)
+    bollinger_mid, bollinger_upper, bollinger_lower = bollinger_bands(prices)
+    return {
+        "macd_line": macd_line,
+        "signal_line": signal_line,
+        "macd_histogram": macd_histogram,
+        "rsi": rsi_values,
+        "stoch_k": stoch_k,
+        "stoch_d": stoch_d,
+        "bollinger_mid": bollinger_mid,
+        "bollinger_upper": bollinger_upper,
+        "bollinger_lower": bollinger_lower,
+        "volatility": volatility(prices, volatility_window),
+        "moving_avg": moving_average(prices, trend_window),
+        "long_term_ma": moving_average(prices, LONG_TERM_MA_PERIOD),
+    }
+
+
+def settings_key(settings):
+    # process_symbol uses calculate_rsi's default period of 14, not rsi_period
+    return (settings["macd_short_window"], settings["macd_long_window"], settings["macd_signal_window"],
+            14, settings["volatility_window"], settings["trend_window"])
+
+
+def compute_latest(matrix, coins_config):
+    """Latest indicator values for every symbol in `matrix`, in one vectorized pass per distinct coin setting.
+
+    Returns {symbol: {indicator: value or None}}.
+    """
+    groups = {}
+    for symbol in matrix.symbols:
+        groups.setdefault(settings_key(coins_config[symbol]), []).append(matrix.index[symbol])
+
+    latest = {}
+    for key, rows in groups.items():
+        series = compute_series(matrix.prices[rows], *key)
+        for position, row in enumerate(rows):
+            latest[matrix.symbols[row]] = {
+                name: (None if np.isnan(values[position, -1]) else float(values[position, -1]))
+                for name, values in series.items()
+            }
+    return latest
@@ -0,0 +1,90 @@
+"""
+Helpers to import a bot script (e.g. cb-trading-db.py) inside a benchmark.
+
+The bots read `config.json` from the working directory at import time, so the
+script is imported from a temporary directory holding a synthetic config with a
+throwaway EC key. Nothing connects to Coinbase or PostgreSQL on import.
+"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_private_key_pem():
+    key = ec.generate_private_key(ec.SECP256R1())
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode("utf-8")
+
+
+def make_coin_settings(**overrides):
+    settings = {
+        "enabled": True,
+        "buy_percentage": -3,
+        "sell_percentage": 3,
+        "rebuy_discount": 2,
+        "volatility_window": 20,
+        "trend_window": 50,
+        "macd_short_window": 12,
+        "macd_long_window": 26,
+        "macd_signal_window": 9,
+        "rsi_period": 14,
+        "min_order_sizes": {"buy": 0.01, "sell": 0.0001},
+        "precision": {"price": 4, "amount": 6},
+    }
+    settings.update(overrides)
+    return settings
+
+
+def make_config(symbols=("ETH",), **extra):
+    config = {
+        "name": "organizations/bench/apiKeys/bench",
+        "privateKey": make_private_key_pem(),
+        "buy_percentage": 10,
+        "sell_percentage": 10,
+        "stop_loss_percentage": -10,
+        "telegram": {"enabled": False},
+        "database": {"host": "localhost", "port": "5432", "name": "bench", "user": "bench", "password": "bench"},
+        "coins": {symbol: make_coin_settings() for symbol in symbols},
+    }
+    config.update(extra)
+    return config
+
+
+def load_bot(script="cb-trading-db.py", config=None):
+    """Import a bot script as a module using `config` (a dict) as its config.json."""
+    config = config if config is not None else make_config()
+    module_name = os.path.splitext(script)[0].replace("-", "_")
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)  # Modules the bots import (e.g. strategy.py)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "config.json"), "w") as f:
+            json.dump(config, f)
+        os.chdir(workdir)
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_DIR, script))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+        finally:
+            os.chdir(cwd)
+    return module
+
+
+def git_revision():
+    """Short commit hash of the checkout, so JSON results can be compared between commits."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,165 @@
+"""
+Benchmark: one aiohttp session per request vs. the shared keep-alive session.
+
+Runs a local HTTPS server (self-signed certificate) and fires the same request
+pattern the trading bots use every cycle: a burst of concurrent GETs (one per
+coin) followed by a few sequential calls (balances / orders).
+
+Reports, for both strategies:
+  - handshakes: number of new TCP+TLS connections opened by the client
+  - p50 / p99 request latency in milliseconds
+
+Usage:
+    python benchmarks/bench_http_session.py [--coins 20] [--cycles 50] [--json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import ssl
+import statistics
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+HOST = "127.0.0.1"
+
+
+def make_ssl_context(workdir):
+    """Create a server SSL context backed by a throwaway self-signed certificate."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, HOST)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_file = os.path.join(workdir, "cert.pem")
+    key_file = os.path.join(workdir, "key.pem")
+    with open(cert_file, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+async def start_server(ssl_context):
+    async def product(request):
+        return web.json_response({"product_id": request.match_info["product_id"], "price": "1.2345"})
+
+    app = web.Application()
+    app.router.add_get("/api/v3/brokerage/products/{product_id}", product)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0, ssl_context=ssl_context)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+
+def make_trace_config(counter):
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, ctx, params):
+        counter["handshakes"] += 1
+
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+
+async def timed_get(session, url, latencies):
+    start = time.perf_counter()
+    async with session.get(url, ssl=False) as response:
+        await response.json()
+    latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_per_request_sessions(base_url, coins, cycles):
+    """The old behaviour: a new ClientSession (and connection) for every call."""
+    counter = {"handshakes": 0}
+    latencies = []
+
+    async def one_request(url):
+        async with aiohttp.ClientSession(trace_configs=[make_trace_config(counter)]) as session:
+            await timed_get(session, url, latencies)
+
+    for _ in range(cycles):
+        await asyncio.gather(*[one_request(f"{base_url}/COIN{i}-USDC") for i in range(coins)])
+        for _ in range(3):
+            await one_request(f"{base_url}/ETH-USDC")
+    return counter["handshakes"], latencies
+
+
+async def run_shared_session(base_url, coins, cycles, pool_size):
+    """The new behaviour: one long-lived session with a bounded keep-alive connector."""
+    counter = {"handshakes": 0}
+    latencies = []
+    connector = aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=10),
+        trace_configs=[make_trace_config(counter)],
+    ) as session:
+        for _ in range(cycles):
+            await asyncio.gather(*[timed_get(session, f"{base_url}/COIN{i}-USDC", latencies) for i in range(coins)])
+            for _ in range(3):
+                await timed_get(session, f"{base_url}/ETH-USDC", latencies)
+    return counter["handshakes"], latencies
+
+
+def summarize(name, handshakes, latencies):
+    ordered = sorted(latencies)
+    return {
+        "benchmark": "http_session",
+        "strategy": name,
+        "requests": len(ordered),
+        "handshakes": handshakes,
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+    }
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        runner, port = await start_server(make_ssl_context(workdir))
+        base_url = f"https://{HOST}:{port}/api/v3/brokerage/products"
+        try:
+            before = summarize("session_per_request", *await run_per_request_sessions(base_url, args.coins, args.cycles))
+            after = summarize("shared_session", *await run_shared_session(base_url, args.coins, args.cycles, args.pool_size))
+        finally:
+            await runner.cleanup()
+
+    for result in (before, after):
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{result['strategy']:<22} requests={result['requests']:<6} handshakes={result['handshakes']:<6} "
+                  f"p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coins", type=int, default=20, help="concurrent price requests per cycle")
+    parser.add_argument("--cycles", type=int, default=50, help="number of simulated bot cycles")
+    parser.add_argument("--pool-size", type=int, default=10, help="connector limit for the shared session")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per line")
+    asyncio.run(main(parser.parse_args()))
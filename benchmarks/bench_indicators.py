@@ -0,0 +1,87 @@
+"""
+Benchmark: cost of every calculate_* indicator in cb-trading-db.py by history length.
+
+Each function is timed on a synthetic random walk of N prices (seeded, so runs are
+reproducible). For comparison, `update_indicators` is the streaming per-tick update
+the trading loop actually uses, whose cost should not depend on N.
+
+Usage:
+    python benchmarks/bench_indicators.py [--lengths 50,200,1000,5000] [--seconds 0.3] [--json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+
+from _bot import git_revision, load_bot
+
+
+def random_walk(length, seed=42, start=100.0, step=0.002):
+    rng = random.Random(seed)
+    prices = [start]
+    for _ in range(length - 1):
+        prices.append(prices[-1] * (1 + rng.gauss(0, step)))
+    return prices
+
+
+def measure(func, seconds):
+    """Microseconds per call of func(), repeated for about `seconds`."""
+    calls = 0
+    batch = 1
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(batch):
+            func()
+        calls += batch
+        now = time.perf_counter()
+        if now >= deadline:
+            return calls, (now - start) / calls * 1e6
+        batch = min(batch * 2, 1000)
+
+
+def cases(bot, prices):
+    rng = random.Random(7)
+    rsi_values = [rng.uniform(0, 100) for _ in prices]
+    settings = bot.coins_config["BENCH"]
+    stream = bot.seed_indicators(settings, prices)
+    ticks = iter(random_walk(10 ** 7, seed=3, start=prices[-1]))  # Fresh prices for the streaming update
+    return {
+        "calculate_volatility": lambda: bot.calculate_volatility(prices, settings["volatility_window"]),
+        "calculate_moving_average": lambda: bot.calculate_moving_average(prices, settings["trend_window"]),
+        "calculate_ema": lambda: bot.calculate_ema(prices, settings["macd_long_window"]),
+        "calculate_macd": lambda: bot.calculate_macd(prices, "BENCH", settings["macd_short_window"], settings["macd_long_window"], settings["macd_signal_window"]),
+        "calculate_rsi": lambda: bot.calculate_rsi(prices, "BENCH"),
+        "calculate_long_term_ma": lambda: bot.calculate_long_term_ma(prices),
+        "calculate_stochastic_rsi": lambda: bot.calculate_stochastic_rsi(rsi_values),
+        "calculate_bollinger_bands": lambda: bot.calculate_bollinger_bands(prices),
+        "update_indicators": lambda: bot.update_indicators(stream, next(ticks)),
+    }
+
+
+def main(args):
+    bot = load_bot()
+    bot.coins_config["BENCH"] = bot.coins_config[next(iter(bot.coins_config))]
+    revision = git_revision()
+
+    for length in (int(value) for value in args.lengths.split(",")):
+        prices = random_walk(length)
+        for name, func in cases(bot, prices).items():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # "Not enough data" lines
+                calls, us_per_call = measure(func, args.seconds)
+            result = {"benchmark": "indicators", "function": name, "length": length, "calls": calls,
+                      "us_per_call": round(us_per_call, 3), "commit": revision}
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{name:<26} N={length:<7} {us_per_call:>12,.2f} us/call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="50,200,1000,5000", help="comma separated history lengths")
+    parser.add_argument("--seconds", type=float, default=0.3, help="time budget per function and length")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per line")
+    main(parser.parse_args())
@@ -0,0 +1,76 @@
+"""
+Benchmark: JWT tokens per second for Coinbase request signing.
+
+Compares:
+  - legacy:       parse the PEM key and sign a new ES256 token on every call
+  - cached_key:   key parsed once, fresh token per call (POST/DELETE path, or GET cache miss)
+  - cached_token: repeated GET on the same URI, served from the token cache
+
+Usage:
+    python benchmarks/bench_jwt.py [--seconds 2] [--json]
+"""
+import argparse
+import json
+import secrets
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+
+from _bot import load_bot
+
+
+def legacy_build_jwt(key_name, key_secret, uri):
+    """build_jwt as it was before the key and token caches were added."""
+    private_key = serialization.load_pem_private_key(key_secret.encode("utf-8"), password=None)
+    jwt_payload = {
+        "sub": key_name,
+        "iss": "cdp",
+        "nbf": int(time.time()),
+        "exp": int(time.time()) + 120,
+        "uri": uri,
+    }
+    jwt_token = jwt.encode(
+        jwt_payload,
+        private_key,
+        algorithm="ES256",
+        headers={"kid": key_name, "nonce": secrets.token_hex()},
+    )
+    return jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
+
+
+def measure(name, func, seconds):
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(50):
+            func()
+        count += 50
+    elapsed = time.perf_counter() - start
+    return {"benchmark": "jwt", "strategy": name, "tokens": count, "tokens_per_sec": round(count / elapsed, 1)}
+
+
+def main(args):
+    bot = load_bot()
+    get_uri = f"GET {bot.request_host}/api/v3/brokerage/products/ETH-USDC"
+    post_uri = f"POST {bot.request_host}/api/v3/brokerage/orders"
+
+    results = [
+        measure("legacy", lambda: legacy_build_jwt(bot.key_name, bot.key_secret, get_uri), args.seconds),
+        measure("cached_key", lambda: bot.build_jwt(post_uri), args.seconds),
+        measure("cached_token", lambda: bot.build_jwt(get_uri), args.seconds),
+    ]
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{result['strategy']:<14} {result['tokens_per_sec']:>12,.1f} tokens/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="time budget per strategy")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per line")
+    main(parser.parse_args())
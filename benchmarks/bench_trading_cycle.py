@@ -0,0 +1,167 @@
+"""
+Benchmark: one polling cycle of cb-trading-db.py at 1, 10, 100 and 1000 symbols.
+
+A cycle is the body of run_polling_loop() without the 25s sleep: refresh balances,
+fetch the batched price snapshot, read manual commands, then process_symbols() for
+every coin. Coinbase is replaced by an in-process fake exchange behind api_request
+(random-walk prices, canned accounts, instantly filled orders) and every database call
+made through run_db() returns immediately, so only the bot's own work is measured.
+Every symbol starts with enough seeded history for all indicators.
+
+Usage:
+    python benchmarks/bench_trading_cycle.py [--symbols 1,10,100,1000] [--cycles 20] [--json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import time
+
+from _bot import git_revision, load_bot, make_config
+
+HISTORY = 300  # Seeded raw ticks and long-term MA buckets per symbol
+
+
+class FakeExchange:
+    """Answers the Coinbase endpoints the polling loop uses, with random-walk prices."""
+
+    def __init__(self, symbols, seed=42):
+        self.rng = random.Random(seed)
+        self.prices = {symbol: 100.0 * (1 + self.rng.random()) for symbol in symbols}
+        self.orders = 0
+        self.fills = {}  # order_id -> (symbol, filled base size, fill price)
+
+    def step(self):
+        for symbol in self.prices:
+            self.prices[symbol] *= 1 + self.rng.gauss(0, 0.003)
+
+    def history(self, symbol, length):
+        price = self.prices[symbol]
+        prices = []
+        for _ in range(length):
+            price *= 1 + self.rng.gauss(0, 0.003)
+            prices.append(price)
+        return prices
+
+    async def api_request(self, method, path, body=None, timeout=None, params=None):
+        await asyncio.sleep(0)  # A real request always yields to the event loop
+        if method == "POST":
+            self.orders += 1
+            order_id = f"bench-{self.orders}"
+            symbol = body["product_id"].rsplit("-", 1)[0]
+            config = body["order_configuration"]["market_market_ioc"]
+            price = self.prices[symbol]
+            size = float(config["quote_size"]) / price if "quote_size" in config else float(config["base_size"])
+            self.fills[order_id] = (symbol, size, price)
+            return {"success": True, "success_response": {"order_id": order_id}}
+        if path == "/api/v3/brokerage/orders/historical/fills":
+            order_id = dict(params)["order_ids"]
+            _, size, price = self.fills[order_id]
+            return {"fills": [{"order_id": order_id, "price": f"{price:.6f}", "size": f"{size:.8f}", "size_in_quote": False,
+                               "commission": f"{size * price * 0.006:.6f}"}]}
+        if path.startswith("/api/v3/brokerage/orders/historical/"):
+            order_id = path.rsplit("/", 1)[1]
+            _, size, price = self.fills[order_id]
+            return {"order": {"order_id": order_id, "status": "FILLED", "filled_size": f"{size:.8f}",
+                              "average_filled_price": f"{price:.6f}", "total_fees": f"{size * price * 0.006:.6f}"}}
+        if path == "/api/v3/brokerage/accounts":
+            accounts = [{"currency": "USDC", "available_balance": {"value": "10000"}}]
+            accounts += [{"currency": symbol, "available_balance": {"value": "1.0"}} for symbol in self.prices]
+            return {"accounts": accounts}
+        product_ids = [value for _, value in params or []]
+        if path == "/api/v3/brokerage/products":
+            return {"products": [{"product_id": p, "price": f"{self.prices[p.rsplit('-', 1)[0]]:.6f}"} for p in product_ids]}
+        if path == "/api/v3/brokerage/best_bid_ask":
+            return {"pricebooks": [{
+                "product_id": p,
+                "bids": [{"price": f"{self.prices[p.rsplit('-', 1)[0]] * 0.9995:.6f}"}],
+                "asks": [{"price": f"{self.prices[p.rsplit('-', 1)[0]] * 1.0005:.6f}"}],
+                "time": "2025-01-01T00:00:00.000000Z",
+            } for p in product_ids]}
+        if path.startswith("/api/v3/brokerage/products/"):
+            return {"price": f"{self.prices[path.rsplit('/', 1)[1].rsplit('-', 1)[0]]:.6f}"}
+        return {"error": f"unexpected {method} {path}"}
+
+
+async def fake_run_db(func, *args):
+    """The bot's DB calls, answered without a database."""
+    if func.__name__ == "fetch_manual_commands":
+        return []
+    return None
+
+
+async def polling_cycle(bot):
+    """run_polling_loop() minus the sleep."""
+    balances = await bot.refresh_balances()
+    prices = await bot.get_prices(bot.crypto_symbols)
+    await bot.process_manual_commands()
+    await bot.process_symbols(zip(bot.crypto_symbols, prices), balances)
+    await bot.drain_order_confirmations()  # Count recording the fills in the cycle
+    await bot.flush_changed_state()
+
+
+def setup(count):
+    symbols = [f"SYM{i:04d}" for i in range(count)]
+    bot = load_bot(config=make_config(symbols=symbols))
+    exchange = FakeExchange(symbols)
+    bot.api_request = exchange.api_request
+    bot.run_db = fake_run_db
+
+    first_bucket = bot.price_bucket(time.time()) - HISTORY
+    for symbol in symbols:
+        history = exchange.history(symbol, HISTORY)
+        exchange.prices[symbol] = history[-1]
+        settings = bot.coins_config[symbol]
+        bot.crypto_data[symbol] = {
+            **bot.new_price_tiers(settings, history, [(first_bucket + i, price) for i, price in enumerate(history)]),
+            "initial_price": history[0],
+            "total_trades": 0,
+            "total_profit": 0.0,
+        }
+        bot.crypto_data[symbol]["indicators"] = bot.seed_indicators(settings, bot.crypto_data[symbol]["price_history"].tolist(), bot.long_term_closes(symbol))
+    return bot, exchange
+
+
+async def run(count, cycles):
+    bot, exchange = setup(count)
+    durations = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(cycles):
+            exchange.step()
+            start = time.perf_counter()
+            await polling_cycle(bot)
+            durations.append(time.perf_counter() - start)
+            bot.price_buffer.clear()  # Stands in for price_history_flusher
+    durations.sort()
+    return {
+        "benchmark": "trading_cycle",
+        "symbols": count,
+        "cycles": cycles,
+        "ms_per_cycle": round(statistics.mean(durations) * 1000, 3),
+        "p50_ms": round(durations[len(durations) // 2] * 1000, 3),
+        "p99_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.99))] * 1000, 3),
+        "us_per_symbol": round(statistics.mean(durations) / count * 1e6, 2),
+        "orders": exchange.orders,
+    }
+
+
+def main(args):
+    revision = git_revision()
+    for count in (int(value) for value in args.symbols.split(",")):
+        result = {**asyncio.run(run(count, args.cycles)), "commit": revision}
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{count:>5} symbols: {result['ms_per_cycle']:>10,.2f} ms/cycle (p50 {result['p50_ms']:,.2f}, "
+                  f"p99 {result['p99_ms']:,.2f}), {result['us_per_symbol']:>8,.1f} us/symbol, {result['orders']} orders")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", default="1,10,100,1000", help="comma separated symbol counts")
+    parser.add_argument("--cycles", type=int, default=20, help="polling cycles per symbol count")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per line")
+    main(parser.parse_args())
@@ -4,10 +4,13 @@ import asyncio
 import secrets
 import json
 import time
+import math
 import requests
 from cryptography.hazmat.primitives import serialization
 from collections import deque
+import threading
 import psycopg2 # type: ignore
+from psycopg2 import pool # type: ignore
 from psycopg2.extras import Json # type: ignore
 from decimal import Decimal
 import numpy as np
@@ -24,9 +27,16 @@ quote_currency = "USDC"
 buy_percentage = config.get("buy_percentage", 10)  # % of available balance to buy
 sell_percentage = config.get("sell_percentage", 10)  # % of available balance to sell
 stop_loss_percentage = config.get("stop_loss_percentage", -10)  # Stop-loss threshold
+CYCLE_INTERVAL = config.get("ai_cycle_interval", 40)  # Seconds between trading cycle starts (aligned to the wall clock)
 
 request_host = "api.coinbase.com"
 
+# Shared HTTP client settings (one keep-alive connection pool per bot process)
+HTTP_CONFIG = config.get("http", {})
+HTTP_POOL_SIZE = HTTP_CONFIG.get("pool_size", 10)  # Max open connections to Coinbase
+HTTP_KEEPALIVE_TIMEOUT = HTTP_CONFIG.get("keepalive_timeout", 60)  # Seconds an idle connection is kept
+HTTP_REQUEST_TIMEOUT = HTTP_CONFIG.get("request_timeout", 10)  # Seconds per request
+
 # Load coin-specific settings
 coins_config = config.get("coins", {})
 crypto_symbols = [symbol for symbol, settings in coins_config.items() if settings.get("enabled", False)]
@@ -38,34 +48,158 @@ DB_NAME = config["database"]["name"]
 DB_USER = config["database"]["user"]
 DB_PASSWORD = config["database"]["password"]
 
+DB_POOL_MIN = config["database"].get("pool_min", 1)  # Connections kept open
+DB_POOL_MAX = config["database"].get("pool_max", 5)  # Upper bound of open connections
+DB_HEALTH_CHECK_AFTER = config["database"].get("health_check_after", 60)  # Ping connections idle this many seconds
+
+db_pool = None
+db_pool_lock = threading.Lock()
+db_last_used = {}  # id(connection) -> time.monotonic() when it was returned to the pool
+db_stats = {"connections_opened": 0}
+
+class CountingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that counts the physical connections it opens."""
+
+    def _connect(self, key=None):
+        db_stats["connections_opened"] += 1
+        return super()._connect(key)
+
+def is_connection_healthy(conn):
+    """Check a pooled connection, pinging it only if it has been idle for a while."""
+    if conn.closed:
+        return False
+    if time.monotonic() - db_last_used.get(id(conn), 0) < DB_HEALTH_CHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
 def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASSWORD
-    )
+    """Borrow a connection from the process-wide pool. Return it with release_db_connection()."""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is None:
+            db_pool = CountingConnectionPool(
+                DB_POOL_MIN,
+                DB_POOL_MAX,
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+
+    for _ in range(DB_POOL_MAX + 1):
+        conn = db_pool.getconn()
+        if is_connection_healthy(conn):
+            return conn
+        # Broken (e.g. server restart): drop it, the pool opens a fresh one on the next getconn()
+        db_last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No healthy database connection available")
+
+def release_db_connection(conn):
+    """Return a borrowed connection to the pool, discarding it if it is broken."""
+    try:
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()  # Never hand out a connection with a pending or failed transaction
+    except psycopg2.Error:
+        pass
+    if conn.closed:
+        db_last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    else:
+        db_last_used[id(conn)] = time.monotonic()
+        db_pool.putconn(conn)
+
+def close_db_pool():
+    """Close every pooled connection (used on shutdown)."""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is not None and not db_pool.closed:
+            db_pool.closeall()
+        db_pool = None
+
+JWT_LIFETIME = 120  # Seconds a token is valid (Coinbase maximum)
+JWT_REUSE_MARGIN = 15  # Stop reusing a cached token this many seconds before it expires
+
+private_key = None
+jwt_cache = {}  # "GET host/path" -> (token, expires_at)
+
+def get_private_key():
+    """Parse the PEM signing key once per process."""
+    global private_key
+    if private_key is None:
+        private_key = serialization.load_pem_private_key(key_secret.encode("utf-8"), password=None)
+    return private_key
 
 def build_jwt(uri):
-    """Generate a JWT token for Coinbase API authentication."""
-    private_key_bytes = key_secret.encode("utf-8")
-    private_key = serialization.load_pem_private_key(private_key_bytes, password=None)
+    """Generate a JWT token for Coinbase API authentication.
+
+    Read-only GET requests reuse a signed token for the same URI until shortly
+    before it expires. Any other method always gets a fresh token and nonce.
+    """
+    now = int(time.time())
+    cacheable = uri.startswith("GET ")
+    if cacheable:
+        cached = jwt_cache.get(uri)
+        if cached and cached[1] - JWT_REUSE_MARGIN > now:
+            return cached[0]
 
     jwt_payload = {
         "sub": key_name,
         "iss": "cdp",
-        "nbf": int(time.time()),
-        "exp": int(time.time()) + 120,
+        "nbf": now,
+        "exp": now + JWT_LIFETIME,
         "uri": uri,
     }
 
     jwt_token = jwt.encode(
         jwt_payload,
-        private_key,
+        get_private_key(),
         algorithm="ES256",
         headers={"kid": key_name, "nonce": secrets.token_hex()},
     )
-
-    return jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
-
-async def api_request(method, path, body=None):
+    jwt_token = jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
+
+    if cacheable:
+        if len(jwt_cache) > 256:
+            # Drop expired tokens (e.g. one-off order status URIs)
+            for stale_uri in [u for u, (_, exp) in jwt_cache.items() if exp <= now]:
+                del jwt_cache[stale_uri]
+        jwt_cache[uri] = (jwt_token, now + JWT_LIFETIME)
+
+    return jwt_token
+
+http_session = None
+
+async def get_http_session():
+    """Return the shared aiohttp session, creating it on first use."""
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT),
+        )
+    return http_session
+
+async def close_http_session():
+    """Close the shared aiohttp session and its pooled connections."""
+    global http_session
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+    http_session = None
+
+async def api_request(method, path, body=None, timeout=None):
     """Send authenticated requests to Coinbase API asynchronously."""
     uri = f"{method} {request_host}{path}"
     jwt_token = build_jwt(uri)
@@ -77,11 +211,15 @@ async def api_request(method, path, body=None):
     }
 
     url = f"https://{request_host}{path}"
-    async with aiohttp.ClientSession() as session:
-        async with session.request(method, url, headers=headers, json=body) as response:
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+    session = await get_http_session()
+    try:
+        async with session.request(method, url, headers=headers, json=body, timeout=request_timeout) as response:
             if response.status == 200:
                 return await response.json()
             return {"error": await response.text()}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
 
 def save_price_history(symbol, price):
     """Save price history to the PostgreSQL database."""
@@ -98,7 +236,7 @@ def save_price_history(symbol, price):
         print(f"Error saving price history to database: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def save_state(symbol, initial_price, total_trades, total_profit):
     """Save the trading state to the PostgreSQL database."""
@@ -118,7 +256,7 @@ def save_state(symbol, initial_price, total_trades, total_profit):
         print(f"Error saving state to database: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def load_state(symbol):
     """Load the trading state from the PostgreSQL database."""
@@ -161,7 +299,7 @@ def load_state(symbol):
         return None
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 # Initialize price_history with maxlen equal to the larger of volatility_window and trend_window
 price_history_maxlen = max(
@@ -183,7 +321,7 @@ async def log_trade(symbol, side, amount, price):
         print(f"Error logging trade: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 async def get_crypto_price(crypto_symbol):
     """Fetch cryptocurrency price from Coinbase asynchronously."""
@@ -353,6 +491,16 @@ def query_ollama_verbose(prompt, model="mistral"):
         print(f"🚨 AI Query Error: {e}")
         return "HOLD", "AI unavailable, defaulting to HOLD."
 
+async def wait_for_next_cycle(cycle_start):
+    """Sleep until the next wall-clock multiple of CYCLE_INTERVAL, reporting cycles that overran it."""
+    now = time.time()
+    next_tick = (math.floor(now / CYCLE_INTERVAL) + 1) * CYCLE_INTERVAL
+    missed = int((next_tick - cycle_start) // CYCLE_INTERVAL) - 1  # Ticks that passed while the cycle was running
+    if cycle_start and missed > 0:
+        print(f"⚠️ Trading cycle overran: took {now - cycle_start:.1f}s, skipped {missed} cycle(s) of {CYCLE_INTERVAL}s.")
+    await asyncio.sleep(next_tick - now)
+    return next_tick
+
 async def trading_bot():
     global crypto_data
     
@@ -372,8 +520,9 @@ async def trading_bot():
 
     print("\n🚀 Bot initialized! Starting live trading...\n")
 
+    cycle_start = 0
     while True:
-        await asyncio.sleep(30)
+        cycle_start = await wait_for_next_cycle(cycle_start)
 
         print("\n🔄 Starting New Trading Cycle...\n")
 
@@ -473,8 +622,14 @@ async def trading_bot():
             else:
                 print(f"⚪ AI chose to HOLD {symbol} this cycle.")
 
-        print("\n✅ AI Trading Cycle Completed! Waiting for next round...\n")
-        await asyncio.sleep(10)
+        print(f"\n✅ AI Trading Cycle Completed in {time.time() - cycle_start:.1f}s! Waiting for next round...\n")
+
+async def main():
+    try:
+        await trading_bot()
+    finally:
+        await close_http_session()
+        close_db_pool()
 
 if __name__ == "__main__":
-    asyncio.run(trading_bot())
+    asyncio.run(main())
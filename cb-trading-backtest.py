@@ -0,0 +1,404 @@
+"""
+Backtest the cb-trading-db.py strategy on recorded prices.
+
+Replays price_history (from the PostgreSQL database in config.json, or a CSV /
+Parquet export) through the same buy/sell rules as the live bot
+(strategy.evaluate_trade). Indicators are computed up front for every symbol's
+whole series with batch_indicators; only the path-dependent decisions (streaks,
+MACD confirmation, initial price drift, balances) run tick by tick, with all
+symbols merged in time order so they share one quote balance.
+
+Fill model: market orders fill at the tick price moved against us by
+--slippage-bps and pay --fee (fraction of the notional). Orders below the coin's
+min_order_sizes are skipped and sell amounts are rounded to its amount precision,
+like place_order does.
+
+Export price history for --csv with e.g.:
+    psql -c "\\copy (SELECT symbol, timestamp, price FROM price_history ORDER BY timestamp) TO 'prices.csv' CSV HEADER"
+
+Usage:
+    python cb-trading-backtest.py [--symbols ETH,XRP] [--start 2025-01-01] [--end 2025-02-01]
+    python cb-trading-backtest.py --csv prices.csv [--quote 1000] [--fee 0.006] [--slippage-bps 5]
+    python cb-trading-backtest.py --parquet prices.parquet --json --trades trades.csv
+"""
+import argparse
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+import batch_indicators as bi
+from strategy import evaluate_trade, buy_quote_cost, sell_order_amount
+
+STOCH_WARMUP = 16  # update_stochastic_rsi needs period + d_period RSI values before it reports K and D
+
+
+def load_config(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def parse_time(value):
+    """Epoch seconds from a number or an ISO 8601 timestamp (naive times are local, like the database)."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def group_prices(symbols, timestamps, prices, wanted=None):
+    """{symbol: (timestamps, prices)} as float arrays sorted by time."""
+    symbols = np.asarray(symbols)
+    timestamps = np.asarray(timestamps, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    series = {}
+    for symbol in np.unique(symbols):
+        if wanted and symbol not in wanted:
+            continue
+        rows = symbols == symbol
+        order = np.argsort(timestamps[rows], kind="stable")
+        series[str(symbol)] = (timestamps[rows][order], prices[rows][order])
+    return series
+
+
+def load_prices_file(path, wanted=None):
+    """Read symbol,timestamp,price rows from a CSV or Parquet file."""
+    if path.endswith(".parquet"):
+        import pandas as pd  # Parquet support needs pandas (and pyarrow or fastparquet)
+        frame = pd.read_parquet(path, columns=["symbol", "timestamp", "price"])
+        timestamps = frame["timestamp"]
+        if not np.issubdtype(timestamps.dtype, np.number):
+            timestamps = [parse_time(str(value)) for value in timestamps]
+        return group_prices(frame["symbol"].to_numpy(), timestamps, frame["price"].to_numpy(), wanted)
+
+    symbols, timestamps, prices = [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if wanted and row["symbol"] not in wanted:
+                continue
+            symbols.append(row["symbol"])
+            timestamps.append(parse_time(row["timestamp"]))
+            prices.append(float(row["price"]))
+    return group_prices(symbols, timestamps, prices)
+
+
+def load_prices_db(database, symbols, start=None, end=None):
+    """Read price_history for `symbols` with one COPY per symbol."""
+    import psycopg2  # type: ignore
+
+    conn = psycopg2.connect(
+        host=database["host"],
+        port=database["port"],
+        dbname=database["name"],
+        user=database["user"],
+        password=database["password"],
+    )
+    series = {}
+    try:
+        with conn.cursor() as cursor:
+            for symbol in symbols:
+                query = cursor.mogrify(
+                    """
+                    SELECT EXTRACT(EPOCH FROM timestamp::TIMESTAMPTZ)::DOUBLE PRECISION, price::DOUBLE PRECISION
+                    FROM price_history
+                    WHERE symbol = %s AND timestamp >= COALESCE(%s::TIMESTAMP, '-infinity') AND timestamp < COALESCE(%s::TIMESTAMP, 'infinity')
+                    ORDER BY timestamp
+                    """,
+                    (symbol, start, end),
+                ).decode()
+                buffer = io.StringIO()
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT", buffer)
+                buffer.seek(0)
+                rows = np.loadtxt(buffer, dtype=float, ndmin=2)
+                if len(rows):
+                    series[symbol] = (rows[:, 0], rows[:, 1])
+    finally:
+        conn.close()
+    return series
+
+
+def long_term_ma(timestamps, prices, bucket_seconds, period=bi.LONG_TERM_MA_PERIOD):
+    """The bot's long-term MA at every tick: mean of the last `period` bucket closes,
+    the open bucket counting with the current price (or of the last `period` ticks when bucket_seconds is 0)."""
+    if not bucket_seconds:
+        return bi.moving_average(prices[None, :], period)[0]
+    buckets = np.floor(timestamps / bucket_seconds)
+    rank = np.cumsum(np.r_[True, buckets[1:] != buckets[:-1]]) - 1  # Bucket number of every tick
+    last_tick = np.r_[rank[1:] != rank[:-1], True]
+    closes_before = np.r_[0.0, np.cumsum(prices[last_tick])]  # closes_before[r] = sum of the closes of buckets 0..r-1
+    out = np.full(len(prices), np.nan)
+    ready = rank >= period - 1
+    r = rank[ready]
+    out[ready] = (closes_before[r] - closes_before[r - (period - 1)] + prices[ready]) / period
+    return out
+
+
+def nan_to_none(values):
+    return [None if value != value else value for value in values]
+
+
+def prepare_series(settings, timestamps, prices, bucket_seconds):
+    """Indicator values for every tick the bot would process (unchanged and invalid prices dropped).
+
+    Returns lists ready for the replay loop and `start`, the first tick past the bot's warm-up guards.
+    """
+    valid = np.isfinite(prices) & (prices > 0)
+    timestamps, prices = timestamps[valid], prices[valid]
+    changed = np.r_[True, prices[1:] != prices[:-1]]  # process_symbol skips unchanged prices
+    timestamps, prices = timestamps[changed], prices[changed]
+    row = prices[None, :]
+
+    macd_line, signal_line, macd_histogram = bi.macd(row, settings["macd_short_window"], settings["macd_long_window"], settings["macd_signal_window"])
+    rsi = bi.rsi(row, 14)[0]  # process_symbol always uses a 14-period RSI
+    moving_avg = bi.moving_average(row, settings["trend_window"])[0]
+    volatility = bi.volatility(row, settings["volatility_window"])[0]
+    bollinger_mid, bollinger_upper, bollinger_lower = (band[0] for band in bi.bollinger_bands(row))
+    long_term = long_term_ma(timestamps, prices, bucket_seconds)
+
+    required = max(settings["macd_long_window"] + settings["macd_signal_window"], settings["rsi_period"] + 1)
+    eligible = (np.arange(1, len(prices) + 1) >= required) & ~np.isnan(long_term)
+    start = int(np.argmax(eligible)) if eligible.any() else len(prices)
+
+    # Stochastic RSI over the RSI values seen since the bot started trading the series
+    stoch_k = [None] * len(prices)
+    stoch_d = [None] * len(prices)
+    if start < len(prices):
+        k, d = (series[0] for series in bi.stochastic_rsi(rsi[None, start:]))
+        stoch_k[start + STOCH_WARMUP:] = k[STOCH_WARMUP:].tolist()
+        stoch_d[start + STOCH_WARMUP:] = d[STOCH_WARMUP:].tolist()
+
+    return {
+        "timestamps": timestamps,
+        "prices": prices.tolist(),
+        "start": start,
+        "macd_line": macd_line[0].tolist(),
+        "signal_line": signal_line[0].tolist(),
+        "macd_histogram": macd_histogram[0].tolist(),
+        "rsi": rsi.tolist(),
+        "moving_avg": nan_to_none(moving_avg.tolist()),
+        "volatility": volatility.tolist(),
+        "bollinger_mid": bollinger_mid.tolist(),
+        "bollinger_upper": bollinger_upper.tolist(),
+        "bollinger_lower": bollinger_lower.tolist(),
+        "long_term_ma": long_term.tolist(),
+        "stoch_k": stoch_k,
+        "stoch_d": stoch_d,
+    }
+
+
+def run_backtest(series, coins_config, buy_percentage, sell_percentage, quote=1000.0, fee=0.006, slippage_bps=0.0):
+    """Replay prepared series (see prepare_series) in time order through evaluate_trade()."""
+    symbols = list(series)
+    slip = slippage_bps / 10000
+
+    # Merge all ticks by time: (symbol number, tick index) in replay order
+    owners = np.concatenate([np.full(len(series[s]["prices"]), n) for n, s in enumerate(symbols)]) if symbols else np.empty(0, int)
+    ticks = np.concatenate([np.arange(len(series[s]["prices"])) for s in symbols]) if symbols else np.empty(0, int)
+    times = np.concatenate([series[s]["timestamps"] for s in symbols]) if symbols else np.empty(0)
+    order = np.argsort(times, kind="stable")
+    owners, ticks, times = owners[order].tolist(), ticks[order].tolist(), times[order].tolist()
+
+    books = []
+    for symbol in symbols:
+        data = series[symbol]
+        books.append({
+            "symbol": symbol,
+            "ticks": len(data["prices"]),
+            "start": data["start"],
+            "settings": coins_config[symbol],
+            "state": {"initial_price": data["prices"][0], "rising_streak": 0, "falling_streak": 0, "last_buy_time": 0, "manual_cmd": None},
+            "confirmation": {"buy": 0, "sell": 0},
+            "rows": zip(data["prices"], data["macd_line"], data["signal_line"], data["macd_histogram"], data["rsi"],
+                        data["moving_avg"], data["long_term_ma"], data["volatility"], data["stoch_k"], data["stoch_d"],
+                        zip(data["bollinger_mid"], data["bollinger_upper"], data["bollinger_lower"])),
+            "previous_price": None,
+            "holdings": 0.0,
+            "cost_basis": 0.0,  # Quote spent (incl. fees) on the current holdings
+            "ledger": None,  # [amount, cost] of the buys since the last sell, like the bot's position ledger
+            "last_price": None,
+            "stats": {"buys": 0, "sells": 0, "fees": 0.0, "realized_pnl": 0.0, "skipped_min_size": 0},
+        })
+
+    trades = []
+    equity = peak = quote
+    max_drawdown = 0.0
+
+    for owner, i, now in zip(owners, ticks, times):
+        book = books[owner]
+        (price, macd_line, signal_line, macd_histogram, rsi, moving_avg, long_term_ma, volatility,
+         stoch_k, stoch_d, bollinger) = next(book["rows"])
+
+        # Mark to market
+        if book["holdings"]:
+            equity += book["holdings"] * (price - book["last_price"])
+            if equity > peak:
+                peak = equity
+            elif peak - equity > max_drawdown * peak:
+                max_drawdown = (peak - equity) / peak
+        book["last_price"] = price
+
+        previous_price = book["previous_price"]
+        state = book["state"]
+        if previous_price is not None:
+            state["rising_streak"] = state["rising_streak"] + 1 if price > previous_price else 0
+            state["falling_streak"] = state["falling_streak"] + 1 if price < previous_price else 0
+        if i < book["start"]:
+            continue
+        book["previous_price"] = price
+
+        indicators = {
+            "macd_line": macd_line,
+            "signal_line": signal_line,
+            "macd_histogram": macd_histogram,
+            "rsi": rsi,
+            "moving_avg": moving_avg,
+            "long_term_ma": long_term_ma,
+            "bollinger": bollinger,
+            "volatility": volatility,
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+        }
+        ledger = book["ledger"]
+        actual_buy_price = ledger[1] / ledger[0] if ledger else None
+        action = evaluate_trade(state, book["confirmation"], book["settings"], price, indicators,
+                                actual_buy_price, book["holdings"], quote, now)["action"]
+        if action is None:
+            continue
+
+        settings = book["settings"]
+        stats = book["stats"]
+        if action == "BUY":
+            cost = buy_quote_cost(quote, buy_percentage)
+            if cost < settings["min_order_sizes"]["buy"]:
+                stats["skipped_min_size"] += 1
+                continue
+            fill_price = price * (1 + slip)
+            paid_fee = cost * fee
+            amount = (cost - paid_fee) / fill_price
+            quote -= cost
+            book["holdings"] += amount
+            book["cost_basis"] += cost
+            book["ledger"] = [ledger[0] + amount, ledger[1] + amount * fill_price] if ledger else [amount, amount * fill_price]
+            state["last_buy_time"] = now
+            pnl = 0.0
+        else:
+            precision = settings["precision"]["amount"]
+            amount = sell_order_amount(book["holdings"], sell_percentage, precision)
+            if amount <= 0:
+                continue
+            if round(amount, precision) < settings["min_order_sizes"]["sell"]:
+                stats["skipped_min_size"] += 1
+                continue
+            fill_price = price * (1 - slip)
+            notional = amount * fill_price
+            paid_fee = notional * fee
+            basis = book["cost_basis"] * amount / book["holdings"]
+            pnl = notional - paid_fee - basis
+            quote += notional - paid_fee
+            book["holdings"] -= amount
+            book["cost_basis"] -= basis
+            book["ledger"] = None  # The bot's average buy price restarts after every sell
+            state["initial_price"] = long_term_ma
+            stats["realized_pnl"] += pnl
+
+        equity += (price - fill_price) * amount if action == "BUY" else (fill_price - price) * amount
+        equity -= paid_fee
+        stats["buys" if action == "BUY" else "sells"] += 1
+        stats["fees"] += paid_fee
+        trades.append({"time": now, "symbol": book["symbol"], "side": action, "amount": amount,
+                       "price": fill_price, "fee": paid_fee, "pnl": pnl, "quote_balance": quote})
+        if peak - equity > max_drawdown * peak:
+            max_drawdown = (peak - equity) / peak
+
+    return summarize(books, trades, quote, owners, max_drawdown)
+
+
+def summarize(books, trades, quote, owners, max_drawdown):
+    per_symbol = {}
+    equity = quote
+    for book in books:
+        value = book["holdings"] * (book["last_price"] or 0.0)
+        equity += value
+        per_symbol[book["symbol"]] = {
+            **book["stats"],
+            "ticks": book["ticks"],
+            "holdings": book["holdings"],
+            "holdings_value": value,
+            "unrealized_pnl": value - book["cost_basis"],
+        }
+    return {"symbols": per_symbol, "trades": trades, "quote_balance": quote, "final_equity": equity,
+            "max_drawdown": max_drawdown, "replayed_ticks": len(owners)}
+
+
+def main(args):
+    config = load_config(args.config)
+    coins_config = config.get("coins", {})
+    wanted = args.symbols.split(",") if args.symbols else [s for s, settings in coins_config.items() if settings.get("enabled", False)]
+    bucket_seconds = config.get("history", {}).get("bucket_seconds", 30) if args.bucket_seconds is None else args.bucket_seconds
+
+    started = time.perf_counter()
+    if args.csv or args.parquet:
+        raw = load_prices_file(args.csv or args.parquet, set(wanted))
+    else:
+        raw = load_prices_db(config["database"], wanted, args.start, args.end)
+    raw = {symbol: prices for symbol, prices in raw.items() if symbol in coins_config}
+    loaded = time.perf_counter()
+
+    series = {symbol: prepare_series(coins_config[symbol], timestamps, prices, bucket_seconds)
+              for symbol, (timestamps, prices) in raw.items()}
+    prepared = time.perf_counter()
+
+    result = run_backtest(series, coins_config, config.get("buy_percentage", 10), config.get("sell_percentage", 10),
+                          quote=args.quote, fee=args.fee, slippage_bps=args.slippage_bps)
+    finished = time.perf_counter()
+
+    input_ticks = sum(len(prices) for _, prices in raw.values())
+    result.update(
+        start_quote=args.quote,
+        return_pct=(result["final_equity"] / args.quote - 1) * 100 if args.quote else 0.0,
+        input_ticks=input_ticks,
+        load_seconds=loaded - started,
+        indicator_seconds=prepared - loaded,
+        replay_seconds=finished - prepared,
+        ticks_per_sec=input_ticks / max(finished - loaded, 1e-9),
+    )
+
+    if args.trades:
+        with open(args.trades, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["time", "symbol", "side", "amount", "price", "fee", "pnl", "quote_balance"])
+            writer.writeheader()
+            writer.writerows(result["trades"])
+
+    if args.json:
+        print(json.dumps({key: value for key, value in result.items() if key != "trades"}))
+        return
+
+    print(f"{'Symbol':<8} {'Ticks':>10} {'Buys':>6} {'Sells':>6} {'Fees':>10} {'Realized':>12} {'Unrealized':>12}")
+    for symbol, stats in result["symbols"].items():
+        print(f"{symbol:<8} {stats['ticks']:>10,} {stats['buys']:>6} {stats['sells']:>6} {stats['fees']:>10.2f} "
+              f"{stats['realized_pnl']:>12.2f} {stats['unrealized_pnl']:>12.2f}")
+    print(f"💰 Equity: {args.quote:.2f} -> {result['final_equity']:.2f} USDC ({result['return_pct']:+.2f}%), "
+          f"max drawdown {result['max_drawdown'] * 100:.2f}%, {len(result['trades'])} trades")
+    print(f"⏱️ {input_ticks:,} ticks: load {result['load_seconds']:.2f}s, indicators {result['indicator_seconds']:.2f}s, "
+          f"replay {result['replay_seconds']:.2f}s ({result['ticks_per_sec']:,.0f} ticks/sec)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.json", help="bot configuration (coins, percentages, database)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", help="symbol,timestamp,price rows instead of the database")
+    source.add_argument("--parquet", help="Parquet file with symbol, timestamp and price columns")
+    parser.add_argument("--symbols", help="comma separated symbols (default: enabled coins)")
+    parser.add_argument("--start", help="first timestamp to load from the database")
+    parser.add_argument("--end", help="load database rows before this timestamp")
+    parser.add_argument("--bucket-seconds", type=float, help="long-term MA bucket size (default: history.bucket_seconds)")
+    parser.add_argument("--quote", type=float, default=1000.0, help="starting USDC balance")
+    parser.add_argument("--fee", type=float, default=0.006, help="fee as a fraction of the order notional")
+    parser.add_argument("--slippage-bps", type=float, default=0.0, help="fill price moved against the order, in basis points")
+    parser.add_argument("--trades", help="write every fill to this CSV file")
+    parser.add_argument("--json", action="store_true", help="emit the summary as one JSON object")
+    main(parser.parse_args())
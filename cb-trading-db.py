@@ -1,17 +1,26 @@
 import jwt
 import aiohttp
 import asyncio
+import bisect
 import secrets
 import json
 import time
-import requests
+import math
+import io
+from aiohttp import web
 from cryptography.hazmat.primitives import serialization
-from collections import deque
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from array import array
+import threading
 import psycopg2 # type: ignore
-from psycopg2.extras import Json # type: ignore
-from decimal import Decimal
-import pandas as pd
+from psycopg2 import pool # type: ignore
+from psycopg2.extras import Json, execute_values # type: ignore
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from strategy import evaluate_trade, buy_quote_cost, sell_order_amount
 
 DEBUG_MODE = False  # Set to True for debugging
 
@@ -28,15 +37,59 @@ stop_loss_percentage = config.get("stop_loss_percentage", -10)  # Stop-loss thre
 
 request_host = "api.coinbase.com"
 
+# Shared HTTP client settings (one keep-alive connection pool per bot process)
+HTTP_CONFIG = config.get("http", {})
+HTTP_POOL_SIZE = HTTP_CONFIG.get("pool_size", 10)  # Max open connections to Coinbase
+HTTP_KEEPALIVE_TIMEOUT = HTTP_CONFIG.get("keepalive_timeout", 60)  # Seconds an idle connection is kept
+HTTP_REQUEST_TIMEOUT = HTTP_CONFIG.get("request_timeout", 10)  # Seconds per request
+HTTP_MAX_RETRIES = HTTP_CONFIG.get("max_retries", 3)  # Retries of a request answered with 429 Too Many Requests
+
+# Coinbase rate limits: a token bucket per endpoint class plus one for all requests (Coinbase allows 30/s per key).
+# When requests have to wait, the lane with the lowest priority number goes first, so orders beat price polls.
+# max_wait is how long a request may queue for a token before it is rejected locally.
+RATE_LIMIT_DEFAULTS = {
+    "total": {"rate": 25, "burst": 25},
+    "orders": {"rate": 10, "burst": 10, "priority": 0, "max_wait": 30},
+    "accounts": {"rate": 5, "burst": 5, "priority": 1, "max_wait": 10},
+    "market_data": {"rate": 15, "burst": 15, "priority": 2, "max_wait": 5},
+}
+RATE_LIMITS = {
+    name: {**defaults, **HTTP_CONFIG.get("rate_limits", {}).get(name, {})}
+    for name, defaults in RATE_LIMIT_DEFAULTS.items()
+}
+RATE_LIMIT_BASE_BACKOFF = 1.0  # Seconds to back off after a 429 without Retry-After, doubled per retry
+RATE_LIMIT_MAX_BACKOFF = 30.0
+
+# Market data settings: "poll" fetches a REST snapshot every cycle, "websocket" follows the ticker channel
+MARKET_DATA_CONFIG = config.get("market_data", {})
+MARKET_DATA_MODE = MARKET_DATA_CONFIG.get("mode", "poll")
+MARKET_DATA_WS_URL = MARKET_DATA_CONFIG.get("ws_url", "wss://advanced-trade-ws.coinbase.com")
+MARKET_DATA_COALESCE = MARKET_DATA_CONFIG.get("coalesce_seconds", 1.0)  # Ticks are processed in micro-batches of this length
+MARKET_DATA_STALE_AFTER = MARKET_DATA_CONFIG.get("stale_after_seconds", 30)  # Reconnect when the feed is silent this long
+MARKET_DATA_BALANCE_REFRESH = MARKET_DATA_CONFIG.get("balance_refresh_seconds", 25)  # Balances/manual commands refresh interval
+MARKET_DATA_RECORD_PATH = MARKET_DATA_CONFIG.get("record_path")  # Optional JSONL file to record raw feed messages
+
+# Poll mode scheduling: a fixed poll_interval for every symbol, or (adaptive_polling) a per-symbol interval that
+# shrinks with the symbol's volatility and while we hold it, within poll_min_interval..poll_max_interval
+POLL_INTERVAL = MARKET_DATA_CONFIG.get("poll_interval", 25)  # Seconds between polls (the base interval when adaptive)
+POLL_ADAPTIVE = MARKET_DATA_CONFIG.get("adaptive_polling", False)
+POLL_MIN_INTERVAL = MARKET_DATA_CONFIG.get("poll_min_interval", 5)
+POLL_MAX_INTERVAL = MARKET_DATA_CONFIG.get("poll_max_interval", 120)
+POLL_TARGET_VOLATILITY = MARKET_DATA_CONFIG.get("poll_target_volatility", 0.002)  # Volatility that is polled every poll_interval
+POLL_HELD_FACTOR = MARKET_DATA_CONFIG.get("poll_held_factor", 0.5)  # Interval multiplier while holding the coin
+POLL_BATCH_WINDOW = min(1.0, POLL_MIN_INTERVAL / 4)  # Symbols due within this many seconds share one batched price request
+# Ticks are aligned to the wall clock; symbols not processed within cycle_deadline_seconds of a tick wait for the next one
+POLL_CYCLE_DEADLINE = MARKET_DATA_CONFIG.get("cycle_deadline_seconds", 0.8 * POLL_INTERVAL)
+SYMBOL_CONCURRENCY = MARKET_DATA_CONFIG.get("max_concurrent_symbols", 8)  # Symbols evaluated/traded at the same time
+
 # Load coin-specific settings
 coins_config = config.get("coins", {})
 crypto_symbols = [symbol for symbol, settings in coins_config.items() if settings.get("enabled", False)]
 
-# Initialize price_history with maxlen equal to the larger of volatility_window and trend_window
-price_history_maxlen = max(
-    max(settings.get("volatility_window", 10) for settings in coins_config.values()),
-    max(settings.get("trend_window", 20) for settings in coins_config.values())
-)
+# Tiered price history: raw ticks sized per coin (see raw_history_depth) plus closes of
+# `bucket_seconds` buckets for the 200-period long-term MA (0 = long-term MA over raw ticks)
+HISTORY_CONFIG = config.get("history", {})
+HISTORY_BUCKET_SECONDS = HISTORY_CONFIG.get("bucket_seconds", 30)
 
 # Database connection parameters
 DB_HOST = config["database"]["host"]
@@ -45,161 +98,658 @@ DB_NAME = config["database"]["name"]
 DB_USER = config["database"]["user"]
 DB_PASSWORD = config["database"]["password"]
 
+DB_POOL_MIN = config["database"].get("pool_min", 1)  # Connections kept open
+DB_POOL_MAX = config["database"].get("pool_max", 5)  # Upper bound of open connections
+DB_HEALTH_CHECK_AFTER = config["database"].get("health_check_after", 60)  # Ping connections idle this many seconds
+
+# Write-behind buffer for price_history rows
+PRICE_BUFFER_FLUSH_ROWS = config["database"].get("write_buffer_rows", 200)  # Flush once this many rows are waiting
+PRICE_BUFFER_FLUSH_SECONDS = config["database"].get("write_buffer_seconds", 5)  # ...or when rows are this old
+PRICE_BUFFER_MAX_ROWS = config["database"].get("write_buffer_max_rows", 10000)  # Hard cap, producers wait beyond it
+
+# In-memory position ledger (weighted average buy price), checked against trades this often
+LEDGER_RECONCILE_SECONDS = config["database"].get("ledger_reconcile_seconds", 300)
+
+# Manual commands are pushed by the monitor with NOTIFY; polling is only a fallback (always used while LISTEN is down)
+MANUAL_COMMANDS_LISTEN = config["database"].get("listen_manual_commands", True)
+MANUAL_COMMANDS_CHANNEL = "manual_commands"  # Must match monitor/monitor_api.py
+MANUAL_COMMANDS_FALLBACK_SECONDS = config["database"].get("manual_commands_fallback_seconds", 300)
+
+# Metrics: latency histograms and counters, served in Prometheus text format on http://host:port/metrics
+METRICS_CONFIG = config.get("metrics", {})
+METRICS_ENABLED = METRICS_CONFIG.get("enabled", False)
+METRICS_HOST = METRICS_CONFIG.get("host", "127.0.0.1")  # Keep it local, the endpoint has no authentication
+METRICS_PORT = METRICS_CONFIG.get("port", 9108)
+METRICS_PREFIX = "cbbot_"
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+
+metrics_lock = threading.Lock()  # DB calls are timed on the DB threads
+histograms = {}  # name -> {labels: {"buckets": [count per bucket, +Inf last], "sum", "count"}}
+counters = {}  # name -> {labels: value}
+gauges = {}  # name -> function returning the current value, read when metrics are rendered
+METRICS_HELP = {
+    "phase_seconds": "Time spent per trading cycle phase.",
+    "coinbase_request_seconds": "Coinbase API request latency per endpoint.",
+    "postgres_query_seconds": "PostgreSQL call latency per helper.",
+    "telegram_request_seconds": "Telegram sendMessage latency.",
+    "telegram_notifications_total": "Telegram notifications by result (sent, failed, dropped).",
+    "order_confirmation_seconds": "Time from sending an order to Coinbase reporting its fill, per side.",
+    "symbols_skipped_total": "Symbols skipped by process_symbol, by reason.",
+    "symbols_deferred_total": "Symbols left for the next tick because the cycle deadline passed.",
+    "cycle_overruns_total": "Polling cycles that ran past a symbol's next poll slot.",
+    "missed_polls_total": "Poll slots skipped because a cycle overran.",
+    "ticker_feed_events_total": "WebSocket ticker feed events (messages, gaps, reconnects, resyncs).",
+    "price_buffer_flush_seconds": "Time to write one batch of buffered price history rows.",
+    "price_buffer_flushes_total": "Price history buffer flushes by result (written, failed).",
+    "price_buffer_rows_flushed_total": "Price history rows written by the buffer.",
+    "price_buffer_backpressure_waits_total": "Ticks that waited because the price history buffer was full.",
+    "price_buffer_backlog_rows": "Price history rows buffered and not written yet.",
+    "price_buffer_oldest_row_age_seconds": "Age of the oldest unwritten price history row.",
+    "orders_total": "Orders by side and result.",
+    "errors_total": "Errors by source.",
+    "rate_limit_wait_seconds": "Time Coinbase requests waited for a rate limit token, per endpoint class.",
+    "rate_limit_throttled_total": "Coinbase requests delayed by the local rate limiter, per endpoint class.",
+    "rate_limit_429_total": "429 Too Many Requests responses from Coinbase, per endpoint class.",
+    "rate_limit_rejected_total": "Coinbase requests given up on because of rate limits, per endpoint class.",
+}
+
+def observe(name, seconds, **labels):
+    """Add one observation (in seconds) to a histogram."""
+    key = tuple(sorted(labels.items()))
+    with metrics_lock:
+        series = histograms.setdefault(name, {}).get(key)
+        if series is None:
+            series = histograms[name][key] = {"buckets": [0] * (len(METRICS_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        series["buckets"][bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+        series["sum"] += seconds
+        series["count"] += 1
+
+def increment(name, amount=1, **labels):
+    """Increase a counter."""
+    key = tuple(sorted(labels.items()))
+    with metrics_lock:
+        series = counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+@contextmanager
+def timed(name, **labels):
+    """Time the enclosed block into histogram `name` (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def render_metrics():
+    """All histograms, counters and gauges in the Prometheus text exposition format."""
+    lines = []
+    with metrics_lock:
+        for name, series in sorted(histograms.items()):
+            metric = METRICS_PREFIX + name
+            lines.append(f"# HELP {metric} {METRICS_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, data in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(METRICS_BUCKETS + (float("inf"),), data["buckets"]):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{metric}_bucket{format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{metric}_sum{format_labels(labels)} {data['sum']}")
+                lines.append(f"{metric}_count{format_labels(labels)} {data['count']}")
+        for name, series in sorted(counters.items()):
+            metric = METRICS_PREFIX + name
+            lines.append(f"# HELP {metric} {METRICS_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{metric}{format_labels(labels)} {value}")
+    for name, read in sorted(gauges.items()):
+        metric = METRICS_PREFIX + name
+        lines.append(f"# HELP {metric} {METRICS_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {read()}")
+    return "\n".join(lines) + "\n"
+
+async def start_metrics_server():
+    """Serve /metrics on METRICS_HOST:METRICS_PORT. Returns the runner (cleanup() it on shutdown)."""
+    async def handle_metrics(request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    print(f"📈 Metrics available on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+db_pool = None
+db_pool_lock = threading.Lock()
+db_last_used = {}  # id(connection) -> time.monotonic() when it was returned to the pool
+db_stats = {"connections_opened": 0}
+
+class CountingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that counts the physical connections it opens."""
+
+    def _connect(self, key=None):
+        db_stats["connections_opened"] += 1
+        return super()._connect(key)
+
+def is_connection_healthy(conn):
+    """Check a pooled connection, pinging it only if it has been idle for a while."""
+    if conn.closed:
+        return False
+    if time.monotonic() - db_last_used.get(id(conn), 0) < DB_HEALTH_CHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
 def get_db_connection():
-    """Connect to the PostgreSQL database."""
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
-    return conn
+    """Borrow a connection from the process-wide pool. Return it with release_db_connection()."""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is None:
+            db_pool = CountingConnectionPool(
+                DB_POOL_MIN,
+                DB_POOL_MAX,
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+
+    for _ in range(DB_POOL_MAX + 1):
+        conn = db_pool.getconn()
+        if is_connection_healthy(conn):
+            return conn
+        # Broken (e.g. server restart): drop it, the pool opens a fresh one on the next getconn()
+        db_last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No healthy database connection available")
+
+def release_db_connection(conn):
+    """Return a borrowed connection to the pool, discarding it if it is broken."""
+    try:
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()  # Never hand out a connection with a pending or failed transaction
+    except psycopg2.Error:
+        pass
+    if conn.closed:
+        db_last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    else:
+        db_last_used[id(conn)] = time.monotonic()
+        db_pool.putconn(conn)
+
+def close_db_pool():
+    """Close every pooled connection (used on shutdown)."""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is not None and not db_pool.closed:
+            db_pool.closeall()
+        db_pool = None
 
 # Load Telegram settings from config.json
 TELEGRAM_CONFIG = config.get("telegram", {})
 
+TELEGRAM_QUEUE_SIZE = TELEGRAM_CONFIG.get("queue_size", 100)  # Notifications waiting to be sent; more are dropped
+TELEGRAM_MIN_INTERVAL = TELEGRAM_CONFIG.get("min_interval_seconds", 1.0)  # Telegram allows about one message per second per chat
+TELEGRAM_TIMEOUT = TELEGRAM_CONFIG.get("timeout", 10)  # Seconds per sendMessage request
+TELEGRAM_MAX_RETRIES = TELEGRAM_CONFIG.get("max_retries", 3)
+TELEGRAM_MAX_LENGTH = 4096  # Telegram's message size limit
+
+telegram_queue = asyncio.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+
 def send_telegram_notification(message):
-    """Send notification to Telegram if enabled in config.json."""
+    """Queue a notification for telegram_notifier(), if enabled in config.json. Never blocks."""
     if not TELEGRAM_CONFIG.get("enabled", False):
         return  # 🔕 Notifications are disabled
 
-    bot_token = TELEGRAM_CONFIG.get("bot_token")
-    chat_id = TELEGRAM_CONFIG.get("chat_id")
-    
-    if not bot_token or not chat_id:
+    if not TELEGRAM_CONFIG.get("bot_token") or not TELEGRAM_CONFIG.get("chat_id"):
         print("⚠️ Telegram notification skipped: Missing bot token or chat ID in config.json")
         return
-    
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {"chat_id": chat_id, "text": message}
-    
-    try:
-        response = requests.post(url, json=payload)
-        if response.status_code != 200:
-            print(f"❌ Telegram Error: {response.text}")
-    except Exception as e:
-        print(f"❌ Telegram Notification Failed: {e}")
 
-def save_price_history(symbol, price):
-    """Save price history to the PostgreSQL database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-        INSERT INTO price_history (symbol, price)
-        VALUES (%s, %s)
-        """, (symbol, price))
-        conn.commit()
-    except Exception as e:
-        print(f"Error saving price history to database: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        telegram_queue.put_nowait(message)
+    except asyncio.QueueFull:
+        increment("telegram_notifications_total", result="dropped")
+        print(f"⚠️ Telegram queue full, dropped: {message}")
+
+def telegram_digest(messages):
+    """Join queued notifications into as few messages as Telegram's size limit allows."""
+    if len(messages) == 1:
+        return [messages[0][:TELEGRAM_MAX_LENGTH]]
+    digests = []
+    current = f"📬 {len(messages)} notifications:"
+    for message in messages:
+        line = f"\n• {message}"[:TELEGRAM_MAX_LENGTH]
+        if len(current) + len(line) > TELEGRAM_MAX_LENGTH:
+            digests.append(current)
+            current = line.lstrip("\n")
+        else:
+            current += line
+    digests.append(current)
+    return digests
+
+async def post_telegram_message(text):
+    """Send one message, retrying timeouts, 5xx and 429 (after its retry_after). Returns True when sent."""
+    url = f"https://api.telegram.org/bot{TELEGRAM_CONFIG['bot_token']}/sendMessage"
+    payload = {"chat_id": TELEGRAM_CONFIG["chat_id"], "text": text}
+    session = await get_http_session()
+    for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+        delay = min(30, 2 ** attempt)
+        try:
+            with timed("telegram_request_seconds"):
+                async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=TELEGRAM_TIMEOUT)) as response:
+                    if response.status == 200:
+                        return True
+                    error = await response.text()
+            if response.status == 429:
+                try:
+                    delay = json.loads(error)["parameters"]["retry_after"]
+                except (ValueError, KeyError, TypeError):
+                    pass
+            elif response.status < 500:
+                print(f"❌ Telegram Error: {error}")
+                return False  # Bad token, chat or message: retrying won't help
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = f"{type(e).__name__}: {e}"
+        if attempt < TELEGRAM_MAX_RETRIES:
+            print(f"⚠️ Telegram request failed ({error}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+    print(f"❌ Telegram Notification Failed: {error}")
+    return False
+
+async def telegram_notifier():
+    """Send queued notifications, at most one request per TELEGRAM_MIN_INTERVAL.
+
+    Notifications that queue up meanwhile go out together as one digest.
+    """
+    next_send = 0.0
+    while True:
+        messages = [await telegram_queue.get()]
+        await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+        while not telegram_queue.empty():
+            messages.append(telegram_queue.get_nowait())
+        try:
+            sent = True
+            for text in telegram_digest(messages):
+                await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+                sent = await post_telegram_message(text) and sent
+                next_send = time.monotonic() + TELEGRAM_MIN_INTERVAL
+            increment("telegram_notifications_total", len(messages), result="sent" if sent else "failed")
+        except Exception as e:
+            increment("telegram_notifications_total", len(messages), result="failed")
+            print(f"❌ Telegram Notification Failed: {e}")
+        finally:
+            for _ in messages:
+                telegram_queue.task_done()
+
+async def drain_telegram_notifications(timeout=10):
+    """Give queued notifications a chance to go out on a clean exit."""
+    try:
+        await asyncio.wait_for(telegram_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️ {telegram_queue.qsize()} Telegram notifications not sent before shutdown.")
+
+def copy_price_history(rows):
+    """Write (symbol, timestamp, price) rows to price_history with a single COPY.
+
+    Rows go through a temporary staging table so the timezone-aware tick
+    timestamps are converted with the session TimeZone, exactly like the
+    CURRENT_TIMESTAMP default of a single-row insert. Raises on failure.
+    """
+    buffer = io.StringIO()
+    for symbol, timestamp, price in rows:
+        buffer.write(f"{symbol}\t{timestamp.isoformat()}\t{price!r}\n")
+    buffer.seek(0)
 
-def save_state(symbol, initial_price, total_trades, total_profit):
-    """Save the trading state to the PostgreSQL database."""
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("""
-        INSERT INTO trading_state (symbol, initial_price, total_trades, total_profit)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (symbol) DO UPDATE
-        SET initial_price = EXCLUDED.initial_price,
-            total_trades = EXCLUDED.total_trades,
-            total_profit = EXCLUDED.total_profit
-        """, (symbol, initial_price, total_trades, total_profit))
+        CREATE TEMP TABLE IF NOT EXISTS price_history_staging (
+            symbol TEXT, timestamp TIMESTAMPTZ, price REAL
+        ) ON COMMIT DELETE ROWS
+        """)
+        cursor.copy_expert("COPY price_history_staging (symbol, timestamp, price) FROM STDIN", buffer)
+        cursor.execute("""
+        INSERT INTO price_history (symbol, timestamp, price)
+        SELECT symbol, timestamp, price FROM price_history_staging
+        ON CONFLICT DO NOTHING
+        """)
         conn.commit()
-    except Exception as e:
-        print(f"Error saving state to database: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+
+def load_states(symbols):
+    """Load the trading state and price history tiers of many symbols in one query.
+
+    Returns {symbol: crypto_data record} for the symbols that have a trading_state row.
+    Each symbol's newest raw ticks (and, when bucketed, the closes of its newest
+    LONG_TERM_MA_PERIOD buckets) come from LATERAL subqueries, so the database does
+    the per-symbol LIMIT and bucket aggregation and only the needed rows are transferred.
+    """
+    if HISTORY_BUCKET_SECONDS:
+        bucket_columns = "t.buckets, t.closes"
+        bucket_join = """
+        LEFT JOIN LATERAL (
+            SELECT ARRAY_AGG(bucket ORDER BY bucket) AS buckets, ARRAY_AGG(close ORDER BY bucket) AS closes
+            FROM (
+                SELECT bucket, (ARRAY_AGG(price ORDER BY timestamp DESC))[1] AS close
+                FROM (
+                    SELECT FLOOR(EXTRACT(EPOCH FROM p.timestamp::TIMESTAMPTZ) / %(seconds)s) AS bucket, p.timestamp, p.price
+                    FROM price_history p
+                    WHERE p.symbol = s.symbol
+                      AND p.timestamp >= (SELECT MAX(timestamp) FROM price_history WHERE symbol = s.symbol)
+                                         - MAKE_INTERVAL(secs => %(span)s)
+                ) ticks
+                GROUP BY bucket
+                ORDER BY bucket DESC
+                LIMIT %(buckets)s
+            ) newest
+        ) t ON TRUE"""
+    else:
+        bucket_columns = "NULL, NULL"
+        bucket_join = ""
 
-def load_state(symbol):
-    """Load the trading state from the PostgreSQL database."""
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # Load trading metrics from trading_state
-        cursor.execute("""
-        SELECT initial_price, total_trades, total_profit
-        FROM trading_state
-        WHERE symbol = %s
-        """, (symbol,))
-        row = cursor.fetchone()
-
-        if row:
-            # Convert decimal.Decimal to float if necessary
-            initial_price = float(row[0]) if isinstance(row[0], Decimal) else row[0]
-            total_trades = int(row[1])
-            total_profit = float(row[2]) if isinstance(row[2], Decimal) else row[2]
-
-            # Load price history from price_history table
-            cursor.execute("""
-            SELECT price
-            FROM price_history
-            WHERE symbol = %s
-            ORDER BY timestamp DESC
-            LIMIT %s
-            """, (symbol, price_history_maxlen))
-            price_history = [float(row[0]) for row in cursor.fetchall()]
-
-            return {
-                "price_history": deque(price_history, maxlen=price_history_maxlen),
-                "initial_price": initial_price,
-                "total_trades": total_trades,
-                "total_profit": total_profit,
+        cursor.execute(f"""
+        SELECT s.symbol, s.initial_price, s.total_trades, s.total_profit, h.prices, {bucket_columns}
+        FROM UNNEST(%(symbols)s::TEXT[], %(depths)s::INTEGER[]) AS wanted(symbol, depth)
+        JOIN trading_state s ON s.symbol = wanted.symbol
+        LEFT JOIN LATERAL (
+            SELECT ARRAY_AGG(price ORDER BY timestamp) AS prices
+            FROM (
+                SELECT p.timestamp, p.price
+                FROM price_history p
+                WHERE p.symbol = s.symbol
+                ORDER BY p.timestamp DESC
+                LIMIT wanted.depth
+            ) recent
+        ) h ON TRUE{bucket_join}
+        """, {"symbols": list(symbols), "depths": [raw_history_depth(coins_config[symbol]) for symbol in symbols],
+              "seconds": HISTORY_BUCKET_SECONDS, "span": HISTORY_BUCKET_SECONDS * LONG_TERM_MA_PERIOD,
+              "buckets": LONG_TERM_MA_PERIOD})
+
+        states = {}
+        for symbol, initial_price, total_trades, total_profit, prices, buckets, closes in cursor.fetchall():
+            states[symbol] = {
+                **new_price_tiers(coins_config[symbol], [float(price) for price in prices or []],
+                                  [(int(bucket), float(close)) for bucket, close in zip(buckets or [], closes or [])]),
+                "initial_price": float(initial_price) if initial_price is not None else None,
+                "total_trades": int(total_trades),
+                "total_profit": float(total_profit),
             }
-        return None
+        return states
     except Exception as e:
+        increment("errors_total", source="postgres")
         print(f"Error loading state from database: {e}")
-        return None
+        return {}
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+
+JWT_LIFETIME = 120  # Seconds a token is valid (Coinbase maximum)
+JWT_REUSE_MARGIN = 15  # Stop reusing a cached token this many seconds before it expires
+
+private_key = None
+jwt_cache = {}  # "GET host/path" -> (token, expires_at)
+
+def get_private_key():
+    """Parse the PEM signing key once per process."""
+    global private_key
+    if private_key is None:
+        private_key = serialization.load_pem_private_key(key_secret.encode("utf-8"), password=None)
+    return private_key
 
 def build_jwt(uri):
-    """Generate a JWT token for Coinbase API authentication."""
-    private_key_bytes = key_secret.encode("utf-8")
-    private_key = serialization.load_pem_private_key(private_key_bytes, password=None)
+    """Generate a JWT token for Coinbase API authentication.
+
+    Read-only GET requests reuse a signed token for the same URI until shortly
+    before it expires. Any other method always gets a fresh token and nonce.
+    """
+    now = int(time.time())
+    cacheable = uri.startswith("GET ")
+    if cacheable:
+        cached = jwt_cache.get(uri)
+        if cached and cached[1] - JWT_REUSE_MARGIN > now:
+            return cached[0]
 
     jwt_payload = {
         "sub": key_name,
         "iss": "cdp",
-        "nbf": int(time.time()),
-        "exp": int(time.time()) + 120,
+        "nbf": now,
+        "exp": now + JWT_LIFETIME,
         "uri": uri,
     }
 
     jwt_token = jwt.encode(
         jwt_payload,
-        private_key,
+        get_private_key(),
         algorithm="ES256",
         headers={"kid": key_name, "nonce": secrets.token_hex()},
     )
-
-    return jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
-
-async def api_request(method, path, body=None):
-    """Send authenticated requests to Coinbase API asynchronously."""
-    uri = f"{method} {request_host}{path}"
-    jwt_token = build_jwt(uri)
-
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Content-Type": "application/json",
-        "CB-VERSION": "2024-02-05"
-    }
-
+    jwt_token = jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
+
+    if cacheable:
+        if len(jwt_cache) > 256:
+            # Drop expired tokens (e.g. one-off order status URIs)
+            for stale_uri in [u for u, (_, exp) in jwt_cache.items() if exp <= now]:
+                del jwt_cache[stale_uri]
+        jwt_cache[uri] = (jwt_token, now + JWT_LIFETIME)
+
+    return jwt_token
+
+http_session = None
+
+async def get_http_session():
+    """Return the shared aiohttp session, creating it on first use."""
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT),
+        )
+    return http_session
+
+async def close_http_session():
+    """Close the shared aiohttp session and its pooled connections."""
+    global http_session
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+    http_session = None
+
+class TokenBucket:
+    """`rate` tokens per second, of which up to `burst` can be saved up."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # Set after a 429 from Coinbase
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class RequestScheduler:
+    """Hands out Coinbase request slots from the per-class and total token buckets, by lane priority."""
+
+    def __init__(self, limits):
+        self.total = TokenBucket(limits["total"]["rate"], limits["total"]["burst"])
+        self.buckets = {name: TokenBucket(limit["rate"], limit["burst"]) for name, limit in limits.items() if name != "total"}
+        self.priorities = {name: limit["priority"] for name, limit in limits.items() if name != "total"}
+        self.waiting = []  # Sorted (priority, sequence, endpoint class, future)
+        self.sequence = 0
+        self.timer = None
+
+    async def acquire(self, endpoint_class, max_wait):
+        """Wait for a request slot. Returns the seconds waited, or None when none came within `max_wait`."""
+        if not self.waiting:
+            now = time.monotonic()
+            bucket = self.buckets[endpoint_class]
+            if bucket.wait_time(now) == 0 and self.total.wait_time(now) == 0:
+                bucket.tokens -= 1
+                self.total.tokens -= 1
+                return 0.0
+
+        start = time.monotonic()
+        self.sequence += 1
+        entry = (self.priorities[endpoint_class], self.sequence, endpoint_class, asyncio.get_running_loop().create_future())
+        bisect.insort(self.waiting, entry)
+        self.dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(entry[3]), max_wait)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if not entry[3].done():  # Timed out or cancelled: give up the place in the queue
+                self.waiting.remove(entry)
+        return time.monotonic() - start if entry[3].done() else None
+
+    def dispatch(self):
+        """Grant slots to waiting requests in priority order while the buckets allow it."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        now = time.monotonic()
+        retry_in = None
+        for entry in list(self.waiting):
+            _, _, endpoint_class, future = entry
+            bucket = self.buckets[endpoint_class]
+            wait = max(bucket.wait_time(now), self.total.wait_time(now))
+            if wait == 0:
+                bucket.tokens -= 1
+                self.total.tokens -= 1
+                self.waiting.remove(entry)
+                if not future.done():
+                    future.set_result(True)
+                continue
+            retry_in = wait if retry_in is None else min(retry_in, wait)
+            if self.total.wait_time(now) > 0:
+                break  # Lower priority lanes must not take the next shared token
+        if self.waiting and self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(retry_in or 0.01, self.dispatch)
+
+    def pause(self, endpoint_class, seconds):
+        """Back off after a 429: Coinbase limits per API key, so every lane waits."""
+        self.buckets[endpoint_class].pause(seconds)
+        self.total.pause(seconds)
+
+request_scheduler = None
+
+def get_request_scheduler():
+    global request_scheduler
+    if request_scheduler is None:
+        request_scheduler = RequestScheduler(RATE_LIMITS)
+    return request_scheduler
+
+def endpoint_class(method, path):
+    """Rate limit lane of a Coinbase call: "orders", "accounts" or "market_data"."""
+    if path.startswith("/api/v3/brokerage/orders"):
+        return "orders"
+    if path.startswith("/api/v3/brokerage/accounts"):
+        return "accounts"
+    return "market_data"
+
+def retry_after_seconds(value, attempt):
+    """Seconds to back off after a 429: the Retry-After header (seconds or HTTP date), else exponential backoff."""
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(RATE_LIMIT_MAX_BACKOFF, RATE_LIMIT_BASE_BACKOFF * 2 ** attempt)
+
+def endpoint_label(method, path):
+    """Metrics label for a Coinbase call, e.g. "GET /products/{product_id}" (ids removed to keep few label values)."""
+    parts = path.replace("/api/v3/brokerage", "", 1).split("/")
+    if len(parts) > 2 and parts[1] == "products":
+        parts[2] = "{product_id}"
+    if len(parts) > 3 and parts[1:3] == ["orders", "historical"] and parts[3] not in ("batch", "fills"):
+        parts[3] = "{order_id}"
+    return f"{method} {'/'.join(parts)}"
+
+async def api_request(method, path, body=None, timeout=None, params=None):
+    """Send authenticated requests to Coinbase API asynchronously.
+
+    Requests go through the rate limiter (see RATE_LIMITS) and are retried after a
+    429 once its Retry-After has passed. Orders keep their client_order_id across
+    retries, so Coinbase cannot fill one twice.
+    """
+    uri = f"{method} {request_host}{path}"  # Query parameters are not part of the signed URI
     url = f"https://{request_host}{path}"
-    async with aiohttp.ClientSession() as session:
-        async with session.request(method, url, headers=headers, json=body) as response:
-            if response.status == 200:
-                return await response.json()
-            else:
-                return {"error": await response.text()}
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+    lane = endpoint_class(method, path)
+    scheduler = get_request_scheduler()
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        waited = await scheduler.acquire(lane, RATE_LIMITS[lane]["max_wait"])
+        if waited is None:
+            increment("rate_limit_rejected_total", endpoint_class=lane)
+            return {"error": f"Rate limited: no {lane} request slot within {RATE_LIMITS[lane]['max_wait']}s"}
+        if waited > 0:
+            increment("rate_limit_throttled_total", endpoint_class=lane)
+            observe("rate_limit_wait_seconds", waited, endpoint_class=lane)
+
+        headers = {
+            "Authorization": f"Bearer {build_jwt(uri)}",  # Signed per attempt, a backoff can outlast the token
+            "Content-Type": "application/json",
+            "CB-VERSION": "2024-02-05"
+        }
+        session = await get_http_session()
+        try:
+            with timed("coinbase_request_seconds", endpoint=endpoint_label(method, path)):
+                async with session.request(method, url, headers=headers, json=body, params=params, timeout=request_timeout) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    if response.status == 429:
+                        increment("rate_limit_429_total", endpoint_class=lane)
+                        delay = retry_after_seconds(response.headers.get("Retry-After"), attempt)
+                        scheduler.pause(lane, delay)
+                        if attempt < HTTP_MAX_RETRIES:
+                            print(f"⏳ Coinbase rate limit hit ({endpoint_label(method, path)}), retrying in {delay:.1f}s")
+                            continue
+                        increment("rate_limit_rejected_total", endpoint_class=lane)
+                    increment("errors_total", source="coinbase")
+                    return {"error": await response.text(), "status": response.status}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            increment("errors_total", source="coinbase")
+            return {"error": f"{type(e).__name__}: {e}"}
 
 async def get_crypto_price(crypto_symbol):
     """Fetch cryptocurrency price from Coinbase asynchronously."""
@@ -212,25 +762,217 @@ async def get_crypto_price(crypto_symbol):
     print(f"Error fetching {crypto_symbol} price: {data.get('error', 'Unknown error')}")
     return None
 
-def update_balances(balances):
-    """Update the balances table in the database with the provided balances."""
+MARKET_SNAPSHOT_CHUNK = 100  # Max product_ids per batched request
+
+def parse_timestamp(value):
+    """Convert a Coinbase RFC3339 timestamp (up to nanoseconds) to epoch seconds."""
+    if not value:
+        return None
+    try:
+        main, _, fraction = value.rstrip("Z").partition(".")
+        seconds = datetime.fromisoformat(main).replace(tzinfo=timezone.utc).timestamp()
+        return seconds + (float(f"0.{fraction}") if fraction else 0.0)
+    except ValueError:
+        return None
+
+async def get_market_snapshot(symbols):
+    """Fetch price, best bid/ask and quote time for many symbols in a few requests.
+
+    Returns {symbol: {"price", "bid", "ask", "time"}}. Symbols missing from the
+    responses are left out so the caller can fall back to get_crypto_price().
+    """
+    snapshot = {}
+    for i in range(0, len(symbols), MARKET_SNAPSHOT_CHUNK):
+        chunk = symbols[i:i + MARKET_SNAPSHOT_CHUNK]
+        params = [("product_ids", f"{symbol}-{quote_currency}") for symbol in chunk]
+        products, books = await asyncio.gather(
+            api_request("GET", "/api/v3/brokerage/products", params=params),
+            api_request("GET", "/api/v3/brokerage/best_bid_ask", params=params),
+        )
+
+        if "error" in products:
+            print(f"Error fetching batched prices: {products['error']}")
+        if "error" in books:
+            print(f"Error fetching batched order books: {books['error']}")
+
+        quotes = {}
+        for book in books.get("pricebooks", []):
+            symbol = book.get("product_id", "").rsplit("-", 1)[0]
+            bids, asks = book.get("bids"), book.get("asks")
+            quotes[symbol] = {
+                "bid": float(bids[0]["price"]) if bids else None,
+                "ask": float(asks[0]["price"]) if asks else None,
+                "time": parse_timestamp(book.get("time")),
+            }
+
+        prices = {}
+        for product in products.get("products", []):
+            if product.get("price"):
+                prices[product["product_id"].rsplit("-", 1)[0]] = float(product["price"])
+
+        for symbol in chunk:
+            quote = quotes.get(symbol, {"bid": None, "ask": None, "time": None})
+            price = prices.get(symbol)
+            if price is None and quote["bid"] and quote["ask"]:
+                price = (quote["bid"] + quote["ask"]) / 2  # Fall back to the mid price
+            if price is None:
+                continue
+            snapshot[symbol] = {
+                "price": price,
+                "bid": quote["bid"],
+                "ask": quote["ask"],
+                "time": quote["time"] or time.time(),
+            }
+
+    return snapshot
+
+async def get_prices(symbols):
+    """Return current prices for `symbols` (same order) from one batched snapshot.
+
+    Symbols the snapshot could not price are fetched one by one as a fallback.
+    """
+    snapshot = await get_market_snapshot(symbols)
+    missing = [symbol for symbol in symbols if symbol not in snapshot]
+    if missing:
+        print(f"⚠️ Batched snapshot missing {', '.join(missing)}. Fetching individually.")
+        fallback = await asyncio.gather(*[get_crypto_price(symbol) for symbol in missing])
+        for symbol, price in zip(missing, fallback):
+            if price:
+                snapshot[symbol] = {"price": price, "bid": None, "ask": None, "time": time.time()}
+
+    for symbol, quote in snapshot.items():
+        if symbol in crypto_data:
+            crypto_data[symbol]["quote"] = quote
+
+    return [snapshot[symbol]["price"] if symbol in snapshot else None for symbol in symbols]
+
+# Latest ticker per symbol, filled by ticker_feed() in websocket mode
+ticker_prices = {}
+ticker_updated = set()  # Symbols with a new price since the trading loop last looked
+ticker_event = asyncio.Event()
+
+def store_ticker(symbol, quote):
+    """Record a new quote for `symbol` and wake up the trading loop."""
+    ticker_prices[symbol] = quote
+    ticker_updated.add(symbol)
+    ticker_event.set()
+
+def handle_ticker_message(data, symbols):
+    """Apply the tickers of one WebSocket message to ticker_prices."""
+    if data.get("channel") != "ticker":
+        return
+    message_time = parse_timestamp(data.get("timestamp")) or time.time()
+    for event in data.get("events", []):
+        for ticker in event.get("tickers", []):
+            symbol = ticker.get("product_id", "").rsplit("-", 1)[0]
+            if symbol not in symbols or not ticker.get("price"):
+                continue
+            store_ticker(symbol, {
+                "price": float(ticker["price"]),
+                "bid": float(ticker["best_bid"]) if ticker.get("best_bid") else None,
+                "ask": float(ticker["best_ask"]) if ticker.get("best_ask") else None,
+                "time": message_time,
+            })
+
+async def resync_ticker_prices(symbols):
+    """Refill ticker_prices from a REST snapshot after a (re)connect or a sequence gap."""
+    increment("ticker_feed_events_total", event="resyncs")
+    snapshot = await get_market_snapshot(symbols)
+    for symbol, quote in snapshot.items():
+        current = ticker_prices.get(symbol)
+        if current is None or quote["time"] >= current["time"]:
+            store_ticker(symbol, quote)
+
+async def ticker_feed(symbols):
+    """Follow the Coinbase WebSocket ticker channel for `symbols`, reconnecting forever.
+
+    Every message carries a per-connection sequence_num. A jump means messages
+    were lost, so prices are resynced from REST. Stale or dropped connections
+    are reopened with exponential backoff and resubscribed.
+    """
+    product_ids = [f"{symbol}-{quote_currency}" for symbol in symbols]
+    record_file = open(MARKET_DATA_RECORD_PATH, "a") if MARKET_DATA_RECORD_PATH else None
+    backoff = 1
+    try:
+        while True:
+            last_sequence = None
+            try:
+                session = await get_http_session()
+                async with session.ws_connect(MARKET_DATA_WS_URL, heartbeat=MARKET_DATA_STALE_AFTER / 2, max_msg_size=0) as ws:
+                    for channel in ("ticker", "heartbeats"):
+                        await ws.send_json({"type": "subscribe", "product_ids": product_ids, "channel": channel})
+                    print(f"📡 Subscribed to ticker feed for {len(product_ids)} products at {MARKET_DATA_WS_URL}")
+                    await resync_ticker_prices(symbols)  # Cover anything missed while (re)connecting
+                    backoff = 1
+
+                    while True:
+                        msg = await ws.receive(timeout=MARKET_DATA_STALE_AFTER)
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            print(f"⚠️ Ticker feed closed ({msg.type.name}).")
+                            break
+
+                        data = json.loads(msg.data)
+                        if data.get("type") == "error" or data.get("channel") == "error":
+                            print(f"❌ Ticker feed error: {data.get('message', data)}")
+                            continue
+
+                        sequence = data.get("sequence_num")
+                        if sequence is not None:
+                            if last_sequence is not None and sequence <= last_sequence:
+                                continue  # Duplicate or out-of-order message
+                            if last_sequence is not None and sequence != last_sequence + 1:
+                                increment("ticker_feed_events_total", event="gaps")
+                                print(f"⚠️ Ticker feed gap: expected sequence {last_sequence + 1}, got {sequence}. Resyncing.")
+                                await resync_ticker_prices(symbols)
+                            last_sequence = sequence
+
+                        increment("ticker_feed_events_total", event="messages")
+                        if record_file:
+                            record_file.write(msg.data.rstrip("\n") + "\n")
+                            record_file.flush()
+                        handle_ticker_message(data, symbols)
+
+            except asyncio.TimeoutError:
+                print(f"⚠️ Ticker feed silent for {MARKET_DATA_STALE_AFTER}s. Reconnecting.")
+            except aiohttp.ClientError as e:
+                print(f"🚨 Ticker feed connection error: {e}")
+
+            increment("ticker_feed_events_total", event="reconnects")
+            print(f"🔄 Reconnecting ticker feed in {backoff}s...")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+    finally:
+        if record_file:
+            record_file.close()
+
+def save_changed_rows(state_rows, balance_rows):
+    """Upsert trading_state and balances rows in one transaction, one multi-row statement per table."""
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        for currency, available_balance in balances.items():
-            # Insert or update the balance in the database
-            cursor.execute("""
+        if state_rows:
+            execute_values(cursor, """
+            INSERT INTO trading_state (symbol, initial_price, total_trades, total_profit)
+            VALUES %s
+            ON CONFLICT (symbol) DO UPDATE
+            SET initial_price = EXCLUDED.initial_price,
+                total_trades = EXCLUDED.total_trades,
+                total_profit = EXCLUDED.total_profit
+            """, state_rows, page_size=len(state_rows))
+        if balance_rows:
+            execute_values(cursor, """
             INSERT INTO balances (currency, available_balance)
-            VALUES (%s, %s)
+            VALUES %s
             ON CONFLICT (currency) DO UPDATE
             SET available_balance = EXCLUDED.available_balance
-            """, (currency, available_balance))
+            """, balance_rows, page_size=len(balance_rows))
         conn.commit()
-    except Exception as e:
-        print(f"Error updating balances: {e}")
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 async def get_balances():
     """Fetch balances from Coinbase and return them as a dictionary."""
@@ -246,8 +988,16 @@ async def get_balances():
     
     return balances
 
+ORDER_CONFIRM_TIMEOUT = 30  # Seconds to wait for a placed order to reach a final status
+ORDER_CONFIRM_DELAYS = (0.2, 0.5, 1, 2, 5)  # Pauses between order status checks (the last one repeats)
+ORDER_FINAL_STATUSES = ("FILLED", "CANCELLED", "EXPIRED", "FAILED")
+order_confirmations = set()  # Running confirm_order() tasks, awaited on shutdown
+
 async def place_order(crypto_symbol, side, amount, current_price):
-    """Place a buy/sell order for the specified cryptocurrency asynchronously."""
+    """Place a buy/sell order for the specified cryptocurrency asynchronously.
+
+    The trade is recorded by confirm_order() in the background once Coinbase reports the fill.
+    """
     path = "/api/v3/brokerage/orders"
     
     order_data = {
@@ -271,6 +1021,7 @@ async def place_order(crypto_symbol, side, amount, current_price):
         # Ensure buy order is above minimum required buy amount
         if quote_cost < min_order_sizes["buy"]:
             print(f"🚫  - Buy order too small: ${quote_cost} (minimum: ${min_order_sizes['buy']})")
+            increment("orders_total", side=side, result="too_small")
             return False
         
         # Round amount according to precision
@@ -289,6 +1040,7 @@ async def place_order(crypto_symbol, side, amount, current_price):
         # 🚨 Ensure sell amount meets minimum order size
         if rounded_amount < min_order_sizes["sell"]:
             print(f"🚫  - Sell order too small: {rounded_amount:.{precision}f} {crypto_symbol} (minimum: {min_order_sizes['sell']:.{precision}f} {crypto_symbol})")
+            increment("orders_total", side=side, result="too_small")
             return False
 
         # 🔄 Ensure the API receives the correctly formatted amount
@@ -297,8 +1049,9 @@ async def place_order(crypto_symbol, side, amount, current_price):
         print(f"🛠️  - Adjusted Sell Amount for {crypto_symbol}: {rounded_amount:.{precision}f} (Precision: {precision})")
     
     # Log the order details
-    print(f"🛠️  - Placing {side} order for {crypto_symbol}: Amount = {rounded_amount}, Price = {await get_crypto_price(crypto_symbol)}")
+    print(f"🛠️  - Placing {side} order for {crypto_symbol}: Amount = {rounded_amount}, Price = {current_price}")
 
+    sent_at = time.perf_counter()
     response = await api_request("POST", path, order_data)
 
     if DEBUG_MODE:
@@ -308,22 +1061,134 @@ async def place_order(crypto_symbol, side, amount, current_price):
     if response.get("success", False):
         order_id = response["success_response"]["order_id"]
         print(f"✅  - {side.upper()} Order Placed for {crypto_symbol}: Order ID = {order_id}")
-        
-        # Log the trade in the database
-        current_price = await get_crypto_price(crypto_symbol)
-        if current_price:
-            await log_trade(crypto_symbol, side, rounded_amount, current_price)
+        increment("orders_total", side=side, result="placed")
+
+        # Log the trade with its actual fill once Coinbase has executed it. Until then the ledger
+        # and balances don't show it, so the symbol's decisions wait (see trade_symbol)
+        crypto_data[crypto_symbol]["pending_order"] = order_id
+        task = asyncio.create_task(confirm_order(order_id, crypto_symbol, side, rounded_amount, current_price, sent_at))
+        order_confirmations.add(task)
+        task.add_done_callback(order_confirmations.discard)
 
         return True
     else:
         print(f"❌  - Order Failed for {crypto_symbol}: {response.get('error', 'Unknown error')}")
+        increment("orders_total", side=side, result="failed")
         print(f"🔄  - Raw Response: {response}")
         message = f"⚠️ Order Failed for {crypto_symbol}"
         send_telegram_notification(message)
         return False
 
-async def log_trade(symbol, side, amount, price):
-    """Log a trade in the trades table."""
+async def get_order_status(order_id):
+    """Poll an order until it has a final status or ORDER_CONFIRM_TIMEOUT passes. Returns the last order seen."""
+    path = f"/api/v3/brokerage/orders/historical/{order_id}"
+    deadline = time.monotonic() + ORDER_CONFIRM_TIMEOUT
+    order = {}
+    attempt = 0
+    while True:
+        data = await api_request("GET", path)
+        order = data.get("order") or order
+        if order.get("status") in ORDER_FINAL_STATUSES:
+            return order
+        delay = ORDER_CONFIRM_DELAYS[min(attempt, len(ORDER_CONFIRM_DELAYS) - 1)]
+        if time.monotonic() + delay > deadline:
+            return order
+        attempt += 1
+        await asyncio.sleep(delay)
+
+async def get_fills_execution(order_id):
+    """(filled size, average price, fees) summed over the order's fills, or None without fills."""
+    data = await api_request("GET", "/api/v3/brokerage/orders/historical/fills", params=[("order_ids", order_id)])
+    size = value = fees = 0.0
+    for fill in data.get("fills", []):
+        price = float(fill["price"])
+        fill_size = float(fill["size"])
+        if fill.get("size_in_quote"):
+            fill_size /= price
+        size += fill_size
+        value += fill_size * price
+        fees += float(fill.get("commission") or 0)
+    return (size, value / size, fees) if size > 0 else None
+
+async def confirm_order(order_id, symbol, side, amount, price, sent_at):
+    """Record the executed size and average price of a placed order in `trades` and the position ledger.
+
+    Falls back to the order amount at the decision price when the fill can't be confirmed.
+    Clears the symbol's pending_order when done, so its decisions resume.
+    """
+    global balances_stale
+    try:
+        await record_order_fill(order_id, symbol, side, amount, price, sent_at)
+    finally:
+        balances_stale = True  # Make sure the next decision sees balances fetched after the fill
+        if crypto_data.get(symbol, {}).get("pending_order") == order_id:
+            crypto_data[symbol]["pending_order"] = None
+
+async def record_order_fill(order_id, symbol, side, amount, price, sent_at):
+    order = await get_order_status(order_id)
+    buy_price = get_avg_buy_price(symbol) if side == "SELL" else None  # Before the sell closes the position
+    status = order.get("status", "UNKNOWN")
+    execution = None
+    if float(order.get("filled_size") or 0) > 0 and float(order.get("average_filled_price") or 0) > 0:
+        execution = (float(order["filled_size"]), float(order["average_filled_price"]), float(order.get("total_fees") or 0))
+    elif status not in ("CANCELLED", "EXPIRED", "FAILED"):
+        execution = await get_fills_execution(order_id)
+
+    if execution:
+        filled_size, fill_price, fees = execution
+        observe("order_confirmation_seconds", time.perf_counter() - sent_at, side=side)
+        increment("orders_total", side=side, result="filled")
+        print(f"📄  - {side} {symbol} filled: {filled_size} at {fill_price} "
+              f"({(fill_price / price - 1) * 100:+.3f}% vs. {price}), fees {fees:.2f} {quote_currency}")
+        await log_trade(symbol, side, filled_size, fill_price)
+    elif status in ("CANCELLED", "EXPIRED", "FAILED"):
+        increment("orders_total", side=side, result=status.lower())
+        print(f"❌  - {side} order {order_id} for {symbol} ended {status} without fills. Nothing recorded.")
+        send_telegram_notification(f"⚠️ {side} order for {symbol} ended {status} without fills")
+        return
+    else:
+        increment("orders_total", side=side, result="unconfirmed")
+        print(f"⚠️  - Could not confirm the fill of {side} order {order_id} for {symbol} (status {status}). "
+              f"Recording {amount} at the decision price {price}.")
+        execution = (amount, price, 0.0)
+        await log_trade(symbol, side, amount, price)
+
+    if side == "BUY":
+        avg_price = get_avg_buy_price(symbol)  # Kept in the position ledger, nothing to write
+        if avg_price is not None:
+            print(f"📒  - {symbol} Weighted Average Buy Price Updated: {avg_price:.6f} USDC")
+    else:
+        record_sell(symbol, *execution, buy_price)
+
+def record_sell(symbol, amount, price, fees, buy_price):
+    """Count an executed sell in the symbol's performance, reset its re-entry price and announce it."""
+    price_precision = coins_config[symbol]["precision"]["price"]
+    crypto_data[symbol]["total_trades"] += 1
+
+    if buy_price:
+        sell_profit = (price - buy_price) * amount - fees
+        crypto_data[symbol]["total_profit"] += sell_profit
+        print(f"💰  - {symbol} Profit Calculated: (Sell: {price:.{price_precision}f} - Buy: {buy_price:.{price_precision}f}) * {amount:.4f} - Fees: {fees:.2f} = {sell_profit:.2f} USDC")
+        message = f"🚀 *SOLD {amount:.4f} {symbol}* at *${price:.{price_precision}f}* USDC, *Total Profit: {sell_profit:.2f}* USDC"
+    else:
+        print(f"⚠️  - No buy data found for {symbol}. Profit calculation skipped.")
+        message = f"🚀 *SOLD {amount:.4f} {symbol}* at *${price:.{price_precision}f}* USDC"
+
+    # 🔄 Reset initial price to long-term MA after sell to allow re-entry
+    long_term_ma = crypto_data[symbol]["indicators"]["values"]["long_term_ma"]
+    if long_term_ma is not None:
+        crypto_data[symbol]["initial_price"] = long_term_ma
+        print(f"🔄  - {symbol} Initial Price Reset to Long-Term MA: {long_term_ma:.{price_precision}f}")
+
+    send_telegram_notification(message)
+
+async def drain_order_confirmations():
+    """Wait for pending order confirmations, so no placed order goes unrecorded on a clean exit."""
+    if order_confirmations:
+        await asyncio.wait(list(order_confirmations), timeout=ORDER_CONFIRM_TIMEOUT)
+
+def save_trade(symbol, side, amount, price):
+    """Insert a trade into the trades table."""
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -333,10 +1198,11 @@ async def log_trade(symbol, side, amount, price):
         """, (symbol, side, amount, price))
         conn.commit()
     except Exception as e:
+        increment("errors_total", source="postgres")
         print(f"Error logging trade: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def calculate_volatility(price_history, volatility_window):
     """Calculate volatility as the standard deviation of price changes over a specific window."""
@@ -417,134 +1283,732 @@ def calculate_long_term_ma(price_history, period=200):
         return None
     return sum(price_history[-period:]) / period
 
-def save_weighted_avg_buy_price(symbol, avg_price):
-    """Store the latest weighted average buy price for a given symbol in the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Streaming indicators: O(1) per-price updates of the values the calculate_*
+# helpers above recompute from the whole history every tick. One state dict per
+# symbol lives in crypto_data[symbol]["indicators"].
+LONG_TERM_MA_PERIOD = 200
+BOLLINGER_PERIOD = 20
+INDICATOR_RESUM_EVERY = 1000  # Recompute running sums from scratch this often to cancel float drift
+
+def new_ema_state(period):
+    return {"period": period, "alpha": 2 / (period + 1), "seed_sum": 0.0, "seed_count": 0, "value": None}
+
+def update_ema(ema, value):
+    """Feed one value into an EMA seeded with the SMA of its first `period` values (as calculate_ema)."""
+    if ema["value"] is None:
+        ema["seed_sum"] += value
+        ema["seed_count"] += 1
+        if ema["seed_count"] == ema["period"]:
+            ema["value"] = ema["seed_sum"] / ema["period"]
+    else:
+        ema["value"] += (value - ema["value"]) * ema["alpha"]
+    return ema["value"]
+
+def new_window_state(size):
+    size = max(1, size)
+    return {"size": size, "values": deque(maxlen=size), "shift": None, "sum": 0.0, "sum_sq": 0.0, "updates": 0}
+
+def update_window(window, value):
+    """Slide a fixed-size ring buffer, keeping the running sum and sum of squares.
+
+    Sums are taken around `shift` (a recent value) so the variance of large prices
+    does not cancel out in float arithmetic.
+    """
+    values = window["values"]
+    if window["shift"] is None:
+        window["shift"] = value
+    shift = window["shift"]
+    if len(values) == window["size"]:
+        oldest = values[0] - shift
+        window["sum"] -= oldest
+        window["sum_sq"] -= oldest * oldest
+    values.append(value)
+    window["sum"] += value - shift
+    window["sum_sq"] += (value - shift) * (value - shift)
+    window["updates"] += 1
+    if window["updates"] % INDICATOR_RESUM_EVERY == 0:
+        window["shift"] = shift = values[-1]
+        window["sum"] = math.fsum(v - shift for v in values)
+        window["sum_sq"] = math.fsum((v - shift) * (v - shift) for v in values)
+
+def replace_window_last(window, value):
+    """Overwrite the newest value of a window (the close of a still-open bucket)."""
+    values = window["values"]
+    if not values:
+        update_window(window, value)
+        return
+    shift = window["shift"]
+    previous = values[-1] - shift
+    values[-1] = value
+    window["sum"] += (value - shift) - previous
+    window["sum_sq"] += (value - shift) * (value - shift) - previous * previous
+
+def window_mean(window):
+    if len(window["values"]) < window["size"]:
+        return None
+    return window["shift"] + window["sum"] / window["size"]
 
-    if avg_price is not None:
-        cursor.execute(
-            """
-            INSERT INTO trading_state (symbol, initial_price, total_trades, total_profit)
-            VALUES (%s, %s, 0, 0)
-            ON CONFLICT (symbol) DO UPDATE
-            SET initial_price = EXCLUDED.initial_price
-            """,
-            (symbol, avg_price)
-        )
+def window_std(window, ddof=0):
+    """Standard deviation of a full window (ddof=0 as np.std, ddof=1 as pandas)."""
+    size = window["size"]
+    if len(window["values"]) < size or size <= ddof:
+        return None
+    variance = (window["sum_sq"] - window["sum"] * window["sum"] / size) / (size - ddof)
+    return math.sqrt(max(variance, 0.0))
+
+def new_stochastic_rsi_state(period=14, k_period=3, d_period=3):
+    return {
+        "period": period,
+        "required": period + d_period,
+        "count": 0,
+        "last_nan": -1,  # Index of the most recent missing RSI value
+        "lows": deque(),  # Monotonic deques of (index, rsi) for the rolling min / max
+        "highs": deque(),
+        "stoch": deque(maxlen=k_period),
+        "k": deque(maxlen=d_period),
+    }
 
-        print(f"💾  - {symbol} Weighted Average Buy Price Updated: {avg_price:.6f} USDC")
+def is_missing(value):
+    return value is None or value != value
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+def trailing_mean(values):
+    """Mean of a full deque, NaN if it is not full or holds a missing value (pandas .rolling().mean())."""
+    if len(values) < values.maxlen or any(is_missing(v) for v in values):
+        return float('nan')
+    return sum(values) / len(values)
 
-def get_weighted_avg_buy_price(symbol):
-    """Fetch the weighted average buy price since the last sell from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def update_stochastic_rsi(stoch, rsi):
+    """Feed one RSI value and return (%K, %D), or (None, None) before `period + d_period` values.
 
-    # ✅ Step 1: Get the most recent SELL trade timestamp
-    cursor.execute(
-        """
-        SELECT timestamp FROM trades 
-        WHERE symbol = %s AND side = 'SELL' 
-        ORDER BY timestamp DESC 
-        LIMIT 1
-        """,
-        (symbol,)
-    )
-    last_sell = cursor.fetchone()
-    last_sell_time = last_sell[0] if last_sell else None
-
-    # ✅ Step 2: Fetch all BUY trades after the last sell (or all if no sells exist)
-    if last_sell_time:
-        cursor.execute(
-            """
-            SELECT amount, price FROM trades 
-            WHERE symbol = %s AND side = 'BUY' 
-            AND timestamp > %s
-            """,
-            (symbol, last_sell_time)
-        )
+    Rolling min / max use monotonic deques, so each update is O(1) amortized. Values
+    match calculate_stochastic_rsi: a window with a missing RSI, or a flat window, gives NaN.
+    """
+    index = stoch["count"]
+    stoch["count"] += 1
+    period = stoch["period"]
+    lows, highs = stoch["lows"], stoch["highs"]
+
+    if is_missing(rsi):
+        stoch["last_nan"] = index
     else:
-        # If no previous sell exists, get all buys
-        cursor.execute(
-            "SELECT amount, price FROM trades WHERE symbol = %s AND side = 'BUY'",
-            (symbol,)
-        )
+        while lows and lows[-1][1] >= rsi:
+            lows.pop()
+        lows.append((index, rsi))
+        while highs and highs[-1][1] <= rsi:
+            highs.pop()
+        highs.append((index, rsi))
+    while lows and lows[0][0] <= index - period:
+        lows.popleft()
+    while highs and highs[0][0] <= index - period:
+        highs.popleft()
+
+    stoch_rsi = float('nan')
+    if index >= period - 1 and stoch["last_nan"] <= index - period:
+        lowest, highest = lows[0][1], highs[0][1]
+        if highest != lowest:
+            stoch_rsi = (rsi - lowest) / (highest - lowest)
+    stoch["stoch"].append(stoch_rsi)
+    stoch["k"].append(trailing_mean(stoch["stoch"]))
+
+    if stoch["count"] < stoch["required"]:
+        return None, None
+    return stoch["k"][-1], trailing_mean(stoch["k"])
+
+def bollinger_from_window(window, num_std_dev=2):
+    """(mid, upper, lower) from a price window, NaN until the window is full (pandas semantics)."""
+    mid = window_mean(window)
+    if mid is None:
+        nan = float('nan')
+        return nan, nan, nan
+    std_dev = window_std(window, ddof=1)
+    return mid, mid + num_std_dev * std_dev, mid - num_std_dev * std_dev
+
+def new_macd_state(short_window, long_window, signal_window):
+    return {
+        "short": new_ema_state(short_window),
+        "long": new_ema_state(long_window),
+        "signal": new_ema_state(signal_window),
+        # calculate_macd() zips the short and long EMA series from their first
+        # values, so each long EMA is paired with the short EMA from
+        # (long_window - short_window) prices earlier. Keep that pairing.
+        "short_lag": deque(maxlen=max(long_window - short_window, 0) + 1),
+        "long_lag": deque(maxlen=max(short_window - long_window, 0) + 1),
+        "required": long_window + signal_window,
+        "count": 0,
+    }
 
-    buy_trades = cursor.fetchall()
-    cursor.close()
-    conn.close()
+def update_macd(macd, price):
+    """Return (macd_line, signal_line, histogram) after one more price, or Nones while warming up."""
+    macd["count"] += 1
+    short_ema = update_ema(macd["short"], price)
+    long_ema = update_ema(macd["long"], price)
+    if short_ema is not None:
+        macd["short_lag"].append(short_ema)
+    if long_ema is not None:
+        macd["long_lag"].append(long_ema)
+    if len(macd["short_lag"]) < macd["short_lag"].maxlen or len(macd["long_lag"]) < macd["long_lag"].maxlen:
+        return None, None, None
 
-    if not buy_trades:
-        if DEBUG_MODE:
-            print(f"⚠️  - No buy trades found for {symbol} after last sell.")
+    macd_line = macd["short_lag"][0] - macd["long_lag"][0]
+    signal_line = update_ema(macd["signal"], macd_line)
+    if signal_line is None or macd["count"] < macd["required"]:
+        return None, None, None
+    return macd_line, signal_line, macd_line - signal_line
 
-        # If no buy trades exist, return None
+def new_rsi_state(period):
+    return {"period": period, "last_price": None, "changes": 0, "avg_gain": 0.0, "avg_loss": 0.0}
+
+def update_rsi(rsi, price):
+    """Wilder RSI seeded with the mean gain/loss of the first `period` changes (as calculate_rsi)."""
+    last_price = rsi["last_price"]
+    rsi["last_price"] = price
+    if last_price is None:
         return None
 
-    # ✅ Step 3: Calculate the **correct** weighted average price
-    total_amount = sum(trade[0] for trade in buy_trades)  # Sum of all bought amounts
-    if total_amount == 0:
-        print(f"🔥  - Total amount for {symbol} is 0. Returning None.")
-        return None  # Prevent division by zero
+    change = price - last_price
+    gain = max(change, 0.0)
+    loss = max(-change, 0.0)
+    period = rsi["period"]
+    rsi["changes"] += 1
+    if rsi["changes"] <= period:
+        rsi["avg_gain"] += gain / period
+        rsi["avg_loss"] += loss / period
+        if rsi["changes"] < period:
+            return None
+    else:
+        rsi["avg_gain"] = (rsi["avg_gain"] * (period - 1) + gain) / period
+        rsi["avg_loss"] = (rsi["avg_loss"] * (period - 1) + loss) / period
+
+    rs = rsi["avg_gain"] / rsi["avg_loss"] if rsi["avg_loss"] != 0 else float('inf')
+    return 100 - (100 / (1 + rs))
+
+def new_indicator_state(settings):
+    """Empty streaming state for one coin's settings (see coins in config.json)."""
+    return {
+        "macd": new_macd_state(settings["macd_short_window"], settings["macd_long_window"], settings["macd_signal_window"]),
+        "rsi": new_rsi_state(14),  # process_symbol has always used calculate_rsi's default period
+        "trend": new_window_state(settings["trend_window"]),
+        "long_term": new_window_state(LONG_TERM_MA_PERIOD),
+        "bollinger": new_window_state(BOLLINGER_PERIOD),
+        "stoch": new_stochastic_rsi_state(),  # Fed from process_symbol, alongside rsi_history
+        "returns": new_window_state(settings["volatility_window"] - 1),
+        "last_price": None,
+        "values": {},
+    }
 
-    weighted_avg_price = sum(trade[0] * trade[1] for trade in buy_trades) / total_amount
+def update_indicators(state, price):
+    """Advance every streaming indicator of one symbol by one price and return the current values."""
+    macd_line, signal_line, macd_histogram = update_macd(state["macd"], price)
+    rsi = update_rsi(state["rsi"], price)
+    update_window(state["trend"], price)
+    update_window(state["bollinger"], price)
+    if state["last_price"]:
+        update_window(state["returns"], (price - state["last_price"]) / state["last_price"])
+    state["last_price"] = price
+
+    volatility = window_std(state["returns"])
+    state["values"] = {
+        "macd_line": macd_line,
+        "signal_line": signal_line,
+        "macd_histogram": macd_histogram,
+        "rsi": rsi,
+        "moving_avg": window_mean(state["trend"]),
+        "long_term_ma": window_mean(state["long_term"]),  # Advanced by update_long_term_ma()
+        "bollinger": bollinger_from_window(state["bollinger"]),
+        "volatility": volatility if volatility is not None else 0.0,
+    }
+    return state["values"]
 
-    # print(f"📊 DEBUG - {symbol}: Found {len(buy_trades)} BUY trades after last sell. Calculated Avg Price: {weighted_avg_price:.6f}")
-    
-    return weighted_avg_price
+def update_long_term_ma(state, price, new_bucket=True):
+    """Feed the long-term MA: a new value when a bucket (or, unbucketed, a tick) opens, else the open bucket's close."""
+    if new_bucket:
+        update_window(state["long_term"], price)
+    else:
+        replace_window_last(state["long_term"], price)
+    state["values"]["long_term_ma"] = window_mean(state["long_term"])
+    return state["values"]["long_term_ma"]
+
+def seed_indicators(settings, prices, closes=None):
+    """Build a symbol's streaming indicator state from its raw price history and bucket closes (oldest first).
+
+    Without bucket closes the long-term MA is seeded from the raw prices.
+    """
+    state = new_indicator_state(settings)
+    for price in prices:
+        update_indicators(state, price)
+    for close in (prices if closes is None else closes):
+        update_long_term_ma(state, close)
+    state["values"]["long_term_ma"] = window_mean(state["long_term"])
+    return state
+
+# Tiered price history: per symbol, a ring of the most recent raw ticks (as deep as
+# that coin's tick indicators need) and, unless bucket_seconds is 0, the closes of
+# the last LONG_TERM_MA_PERIOD time buckets for the long-term MA.
+class PriceRing:
+    """Fixed-capacity ring of prices in one compact array('d'), oldest first."""
+
+    __slots__ = ("values", "capacity", "start", "length")
+
+    def __init__(self, capacity, prices=()):
+        self.capacity = max(1, capacity)
+        self.values = array("d", bytes(8 * self.capacity))
+        self.start = 0
+        self.length = 0
+        for price in list(prices)[-self.capacity:]:
+            self.append(price)
+
+    def append(self, price):
+        if self.length < self.capacity:
+            self.values[(self.start + self.length) % self.capacity] = price
+            self.length += 1
+        else:
+            self.values[self.start] = price
+            self.start = (self.start + 1) % self.capacity
+
+    def replace_last(self, price):
+        self.values[(self.start + self.length - 1) % self.capacity] = price
+
+    def tolist(self):
+        end = self.start + self.length
+        if end <= self.capacity:
+            return self.values[self.start:end].tolist()
+        return self.values[self.start:].tolist() + self.values[:end - self.capacity].tolist()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("PriceRing index out of range")
+        return self.values[(self.start + index) % self.capacity]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+def raw_history_depth(settings):
+    """Raw ticks a coin's tick-based indicators need (plus the long-term MA when it is not bucketed)."""
+    depth = max(
+        settings.get("volatility_window", 10),
+        settings.get("trend_window", 20),
+        settings.get("macd_long_window", 26) + settings.get("macd_signal_window", 9),
+        settings.get("rsi_period", 14) + 1,
+        BOLLINGER_PERIOD,
+        3,  # price_slope looks 3 ticks back
+    )
+    if not HISTORY_BUCKET_SECONDS:
+        depth = max(depth, LONG_TERM_MA_PERIOD)
+    return depth
+
+def price_bucket(timestamp):
+    return int(timestamp // HISTORY_BUCKET_SECONDS)
+
+def new_price_buckets(buckets=()):
+    """Bucket tier from (bucket, close) pairs, oldest first."""
+    price_buckets = {"closes": PriceRing(LONG_TERM_MA_PERIOD), "bucket": None}
+    for bucket, close in buckets:
+        price_buckets["closes"].append(close)
+        price_buckets["bucket"] = bucket
+    return price_buckets
+
+def add_to_buckets(price_buckets, price, timestamp):
+    """Record a tick as the close of its bucket. Returns True when the tick opened a new bucket."""
+    bucket = price_bucket(timestamp)
+    if bucket == price_buckets["bucket"]:
+        price_buckets["closes"].replace_last(price)
+        return False
+    price_buckets["closes"].append(price)
+    price_buckets["bucket"] = bucket
+    return True
+
+def new_price_tiers(settings, prices, buckets=()):
+    """The tiered history entries of a crypto_data record."""
+    return {
+        "price_history": PriceRing(raw_history_depth(settings), prices),
+        "price_buckets": new_price_buckets(buckets) if HISTORY_BUCKET_SECONDS else None,
+    }
+
+def long_term_closes(symbol):
+    """Bucket closes backing the long-term MA, or None when it runs on raw ticks."""
+    price_buckets = crypto_data[symbol].get("price_buckets")
+    return price_buckets["closes"].tolist() if price_buckets else None
 
 def calculate_stochastic_rsi(rsi_values, period=14, k_period=3, d_period=3):
     if len(rsi_values) < period + d_period:
         return None, None
 
-    rsi_series = pd.Series(rsi_values)
-    stoch_rsi = (rsi_series - rsi_series.rolling(window=period).min()) / (
-        rsi_series.rolling(window=period).max() - rsi_series.rolling(window=period).min()
-    )
+    stoch = new_stochastic_rsi_state(period, k_period, d_period)
+    for rsi in rsi_values:
+        k, d = update_stochastic_rsi(stoch, rsi)
+    return k, d
 
-    k_line = stoch_rsi.rolling(window=k_period).mean()
-    d_line = k_line.rolling(window=d_period).mean()
+def calculate_bollinger_bands(prices, period=20, num_std_dev=2):
+    window = new_window_state(period)
+    for price in prices:
+        update_window(window, price)
+    return bollinger_from_window(window, num_std_dev)
 
-    return k_line.iloc[-1], d_line.iloc[-1]
+def fetch_manual_commands(ids=None):
+    """Mark pending manual commands as executed and return them, in one statement.
 
-def calculate_bollinger_bands(prices, period=20, num_std_dev=2):
-    price_series = pd.Series(prices)
-    middle_band = price_series.rolling(window=period).mean()
-    std_dev = price_series.rolling(window=period).std()
-    upper_band = middle_band + (num_std_dev * std_dev)
-    lower_band = middle_band - (num_std_dev * std_dev)
-    return middle_band.iloc[-1], upper_band.iloc[-1], lower_band.iloc[-1]
+    With `ids` only those commands are claimed. A command that was already claimed
+    (e.g. by the polling fallback) is not returned again.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if ids is None:
+            cursor.execute("""
+                UPDATE manual_commands SET executed = TRUE
+                WHERE executed = FALSE
+                RETURNING id, symbol, action
+            """)
+        else:
+            cursor.execute("""
+                UPDATE manual_commands SET executed = TRUE
+                WHERE id = ANY(%s) AND executed = FALSE
+                RETURNING id, symbol, action
+            """, (list(ids),))
+        commands = sorted(cursor.fetchall())
+        conn.commit()
+        return commands
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+def connect_manual_commands_listener():
+    """Open a dedicated (unpooled) autocommit connection listening on MANUAL_COMMANDS_CHANNEL."""
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {MANUAL_COMMANDS_CHANNEL}")
+    return conn
 
-async def process_manual_commands():
+# Async database layer: the blocking helpers above run on a small thread pool
+# (one thread per pooled connection) so a slow Postgres never stalls the event loop.
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+def timed_db_call(func, args):
+    """Run a database helper, timing it (on the DB thread) under its function name."""
+    try:
+        with timed("postgres_query_seconds", query=func.__name__):
+            return func(*args)
+    except Exception:
+        increment("errors_total", source="postgres")
+        raise
+
+async def run_db(func, *args):
+    """Run a blocking database helper on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, timed_db_call, func, args)
+
+async def load_states_async(symbols):
+    return await run_db(load_states, symbols)
+
+# Dirty tracking for trading_state and balances: rows are compared with what was last
+# written and only the changed ones go out, together, once per cycle (flush_changed_state).
+saved_state = {}  # symbol -> (initial_price, total_trades, total_profit) as last written
+saved_balances = {}  # currency -> available balance as last written
+pending_balances = {}  # currency -> balance not written yet
+
+def state_values(symbol):
+    data = crypto_data[symbol]
+    return (data["initial_price"], data["total_trades"], data["total_profit"])
+
+def track_balances(balances):
+    """Queue the balances that differ from the stored ones."""
+    for currency, available_balance in balances.items():
+        if saved_balances.get(currency) != available_balance:
+            pending_balances[currency] = available_balance
+        else:
+            pending_balances.pop(currency, None)
+
+async def flush_changed_state():
+    """Write the trading_state and balances rows changed since the last flush in one transaction.
+
+    Rows stay dirty when the write fails, so the next flush retries them.
+    """
+    state_rows = []
+    for symbol in crypto_data:
+        values = state_values(symbol)
+        if saved_state.get(symbol) != values:
+            state_rows.append((symbol, *values))
+    balance_rows = list(pending_balances.items())
+    if not state_rows and not balance_rows:
+        return
+
+    try:
+        with timed("phase_seconds", phase="db_write"):
+            await run_db(save_changed_rows, state_rows, balance_rows)
+    except Exception as e:
+        print(f"Error saving state to database: {e}")
+        return
+
+    for symbol, *values in state_rows:
+        saved_state[symbol] = tuple(values)
+    for currency, available_balance in balance_rows:
+        saved_balances[currency] = available_balance
+        if pending_balances.get(currency) == available_balance:
+            del pending_balances[currency]
+    if DEBUG_MODE:
+        print(f"💾 Saved {len(state_rows)} trading_state and {len(balance_rows)} balances rows.")
+
+async def log_trade(symbol, side, amount, price):
+    """Log a trade in the trades table and the in-memory position ledger."""
+    async with position_ledger_lock:
+        record_position(symbol, side, amount, price)
+        await run_db(save_trade, symbol, side, amount, price)
+
+# Write-behind buffer: ticks are queued in memory and written in batches by
+# price_history_flusher(), so a tick costs one append instead of one commit.
+price_buffer = deque()  # (symbol, timestamp, price) rows not yet written
+price_buffer_last_timestamp = {}  # symbol -> timestamp of its last queued row
+price_buffer_wakeup = asyncio.Event()
+price_buffer_flush_lock = asyncio.Lock()
+
+def price_buffer_oldest_row_age():
+    """Seconds since the oldest unwritten price history row was queued (0 when the buffer is empty)."""
+    return (datetime.now(timezone.utc) - price_buffer[0][1]).total_seconds() if price_buffer else 0.0
+
+gauges["price_buffer_backlog_rows"] = lambda: len(price_buffer)
+gauges["price_buffer_oldest_row_age_seconds"] = price_buffer_oldest_row_age
+
+async def buffer_price_history(symbol, price):
+    """Queue a price_history row for the write-behind flusher."""
+    while len(price_buffer) >= PRICE_BUFFER_MAX_ROWS:
+        # Bounded memory: wait for the database instead of dropping ticks
+        increment("price_buffer_backpressure_waits_total")
+        if not await flush_price_history():
+            await asyncio.sleep(1)
+
+    timestamp = datetime.now(timezone.utc)
+    last_timestamp = price_buffer_last_timestamp.get(symbol)
+    if last_timestamp is not None and timestamp <= last_timestamp:
+        timestamp = last_timestamp + timedelta(microseconds=1)  # (symbol, timestamp) is the primary key
+    price_buffer_last_timestamp[symbol] = timestamp
+    price_buffer.append((symbol, timestamp, price))
+    if len(price_buffer) >= PRICE_BUFFER_FLUSH_ROWS:
+        price_buffer_wakeup.set()
+
+async def flush_price_history():
+    """Write every buffered row in one COPY. Returns False (rows kept) if the write failed."""
+    async with price_buffer_flush_lock:
+        if not price_buffer:
+            return True
+
+        rows = list(price_buffer)
+        start = time.perf_counter()
+        try:
+            await run_db(copy_price_history, rows)
+        except Exception as e:
+            increment("price_buffer_flushes_total", result="failed")
+            print(f"Error flushing {len(rows)} price history rows to database: {e}")
+            return False
+
+        # Only drop rows once they are committed; new ticks may have been appended meanwhile
+        for _ in range(len(rows)):
+            price_buffer.popleft()
+
+        observe("price_buffer_flush_seconds", time.perf_counter() - start)
+        increment("price_buffer_flushes_total", result="written")
+        increment("price_buffer_rows_flushed_total", len(rows))
+        return True
+
+async def price_history_flusher():
+    """Background task: flush the price buffer when it is full enough or old enough."""
+    while True:
+        try:
+            await asyncio.wait_for(price_buffer_wakeup.wait(), PRICE_BUFFER_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        price_buffer_wakeup.clear()
+        await flush_price_history()
+
+async def drain_price_history(attempts=3):
+    """Flush everything still buffered (used on shutdown)."""
+    for attempt in range(attempts):
+        if await flush_price_history():
+            return
+        await asyncio.sleep(attempt + 1)
+    print(f"🚨 {len(price_buffer)} price history rows could not be written before shutdown!")
+
+# Position ledger: amount and cost of the buys since the last sell, per symbol.
+# Built from `trades` at startup and kept current by log_trade(), so the trading
+# loop never queries trades for the weighted average buy price.
+position_ledger = {}  # symbol -> {"amount", "cost", "buys"}
+position_ledger_lock = asyncio.Lock()  # Serializes trade logging with reconciliation
+
+def load_position_ledger():
+    """Sum the BUY trades after each symbol's last SELL (all buys if it never sold), in one query."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, symbol, action 
-        FROM manual_commands 
-        WHERE executed = FALSE
-    """)
-    commands = cursor.fetchall()
-
-    for cmd in commands:
-        cmd_id, symbol, action = cmd
+    try:
+        cursor.execute("""
+            SELECT t.symbol,
+                   SUM(t.amount::DOUBLE PRECISION),
+                   SUM(t.amount::DOUBLE PRECISION * t.price::DOUBLE PRECISION),
+                   COUNT(*)
+            FROM trades t
+            LEFT JOIN (
+                SELECT symbol, MAX(timestamp) AS last_sell
+                FROM trades
+                WHERE side = 'SELL'
+                GROUP BY symbol
+            ) s ON s.symbol = t.symbol
+            WHERE t.side = 'BUY' AND (s.last_sell IS NULL OR t.timestamp > s.last_sell)
+            GROUP BY t.symbol
+        """)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+    return {symbol: {"amount": amount or 0.0, "cost": cost or 0.0, "buys": buys} for symbol, amount, cost, buys in rows}
+
+def record_position(symbol, side, amount, price):
+    """Apply one trade to the ledger: a sell closes the position, a buy adds to it."""
+    position = position_ledger.setdefault(symbol, {"amount": 0.0, "cost": 0.0, "buys": 0})
+    if side.upper() == "SELL":
+        position.update(amount=0.0, cost=0.0, buys=0)
+    else:
+        position["amount"] += amount
+        position["cost"] += amount * price
+        position["buys"] += 1
+
+def get_avg_buy_price(symbol):
+    """Weighted average price of the BUY trades after the symbol's last SELL (all buys if it never sold), from the ledger."""
+    position = position_ledger.get(symbol)
+    if not position or not position["buys"]:
+        if DEBUG_MODE:
+            print(f"⚠️  - No buy trades found for {symbol} after last sell.")
+        return None
+    if position["amount"] == 0:
+        print(f"🔥  - Total amount for {symbol} is 0. Returning None.")
+        return None
+    return position["cost"] / position["amount"]
+
+async def reconcile_position_ledger():
+    """Check the ledger against `trades`. The database wins on any mismatch. Returns the mismatched symbols."""
+    empty = {"amount": 0.0, "cost": 0.0, "buys": 0}
+    async with position_ledger_lock:
+        stored = await run_db(load_position_ledger)
+        mismatched = []
+        for symbol in sorted(set(stored) | set(position_ledger)):
+            ours = position_ledger.get(symbol, empty)
+            theirs = stored.get(symbol, empty)
+            # trades stores REAL values, so allow for float4 rounding
+            if (ours["buys"] != theirs["buys"]
+                    or not math.isclose(ours["amount"], theirs["amount"], rel_tol=1e-5, abs_tol=1e-9)
+                    or not math.isclose(ours["cost"], theirs["cost"], rel_tol=1e-5, abs_tol=1e-9)):
+                print(f"⚠️ {symbol}: Position ledger out of sync (memory: {ours['amount']:.6f} @ {ours['cost']:.2f}, "
+                      f"{ours['buys']} buys / trades: {theirs['amount']:.6f} @ {theirs['cost']:.2f}, {theirs['buys']} buys). Using trades.")
+                mismatched.append(symbol)
+        position_ledger.clear()
+        position_ledger.update(stored)
+    return mismatched
+
+async def position_ledger_reconciler():
+    """Background task: reconcile the position ledger every LEDGER_RECONCILE_SECONDS."""
+    while True:
+        await asyncio.sleep(LEDGER_RECONCILE_SECONDS)
+        try:
+            await reconcile_position_ledger()
+        except Exception as e:
+            print(f"🚨 Position ledger reconciliation failed: {e}")
+
+manual_commands_listening = False  # The LISTEN connection is up
+manual_commands_polled = 0.0  # time.monotonic() of the last polling fallback
+manual_command_event = asyncio.Event()  # Set when a pushed command is waiting for the trading loop
+
+def apply_manual_commands(commands):
+    """Flag claimed commands on their symbols; process_symbol() acts on them."""
+    for cmd_id, symbol, action in commands:
         action = action.upper()
 
         if symbol in crypto_data:
             crypto_data[symbol]["manual_cmd"] = action
+            crypto_data[symbol]["manual_cmd_id"] = cmd_id  # Lets a running decision tell it apart (clear_manual_command)
             print(f"📥 Manual command received: {action} for {symbol}")
+            if symbol in ticker_prices:
+                ticker_updated.add(symbol)  # WebSocket mode: trade on the latest tick right away
+                ticker_event.set()
         else:
             print(f"⚠️ Unknown symbol in manual command: {symbol}")
 
-        # Mark as executed
-        cursor.execute("UPDATE manual_commands SET executed = TRUE WHERE id = %s", (cmd_id,))
-        conn.commit()
+def clear_manual_command(symbol, cmd_id):
+    """Drop the manual command a decision acted on, unless a newer one arrived while it was running."""
+    if crypto_data[symbol].get("manual_cmd_id") == cmd_id:
+        crypto_data[symbol]["manual_cmd"] = None
+        crypto_data[symbol]["manual_cmd_id"] = None
 
-    cursor.close()
-    conn.close()
+async def process_manual_commands():
+    """Polling fallback: every call while the LISTEN connection is down, else every MANUAL_COMMANDS_FALLBACK_SECONDS."""
+    global manual_commands_polled
+    if manual_commands_listening and time.monotonic() - manual_commands_polled < MANUAL_COMMANDS_FALLBACK_SECONDS:
+        return
+    manual_commands_polled = time.monotonic()
+    apply_manual_commands(await run_db(fetch_manual_commands))
+
+async def claim_pushed_commands(ids):
+    commands = await run_db(fetch_manual_commands, ids)
+    if commands:
+        apply_manual_commands(commands)
+        manual_command_event.set()
+
+async def manual_commands_listener():
+    """Apply manual commands as soon as the monitor NOTIFYs them, reconnecting when the connection drops."""
+    global manual_commands_listening, manual_commands_polled
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    while True:
+        try:
+            conn = await run_db(connect_manual_commands_listener)
+        except psycopg2.Error as e:
+            print(f"⚠️ Manual command LISTEN connection failed ({e}). Polling, retrying in 30s.")
+            await asyncio.sleep(30)
+            continue
+
+        lost = loop.create_future()
+
+        def on_notify():
+            try:
+                conn.poll()
+            except psycopg2.Error as e:
+                if not lost.done():
+                    lost.set_exception(e)
+                return
+            ids = set()
+            while conn.notifies:
+                payload = conn.notifies.pop(0).payload
+                try:
+                    ids.add(int(json.loads(payload)["id"]))
+                except (ValueError, KeyError, TypeError):
+                    print(f"⚠️ Ignoring malformed manual command notification: {payload}")
+            if ids:  # Everything that arrived together is claimed in one UPDATE
+                task = asyncio.create_task(claim_pushed_commands(ids))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        fd = conn.fileno()  # Not available any more once the connection is lost
+        loop.add_reader(fd, on_notify)
+        manual_commands_listening = True
+        manual_commands_polled = 0.0  # Pick up commands inserted while we weren't listening
+        print(f"📡 Listening for manual commands on '{MANUAL_COMMANDS_CHANNEL}'.")
+        try:
+            await lost
+        except psycopg2.Error as e:
+            print(f"⚠️ Manual command LISTEN connection lost ({e}). Polling until it is back.")
+        finally:
+            manual_commands_listening = False
+            loop.remove_reader(fd)
+            conn.close()
+        await asyncio.sleep(5)
 
 def _fmt(v, nd=6):
     try:
@@ -568,451 +2032,609 @@ actual_buy_price = {}
 # Global variable to track MACD confirmation
 macd_confirmation = {symbol: {"buy": 0, "sell": 0} for symbol in crypto_symbols}
 
-async def trading_bot():
-    global crypto_data, macd_confirmation
+symbol_locks = defaultdict(asyncio.Lock)  # One decision at a time per symbol (crypto_data, macd_confirmation)
+quote_reserved = 0.0  # Quote currency committed to buys since the last balance refresh
+balances_stale = False  # A fill was recorded after the last balance refresh
+
+def available_quote(balances):
+    """Quote currency balance not yet committed to a buy placed since the balances were fetched."""
+    return max(0.0, balances.get(quote_currency, 0.0) - quote_reserved)
+
+async def process_symbol(symbol, current_price, balances):
+    """Run one trading decision for `symbol` at `current_price`.
+
+    Returns True when an order was placed, so the caller knows balances changed.
+    """
+    async with symbol_locks[symbol]:
+        return await trade_symbol(symbol, current_price, balances)
+
+async def process_symbols(prices, balances, deadline=None):
+    """process_symbol() for many (symbol, price) pairs concurrently, at most SYMBOL_CONCURRENCY at once.
+
+    Symbols that have not started by `deadline` (a time.time() value) are skipped.
+    Returns {symbol: result}, leaving out the skipped symbols.
+    """
+    semaphore = asyncio.Semaphore(SYMBOL_CONCURRENCY)  # Grants in order, so earlier symbols start first
+    results = {}
+
+    async def run(symbol, current_price):
+        async with semaphore:
+            if deadline is not None and time.time() >= deadline:
+                return
+            try:
+                with timed("phase_seconds", phase="symbol"):
+                    results[symbol] = await process_symbol(symbol, current_price, balances)
+            except Exception as e:
+                # Don't let one symbol cancel the others (possibly with an order in flight)
+                increment("errors_total", source="process_symbol")
+                print(f"🚨 {symbol}: Error while processing: {type(e).__name__}: {e}")
+                results[symbol] = None
+
+    async with asyncio.TaskGroup() as group:
+        for symbol, current_price in prices:
+            group.create_task(run(symbol, current_price))
+    return results
+
+async def trade_symbol(symbol, current_price, balances):
+    """The trading decision of process_symbol(), run under the symbol's lock."""
+    global quote_reserved
+    traded = False
+    price_precision = coins_config[symbol]["precision"]["price"]  # Get the decimal places from config
+
+    if not current_price:
+        print(f"🚨 {symbol}: No price data. Skipping.")
+        increment("symbols_skipped_total", reason="no_price")
+        return
+    if symbol not in crypto_data:
+        print(f"🚨 {symbol}: Not in crypto_data. Skipping.")
+        increment("symbols_skipped_total", reason="unknown_symbol")
+        return
+    if not crypto_data[symbol]["price_history"]:
+        print(f"🚨 {symbol}: Empty price_history. Skipping.")
+        increment("symbols_skipped_total", reason="empty_history")
+        return
+    if current_price == crypto_data[symbol]["price_history"][-1]:
+        print(f"🚨 {symbol}: Price unchanged ({current_price:.{price_precision}f} == {crypto_data[symbol]['price_history'][-1]:.{price_precision}f}). Skipping.")
+        increment("symbols_skipped_total", reason="unchanged_price")
+        return
 
-    # Initialize initial prices for all cryptocurrencies
-    for symbol in crypto_symbols:
-        state = load_state(symbol)
-        if state:
-            crypto_data[symbol] = state
+    # Queue price history (written in batches by price_history_flusher)
+    with timed("phase_seconds", phase="db_write"):
+        await buffer_price_history(symbol, current_price)
+
+    # Update price history in memory
+    with timed("phase_seconds", phase="indicators"):
+        crypto_data[symbol]["price_history"].append(current_price)
+        price_buckets = crypto_data[symbol].get("price_buckets")
+        new_bucket = add_to_buckets(price_buckets, current_price, time.time()) if price_buckets else True
+        price_history = crypto_data[symbol]["price_history"].tolist()
+        if "indicators" in crypto_data[symbol]:
+            indicators = update_indicators(crypto_data[symbol]["indicators"], current_price)
+            update_long_term_ma(crypto_data[symbol]["indicators"], current_price, new_bucket)
         else:
-            initial_price = await get_crypto_price(symbol)
-            if not initial_price:
-                print(f"🚨 Failed to fetch initial {symbol} price. Skipping {symbol}.")
-                continue
-            crypto_data[symbol] = {
-                "price_history": deque([initial_price], maxlen=price_history_maxlen),
-                "initial_price": initial_price,
-                "total_trades": 0,
-                "total_profit": 0.0,
-            }
-            save_state(symbol, initial_price, 0, 0.0)
-            print(f"🔍 Monitoring {symbol}... Initial Price: ${initial_price}, Price History: {crypto_data[symbol]['price_history']}")
-
-    while True:
-        await asyncio.sleep(25)  # Wait before checking prices again
-
-        # Fetch balances
-        balances = await get_balances()
-
-        # Log balances
-        print("💰 Available Balances:")
-        for currency, balance in balances.items():
-            print(f"  - {currency}: {balance}")
-
-        # Update balances in the database
-        update_balances(balances)
-
-        # Fetch prices for all cryptocurrencies concurrently
-        price_tasks = [get_crypto_price(symbol) for symbol in crypto_symbols]
-        prices = await asyncio.gather(*price_tasks)
-
-        # 🧠 Refresh manual commands for this cycle
-        await process_manual_commands()
-
-        for symbol, current_price in zip(crypto_symbols, prices):
-            if not current_price:
-                print(f"🚨 {symbol}: No price data. Skipping.")
-                continue
-            if symbol not in crypto_data:
-                print(f"🚨 {symbol}: Not in crypto_data. Skipping.")
-                continue
-            if not crypto_data[symbol]["price_history"]:
-                print(f"🚨 {symbol}: Empty price_history. Skipping.")
-                continue
-            if current_price == crypto_data[symbol]["price_history"][-1]:
-                print(f"🚨 {symbol}: Price unchanged ({current_price:.{price_precision}f} == {crypto_data[symbol]['price_history'][-1]:.{price_precision}f}). Skipping.")
-                continue
-
-            # Save price history
-            save_price_history(symbol, current_price)
-
-            # Update price history in memory
-            crypto_data[symbol]["price_history"].append(current_price)
-            price_history = list(crypto_data[symbol]["price_history"])
-            previous_price = crypto_data[symbol].get("previous_price")
-            
-            # Check for a rising streak (if price is rising and continues to rise)
-            if previous_price is not None:
-                if current_price > previous_price:
-                    crypto_data[symbol]["rising_streak"] = crypto_data[symbol].get("rising_streak", 0) + 1
-                    print(f"📈 {symbol} Rising Streak: {crypto_data[symbol]['rising_streak']}")
-                else:
-                    crypto_data[symbol]["rising_streak"] = 0
-
-            # Check for a falling streak (if price is falling and continues to fall)
-            if previous_price is not None:
-                if current_price < previous_price:
-                    crypto_data[symbol]["falling_streak"] = crypto_data[symbol].get("falling_streak", 0) + 1
-                    print(f"📉 {symbol} Falling Streak: {crypto_data[symbol]['falling_streak']}")
-                else:
-                    crypto_data[symbol]["falling_streak"] = 0
-        
-            # Get coin-specific settings
-            coin_settings = coins_config[symbol]
-            buy_threshold = coin_settings["buy_percentage"]
-            sell_threshold = coin_settings["sell_percentage"]
-            rebuy_discount = coin_settings["rebuy_discount"]
-            volatility_window = coin_settings["volatility_window"]
-            trend_window = coin_settings["trend_window"]
-            macd_short_window = coin_settings["macd_short_window"]
-            macd_long_window = coin_settings["macd_long_window"]
-            macd_signal_window = coin_settings["macd_signal_window"]
-            rsi_period = coin_settings["rsi_period"]
-            trail_percent = coin_settings.get("trail_percent", 0.5)  # Default to 0.5% if not specified
-
-            if balances.get(symbol, 0.0) > 0 and current_price > crypto_data[symbol].get("peak_price", 0):
-                crypto_data[symbol]["peak_price"] = current_price
-
-            peak_price = crypto_data[symbol].get("peak_price")
-            trail_stop_price = peak_price * (1 - trail_percent / 100) if peak_price else None
-
-            # Ensure we have enough data for indicators
-            if len(price_history) < max(macd_long_window + macd_signal_window, rsi_period + 1):
-                print(f"⚠️ {symbol}: Not enough data for indicators. Required: {max(macd_long_window + macd_signal_window, rsi_period + 1)}, Available: {len(price_history)}")
-                continue
-
-            long_term_ma = calculate_long_term_ma(price_history, period=200)
-            if long_term_ma is None:
-                print(f"⚠️ {symbol}: Not enough data for long-term MA. Skipping.")
-                continue
+            crypto_data[symbol]["indicators"] = seed_indicators(coins_config[symbol], price_history, long_term_closes(symbol))
+            indicators = crypto_data[symbol]["indicators"]["values"]
+    previous_price = crypto_data[symbol].get("previous_price")
+
+    # Check for a rising streak (if price is rising and continues to rise)
+    if previous_price is not None:
+        if current_price > previous_price:
+            crypto_data[symbol]["rising_streak"] = crypto_data[symbol].get("rising_streak", 0) + 1
+            print(f"📈 {symbol} Rising Streak: {crypto_data[symbol]['rising_streak']}")
+        else:
+            crypto_data[symbol]["rising_streak"] = 0
 
-            price_change = ((current_price - crypto_data[symbol]["initial_price"]) / crypto_data[symbol]["initial_price"]) * 100
-            price_precision = coins_config[symbol]["precision"]["price"]  # Get the decimal places from config
+    # Check for a falling streak (if price is falling and continues to fall)
+    if previous_price is not None:
+        if current_price < previous_price:
+            crypto_data[symbol]["falling_streak"] = crypto_data[symbol].get("falling_streak", 0) + 1
+            print(f"📉 {symbol} Falling Streak: {crypto_data[symbol]['falling_streak']}")
+        else:
+            crypto_data[symbol]["falling_streak"] = 0
+
+    # Get coin-specific settings
+    coin_settings = coins_config[symbol]
+    buy_threshold = coin_settings["buy_percentage"]
+    sell_threshold = coin_settings["sell_percentage"]
+    rebuy_discount = coin_settings["rebuy_discount"]
+    volatility_window = coin_settings["volatility_window"]
+    trend_window = coin_settings["trend_window"]
+    macd_short_window = coin_settings["macd_short_window"]
+    macd_long_window = coin_settings["macd_long_window"]
+    macd_signal_window = coin_settings["macd_signal_window"]
+    rsi_period = coin_settings["rsi_period"]
+    trail_percent = coin_settings.get("trail_percent", 0.5)  # Default to 0.5% if not specified
+
+    if balances.get(symbol, 0.0) > 0 and current_price > crypto_data[symbol].get("peak_price", 0):
+        crypto_data[symbol]["peak_price"] = current_price
+
+    peak_price = crypto_data[symbol].get("peak_price")
+    trail_stop_price = peak_price * (1 - trail_percent / 100) if peak_price else None
+
+    # Ensure we have enough data for indicators
+    if len(price_history) < max(macd_long_window + macd_signal_window, rsi_period + 1):
+        print(f"⚠️ {symbol}: Not enough data for indicators. Required: {max(macd_long_window + macd_signal_window, rsi_period + 1)}, Available: {len(price_history)}")
+        increment("symbols_skipped_total", reason="warming_up")
+        return
 
-            peak_display = f"${peak_price:.{price_precision}f}" if peak_price else "N/A"
-            trail_display = f"${trail_stop_price:.{price_precision}f}" if trail_stop_price else "N/A"
-            print(f"🚀 {symbol} - Current Price: ${current_price:.{price_precision}f} ({price_change:.2f}%), Peak Price: {peak_display}, Trailing Stop Price: {trail_display}")
+    long_term_ma = indicators["long_term_ma"]
+    if long_term_ma is None:
+        print(f"⚠️ {symbol}: Not enough data for long-term MA. Skipping.")
+        increment("symbols_skipped_total", reason="long_term_ma")
+        return
 
-            # Calculate volatility and moving average
-            volatility = calculate_volatility(price_history, volatility_window)
-            volatility_factor = min(1.5, max(0.5, 1 + abs(volatility)))  # Cap extreme changes
-            moving_avg = calculate_moving_average(price_history, trend_window)
+    price_change = ((current_price - crypto_data[symbol]["initial_price"]) / crypto_data[symbol]["initial_price"]) * 100
+
+    peak_display = f"${peak_price:.{price_precision}f}" if peak_price else "N/A"
+    trail_display = f"${trail_stop_price:.{price_precision}f}" if trail_stop_price else "N/A"
+    print(f"🚀 {symbol} - Current Price: ${current_price:.{price_precision}f} ({price_change:.2f}%), Peak Price: {peak_display}, Trailing Stop Price: {trail_display}")
+
+    # Streaming indicators (updated above in O(1), see update_indicators)
+    volatility = indicators["volatility"]
+    moving_avg = indicators["moving_avg"]
+    macd_line = indicators["macd_line"]
+    signal_line = indicators["signal_line"]
+    macd_histogram = indicators["macd_histogram"]
+    rsi = indicators["rsi"]
+
+    # Calculate Stochastic RSI
+    crypto_data[symbol].setdefault("rsi_history", [])
+    crypto_data[symbol]["rsi_history"].append(rsi)
+    if len(crypto_data[symbol]["rsi_history"]) > 50:
+        crypto_data[symbol]["rsi_history"].pop(0)
+
+    with timed("phase_seconds", phase="indicators"):
+        k, d = update_stochastic_rsi(crypto_data[symbol]["indicators"]["stoch"], rsi)
+    crypto_data[symbol]["stoch_k"] = k
+    crypto_data[symbol]["stoch_d"] = d
+
+    if k is not None and d is not None and (k < 0.2 and k > d):
+        print(f"🔥 {symbol} Stochastic RSI Buy Signal: K = {k:.2f}, D = {d:.2f}")
+
+    if k is not None and d is not None and (k > 0.8 and k < d):
+        print(f"🔥 {symbol} Stochastic RSI Sell Signal: K = {k:.2f}, D = {d:.2f}")
+
+    bollinger_mid, bollinger_upper, bollinger_lower = indicators["bollinger"]
+    crypto_data[symbol]['bollinger'] = {
+        'mid': bollinger_mid,
+        'upper': bollinger_upper,
+        'lower': bollinger_lower
+    }
 
-            # Calculate indicators
-            macd_line, signal_line, macd_histogram = calculate_macd(
-                price_history, symbol, macd_short_window, macd_long_window, macd_signal_window
-            )
-            rsi = calculate_rsi(price_history, symbol)
+    bollinger_buy_signal = current_price < bollinger_lower if bollinger_lower else False
+    bollinger_sell_signal = current_price > bollinger_upper if bollinger_upper else False
 
-            # Calculate Stochastic RSI
-            crypto_data[symbol].setdefault("rsi_history", [])
-            crypto_data[symbol]["rsi_history"].append(rsi)
-            if len(crypto_data[symbol]["rsi_history"]) > 50:
-                crypto_data[symbol]["rsi_history"].pop(0)
+    if DEBUG_MODE:
+        # Log indicator values
+        print(f"📊 {symbol} Indicators - Volatility: {volatility:.4f}, Moving Avg: {moving_avg:.4f}, MACD: {macd_line:.4f}, Signal: {signal_line:.4f}, RSI: {rsi:.2f}")
 
-            k, d = calculate_stochastic_rsi(crypto_data[symbol]["rsi_history"])
-            crypto_data[symbol]["stoch_k"] = k
-            crypto_data[symbol]["stoch_d"] = d
+    # An order placed earlier is not in the ledger and balances yet: don't decide on stale positions
+    if crypto_data[symbol].get("pending_order"):
+        print(f"⏳ {symbol}: Waiting for the fill of order {crypto_data[symbol]['pending_order']}. Skipping the decision.")
+        increment("symbols_skipped_total", reason="pending_fill")
+        crypto_data[symbol]["previous_price"] = current_price
+        return traded
 
-            if k is not None and d is not None and (k < 0.2 and k > d):
-                print(f"🔥 {symbol} Stochastic RSI Buy Signal: K = {k:.2f}, D = {d:.2f}")
+    # Get average buy price
+    actual_buy_price = get_avg_buy_price(symbol)
 
-            if k is not None and d is not None and (k > 0.8 and k < d):
-                print(f"🔥 {symbol} Stochastic RSI Sell Signal: K = {k:.2f}, D = {d:.2f}")
+    price_slope = current_price - price_history[-3]
 
-            bollinger_mid, bollinger_upper, bollinger_lower = calculate_bollinger_bands(price_history)
-            crypto_data[symbol]['bollinger'] = {
-                'mid': bollinger_mid,
-                'upper': bollinger_upper,
-                'lower': bollinger_lower
-            }
+    # The manual command this decision sees; one pushed while it awaits an order must survive it
+    manual_cmd_id = crypto_data[symbol].get("manual_cmd_id")
 
-            bollinger_buy_signal = current_price < bollinger_lower if bollinger_lower else False
-            bollinger_sell_signal = current_price > bollinger_upper if bollinger_upper else False
+    # Buy/sell rules, shared with the backtester (see strategy.py)
+    decision = evaluate_trade(
+        crypto_data[symbol], macd_confirmation[symbol], coin_settings, current_price,
+        {**indicators, "stoch_k": k, "stoch_d": d}, actual_buy_price,
+        balances.get(symbol, 0.0), available_quote(balances), time.time(),
+    )
+    dynamic_buy_threshold = decision["dynamic_buy_threshold"]
+    dynamic_sell_threshold = decision["dynamic_sell_threshold"]
+    expected_buy_price = decision["expected_buy_price"]
+    expected_sell_price = decision["expected_sell_price"]
 
-            if DEBUG_MODE:
-                # Log indicator values
-                print(f"📊 {symbol} Indicators - Volatility: {volatility:.4f}, Moving Avg: {moving_avg:.4f}, MACD: {macd_line:.4f}, Signal: {signal_line:.4f}, RSI: {rsi:.2f}")
+    if DEBUG_MODE:
+        # Log expected prices
+        print(f"📊  - Expected Prices for {symbol}: Buy at: ${expected_buy_price:.{price_precision}f} ({dynamic_buy_threshold:.2f}%) / Sell at: ${expected_sell_price:.{price_precision}f} ({dynamic_sell_threshold:.2f}%) | MA: {moving_avg:.{price_precision}f}")
 
-            # Adjust thresholds based on volatility
-            dynamic_buy_threshold = buy_threshold * volatility_factor
-            dynamic_sell_threshold = sell_threshold * volatility_factor
+        # Log Bollinger Bands
+        print(f"🔔  - Bollinger Bands for {symbol}: Mid: ${bollinger_mid:.{price_precision}f}, Upper: ${bollinger_upper:.{price_precision}f}, Lower: ${bollinger_lower:.{price_precision}f}")
 
-            # Get average buy price
-            actual_buy_price = get_weighted_avg_buy_price(symbol)
+    # Check if the price is close to the moving average
+    if decision["in_range"]:
 
-            # Calculate expected buy/sell prices
-            if actual_buy_price is not None:
-                expected_buy_price = actual_buy_price
-                expected_sell_price = actual_buy_price * (1 + dynamic_sell_threshold / 100)
+        if DEBUG_MODE:
+            # Log trading signals if debug is set
+            print(f"📊 {symbol} Trading Signals - MACD Buy: {decision['macd_buy_signal']}, RSI Buy: {decision['rsi_buy_signal']}, MACD Sell: {decision['macd_sell_signal']}, RSI Sell: {decision['rsi_sell_signal']}")
+            print(f"📊 {symbol} MACD Confirmation - Buy: {macd_confirmation[symbol]['buy']}, Sell: {macd_confirmation[symbol]['sell']}")
+
+        if decision["initial_price_adjusted"]:
+            direction, old_initial_price, new_initial_price = decision["initial_price_adjusted"]
+            if direction == "up":
+                print(f"📈  - {symbol} Adjusting Initial Price Upwards: {old_initial_price:.{price_precision}f} → {new_initial_price:.{price_precision}f}")
             else:
-                expected_buy_price = crypto_data[symbol]["initial_price"] * (1 + dynamic_buy_threshold / 100)
-                expected_sell_price = crypto_data[symbol]["initial_price"] * (1 + dynamic_sell_threshold / 100)
-
-            if DEBUG_MODE:
-                # Log expected prices
-                print(f"📊  - Expected Prices for {symbol}: Buy at: ${expected_buy_price:.{price_precision}f} ({dynamic_buy_threshold:.2f}%) / Sell at: ${expected_sell_price:.{price_precision}f} ({dynamic_sell_threshold:.2f}%) | MA: {moving_avg:.{price_precision}f}")
-
-                # Log Bollinger Bands
-                print(f"🔔  - Bollinger Bands for {symbol}: Mid: ${bollinger_mid:.{price_precision}f}, Upper: ${bollinger_upper:.{price_precision}f}, Lower: ${bollinger_lower:.{price_precision}f}")
-
-            # Check if the price is close to the moving average
-            if (moving_avg and abs(current_price - moving_avg) < (0.05 * moving_avg)) or crypto_data[symbol].get("manual_cmd") is not None:
-
-                # MACD Buy Signal: MACD line crosses above Signal line
-                macd_buy_signal = macd_line is not None and signal_line is not None and macd_line > signal_line
-                
-                # RSI Buy Signal: RSI is below 35 (oversold)
-                rsi_buy_signal = rsi is not None and rsi < 35
-                
-                # MACD Sell Signal: MACD line crosses below Signal line
-                macd_sell_signal = macd_line is not None and signal_line is not None and macd_line < signal_line
-                
-                # RSI Sell Signal: RSI is above 70 (overbought)
-                rsi_sell_signal = rsi is not None and rsi > 65
-
-                # MACD Confirmation Rule with decay instead of full reset
-                if macd_buy_signal:
-                    macd_confirmation[symbol]["buy"] += 1
-                    macd_confirmation[symbol]["sell"] = max(0, macd_confirmation[symbol]["sell"] - 1)
-                elif macd_sell_signal:
-                    macd_confirmation[symbol]["sell"] += 1
-                    macd_confirmation[symbol]["buy"] = max(0, macd_confirmation[symbol]["buy"] - 1)
-                else:
-                    macd_confirmation[symbol]["buy"] = max(0, macd_confirmation[symbol]["buy"] - 1)
-                    macd_confirmation[symbol]["sell"] = max(0, macd_confirmation[symbol]["sell"] - 1)
-
-                if DEBUG_MODE:
-                    # Log trading signals if debug is set
-                    print(f"📊 {symbol} Trading Signals - MACD Buy: {macd_buy_signal}, RSI Buy: {rsi_buy_signal}, MACD Sell: {macd_sell_signal}, RSI Sell: {rsi_sell_signal}")
-                    print(f"📊 {symbol} MACD Confirmation - Buy: {macd_confirmation[symbol]['buy']}, Sell: {macd_confirmation[symbol]['sell']}")
-
-                # Check how long since the last buy
-                time_since_last_buy = time.time() - crypto_data[symbol].get("last_buy_time", 0)
-
-                # 🔥 Gradual Adjustments: Move `initial_price` 10% closer to `long_term_ma` during a sustained >5% uptrend
-                if (
-                    time_since_last_buy > 900
-                    and price_change >= dynamic_sell_threshold
-                    and current_price > crypto_data[symbol]["initial_price"] * 1.05
-                    and current_price > long_term_ma  # Confirm Uptrend
-                    ):
-                    new_initial_price = (
-                        0.9 * crypto_data[symbol]["initial_price"] + 0.1 * long_term_ma
+                print(f"📉   - {symbol} Adjusting Initial Price Downwards: {old_initial_price:.{price_precision}f} → {new_initial_price:.{price_precision}f}")
+
+        if bollinger_buy_signal:
+            print(f"💘 {symbol}: Price is below Bollinger Lower Band (${bollinger_lower:.2f}) — buy signal!")
+
+        if bollinger_sell_signal:
+            print(f"💔 {symbol}: Price is above Bollinger Upper Band (${bollinger_upper:.2f}) — sell signal!")
+
+        if actual_buy_price is not None and current_price > actual_buy_price * (1 + (dynamic_sell_threshold / 100)):
+            print(f"💵 {symbol}: Price is above expected sell price (${expected_sell_price:.{price_precision}f}) — sell signal 🚨 !!!")
+
+        # If buy not triggered, explain what's missing (when in DEBUG)
+        if DEBUG_MODE and decision["action"] != "BUY":
+            price_change = decision["price_change"]
+            reasons = [
+                {
+                    "name": "Entry band",
+                    "ok": decision["cond_entry_band"],
+                    "detail": (
+                        f"need (price<{_fmt(bollinger_lower)} OR (price<{_fmt(bollinger_mid)} "
+                        f"AND StochK/D bullish<0.2)); price={_fmt(current_price)}; "
+                        f"K={_fmt(k) if k is not None else 'None'}, D={_fmt(d) if d is not None else 'None'}"
                     )
-                    print(f"📈  - {symbol} Adjusting Initial Price Upwards: {crypto_data[symbol]['initial_price']:.{price_precision}f} → {new_initial_price:.{price_precision}f}")
-                    crypto_data[symbol]["initial_price"] = new_initial_price
-
-                    # Persist only the new initial price and leave other values unchanged, this has save_state(symbol, initial_price, total_trades, total_profit)
-                    save_state(symbol, new_initial_price, crypto_data[symbol]["total_trades"], crypto_data[symbol]["total_profit"])    
-
-                # 🔽 Adjust Initial Price Downwards in a Sustained Downtrend (If Holdings < 1 USDC)
-                elif (
-                    time_since_last_buy > 3600 and  # Time check
-                    balances.get(symbol, 0) * current_price < 1 and  # Holdings worth less than $1 USDC
-                    current_price < crypto_data[symbol]["initial_price"] * 0.95 # Prevent premature resets
-                ):
-                    new_initial_price = (0.9 * crypto_data[symbol]["initial_price"] + 0.1 * current_price)  # Move closer to the current price
-                    print(f"📉   - {symbol} Adjusting Initial Price Downwards: {crypto_data[symbol]['initial_price']:.{price_precision}f} → {new_initial_price:.{price_precision}f}")
-                    crypto_data[symbol]["initial_price"] = new_initial_price
-
-                    # Persist only the new initial price and leave other values unchanged
-                    save_state(symbol, new_initial_price, crypto_data[symbol]["total_trades"], crypto_data[symbol]["total_profit"])
-
-                if bollinger_buy_signal:
-                    print(f"💘 {symbol}: Price is below Bollinger Lower Band (${bollinger_lower:.2f}) — buy signal!")
-
-                if bollinger_sell_signal:
-                    print(f"💔 {symbol}: Price is above Bollinger Upper Band (${bollinger_upper:.2f}) — sell signal!")
-
-                if actual_buy_price is not None and current_price > actual_buy_price * (1 + (dynamic_sell_threshold / 100)):
-                    print(f"💵 {symbol}: Price is above expected sell price (${expected_sell_price:.{price_precision}f}) — sell signal 🚨 !!!")
-
-                price_slope = current_price - price_history[-3]
-
-                # Execute buy order if signals are confirmed
-
-                # ----------------- BUY decision (debuggable) -----------------
-                # Build named sub-conditions
-                cond_bollinger_primary = (bollinger_lower is None or current_price < bollinger_lower)
-
-                cond_stoch_part = (k is None or d is None or (k < 0.2 and k > d))
-                cond_bollinger_stoch = ((bollinger_mid is None or current_price < bollinger_mid) and cond_stoch_part)
-
-                cond_entry_band = (cond_bollinger_primary or cond_bollinger_stoch)
-
-                cond_price_thresh = (
-                    price_change <= dynamic_buy_threshold
-                    and actual_buy_price is None
-                )
-
-                cond_rebuy_discount = (
-                    actual_buy_price is not None
-                    and current_price < actual_buy_price * (1 - rebuy_discount / 100.0)
-                )
-
-                cond_trend = (current_price < long_term_ma)
-                cond_cooldown = (time_since_last_buy > 120)
-                cond_streak = (crypto_data[symbol].get("rising_streak", 0) > 1)
-                cond_balance = (balances[quote_currency] > 0)
-                cond_manual = (crypto_data[symbol].get("manual_cmd") == "BUY")
-
-                # Full BUY condition (same structure as your original)
-                auto_buy_condition = (
-                    cond_entry_band
-                    and (cond_price_thresh or cond_rebuy_discount)
-                    and cond_trend
-                    and cond_cooldown
-                    and cond_streak
-                    and cond_balance
-                )
-                buy_condition = (auto_buy_condition or cond_manual)
-
-                # If buy not triggered, explain what's missing (when in DEBUG)
-                if DEBUG_MODE and not buy_condition and not cond_manual:
-                    reasons = [
-                        {
-                            "name": "Entry band",
-                            "ok": cond_entry_band,
-                            "detail": (
-                                f"need (price<{_fmt(bollinger_lower)} OR (price<{_fmt(bollinger_mid)} "
-                                f"AND StochK/D bullish<0.2)); price={_fmt(current_price)}; "
-                                f"K={_fmt(k) if k is not None else 'None'}, D={_fmt(d) if d is not None else 'None'}"
-                            )
-                        },
-                        {
-                            "name": "Price threshold OR Rebuy discount",
-                            "ok": (cond_price_thresh or cond_rebuy_discount),
-                            "detail": (
-                                f"price_change={price_change:.2f}% vs dyn_buy={dynamic_buy_threshold:.2f}%  |  "
-                                f"rebuy: actual_buy={_fmt(actual_buy_price)} -> target<{(1 - rebuy_discount/100):.3f}*buy"
-                            )
-                        },
-                        {
-                            "name": "Trend (below long-term MA)",
-                            "ok": cond_trend,
-                            "detail": f"current={_fmt(current_price)} < long_MA={_fmt(long_term_ma)}"
-                        },
-                        {
-                            "name": "Cooldown",
-                            "ok": cond_cooldown,
-                            "detail": f"since_last_buy={int(time_since_last_buy)}s > 120s"
-                        },
-                        {
-                            "name": "Rising streak > 1",
-                            "ok": cond_streak,
-                            "detail": f"rising_streak={crypto_data[symbol].get('rising_streak', 0)} > 1"
-                        },
-                        {
-                            "name": "USDC balance",
-                            "ok": cond_balance,
-                            "detail": f"{quote_currency}={_fmt(balances.get(quote_currency, 0), 2)} > 0"
-                        },
-                    ]
-                    debug_buy_blockers(symbol, reasons)
-
-                # Execute buy if condition met
-                if buy_condition:
-                    quote_cost = round((buy_percentage / 100) * balances[quote_currency], 2)  # USDC
-                    if quote_cost < coins_config[symbol]["min_order_sizes"]["buy"]:
-                        print(f"🚫  - Buy order too small: ${quote_cost:.2f} (minimum: ${coins_config[symbol]['min_order_sizes']['buy']})")
-                        crypto_data[symbol]["manual_cmd"] = None
-                    else:
-                        buy_amount = quote_cost / current_price
-                        print(f"💰 Buying {buy_amount:.6f} {symbol} (${quote_cost:.2f} USDC)!")
-                        if await place_order(symbol, "BUY", buy_amount, current_price):
-                            crypto_data[symbol]["manual_cmd"] = None
-                            crypto_data[symbol]["total_trades"] += 1
-                            crypto_data[symbol]["last_buy_time"] = time.time()
-
-                            updated_avg_price = get_weighted_avg_buy_price(symbol)
-                            save_weighted_avg_buy_price(symbol, updated_avg_price)
-
-                            message = f"✅ *BOUGHT {buy_amount:.4f} {symbol}* at *${current_price:.{price_precision}f}* USDC"
-                            send_telegram_notification(message)
-
-                            crypto_data[symbol]["peak_price"] = current_price
-
-                elif (
-                    # Execute sell order if sell signals are confirmed and dynamic_sell_threshold was reached
-                    ((
-                        (
-                            macd_sell_signal
-                            and macd_confirmation[symbol]["sell"] >= 3  # ✅ At least 3 positives signals
-                            and (k is None or d is None or (k > 0.8 and k < d))  # ✅ Overbought and bearish cross
-                            and (bollinger_upper is None or current_price > bollinger_mid)  # ✅ Bollinger confirms price is still warm
-                        )
-                        or
-                        (
-                            (bollinger_upper is not None and current_price > bollinger_upper)  # ✅ Bollinger confirms price is hot
-                        )
-                    )
-                    and actual_buy_price is not None  # ✅ Ensure actual_buy_price is valid before using it
-                    # and previous_price is not None and current_price < previous_price  # ✅ Price is lower than previous price
-                    and current_price > actual_buy_price * (1 + (dynamic_sell_threshold / 100))  # ✅ Profit percentage wanted based on sell threshold
-                    and crypto_data[symbol].get("falling_streak", 0) > 1  # ✅ Ensure we’re not in a rising streak
-                    and balances[symbol] > 0  # ✅ Ensure we have balance
+                },
+                {
+                    "name": "Price threshold OR Rebuy discount",
+                    "ok": (decision["cond_price_thresh"] or decision["cond_rebuy_discount"]),
+                    "detail": (
+                        f"price_change={price_change:.2f}% vs dyn_buy={dynamic_buy_threshold:.2f}%  |  "
+                        f"rebuy: actual_buy={_fmt(actual_buy_price)} -> target<{(1 - rebuy_discount/100):.3f}*buy"
                     )
-                    or crypto_data[symbol].get("manual_cmd") == "SELL"  # Manual sell command
-                ):
-
-                    sell_amount = (sell_percentage / 100) * balances[symbol]
-
-                    # Get required precision from config
-                    precision = coins_config[symbol]["precision"]["amount"]
+                },
+                {
+                    "name": "Trend (below long-term MA)",
+                    "ok": decision["cond_trend"],
+                    "detail": f"current={_fmt(current_price)} < long_MA={_fmt(long_term_ma)}"
+                },
+                {
+                    "name": "Cooldown",
+                    "ok": decision["cond_cooldown"],
+                    "detail": f"since_last_buy={int(decision['time_since_last_buy'])}s > 120s"
+                },
+                {
+                    "name": "Rising streak > 1",
+                    "ok": decision["cond_streak"],
+                    "detail": f"rising_streak={crypto_data[symbol].get('rising_streak', 0)} > 1"
+                },
+                {
+                    "name": "USDC balance",
+                    "ok": decision["cond_balance"],
+                    "detail": f"{quote_currency}={_fmt(balances.get(quote_currency, 0), 2)} > 0"
+                },
+            ]
+            debug_buy_blockers(symbol, reasons)
+
+        # Execute buy if condition met
+        if decision["action"] == "BUY":
+            quote_cost = buy_quote_cost(available_quote(balances), buy_percentage)  # USDC
+            if quote_cost < coins_config[symbol]["min_order_sizes"]["buy"]:
+                print(f"🚫  - Buy order too small: ${quote_cost:.2f} (minimum: ${coins_config[symbol]['min_order_sizes']['buy']})")
+                clear_manual_command(symbol, manual_cmd_id)
+            else:
+                buy_amount = quote_cost / current_price
+                print(f"💰 Buying {buy_amount:.6f} {symbol} (${quote_cost:.2f} USDC)!")
+                quote_reserved += quote_cost  # Set aside before awaiting, so concurrent buys can't spend it twice
+                placed = False
+                try:
+                    with timed("phase_seconds", phase="order"):
+                        placed = await place_order(symbol, "BUY", buy_amount, current_price)
+                finally:
+                    if not placed:
+                        quote_reserved -= quote_cost
+                if placed:
+                    traded = True
+                    clear_manual_command(symbol, manual_cmd_id)
+                    crypto_data[symbol]["total_trades"] += 1
+                    crypto_data[symbol]["last_buy_time"] = time.time()
+
+                    message = f"✅ *BOUGHT {buy_amount:.4f} {symbol}* at *${current_price:.{price_precision}f}* USDC"
+                    send_telegram_notification(message)
+
+                    crypto_data[symbol]["peak_price"] = current_price
+
+        elif decision["action"] == "SELL":
+            # Get required precision from config
+            precision = coins_config[symbol]["precision"]["amount"]
+
+            # 🔧 Round down sell amount to match precision, never more than the available balance
+            sell_amount = sell_order_amount(balances[symbol], sell_percentage, precision)
+
+            if sell_amount > 0:
+                print(f"💵  - Selling {sell_amount:.{precision}f} {symbol} at {current_price:.2f}!")
+
+                # 🔥 Get actual weighted buy price from the position ledger just before selling
+                actual_buy_price = get_avg_buy_price(symbol)
+
+                with timed("phase_seconds", phase="order"):
+                    placed = await place_order(symbol, "SELL", sell_amount, current_price)
+                if placed:
+                    traded = True
+
+                    if actual_buy_price is None:
+                        print(f"❌  - ERROR: No buys since the last sell in the position ledger for {symbol}!")
 
-                    # 🔧 Round down sell amount to match precision
-                    sell_amount = round(sell_amount, precision)
+                    else:
+                        print(f"✅  - SUCCESS: Weighted Avg Buy Price for {symbol} = {actual_buy_price:.{price_precision}f}")
 
-                    # 🚨 Ensure we don’t try selling more than available balance
-                    safe_margin = 10 ** -precision  # Smallest allowed unit (e.g., 0.000001 for 6 decimals)
-                    sell_amount = min(sell_amount, balances[symbol] - safe_margin)  # Avoid over-selling
+                    # Profit, trade count, re-entry price and the SOLD notification follow the
+                    # actual fill, see record_sell()
+                    clear_manual_command(symbol, manual_cmd_id)
 
-                    if sell_amount > 0:
-                        print(f"💵  - Selling {sell_amount:.{precision}f} {symbol} at {current_price:.2f}!")
+                else:
+                    print(f"🚫  - Sell order failed for {symbol}!")
 
-                        # 🔥 Get actual weighted buy price from DB just before selling
-                        actual_buy_price = get_weighted_avg_buy_price(symbol)
+    else:
+        deviation = abs(current_price - moving_avg)  # Calculate deviation
+        deviation_percentage = (deviation / moving_avg) * 100  # Convert to percentage
+        message = f"🚀 Large deviation for {symbol} - {deviation_percentage:.2f}%, Current Price: {current_price:.{price_precision}f} USDC"
+        print(f"🔥  - {symbol} Skipping trade: Price deviation too high!")
+        print(f"📊  - Moving Average: {moving_avg:.{price_precision}f}, Current Price: {current_price:.{price_precision}f}")
+        print(f"📉  - Deviation: {deviation:.2f} ({deviation_percentage:.2f}%)")
+        # send_telegram_notification(message)
 
-                        if await place_order(symbol, "SELL", sell_amount, current_price):
-                            crypto_data[symbol]["total_trades"] += 1
+    print(f"📊  - {symbol} Avg buy price: {actual_buy_price} | Slope: {price_slope} | Performance - Total Trades: {crypto_data[symbol]['total_trades']} | Total Profit: ${crypto_data[symbol]['total_profit']:.2f}")
+    clear_manual_command(symbol, manual_cmd_id)  # Handled (or not applicable) this cycle
 
-                            if actual_buy_price is None:
-                                print(f"❌  - ERROR: get_weighted_avg_buy_price({symbol}) returned None! Check DB query!")
+    # The state is saved with the other changed rows at the end of the cycle (flush_changed_state)
+    crypto_data[symbol]["previous_price"] = current_price
 
-                            else:
-                                print(f"✅  - SUCCESS: Weighted Avg Buy Price for {symbol} = {actual_buy_price:.{price_precision}f}")
+    return traded
 
-                            if actual_buy_price:
-                                crypto_data[symbol]["total_profit"] += (current_price - actual_buy_price) * sell_amount
-                                sell_profit = (current_price - actual_buy_price) * sell_amount
-                                print(f"💰  - {symbol} Profit Calculated: (Sell: {current_price:.{price_precision}f} - Buy: {actual_buy_price:.{price_precision}f}) * {sell_amount:.4f} = {crypto_data[symbol]['total_profit']:.2f} USDC")
-                            else:
-                                print(f"⚠️  - No buy data found for {symbol}. Profit calculation skipped.")
+async def trading_bot():
+    global crypto_data, macd_confirmation
 
-                            # 🔄 Reset initial price to long-term MA after sell to allow re-entry
-                            crypto_data[symbol]["initial_price"] = long_term_ma
-                            print(f"🔄  - {symbol} Initial Price Reset to Long-Term MA: {long_term_ma:.{price_precision}f}")
+    # Positions since the last sell, used for the weighted average buy price
+    position_ledger.update(await run_db(load_position_ledger))
+    print(f"📒 Position ledger loaded: {len(position_ledger)} open positions.")
+
+    # Warm start: every symbol's state and price history in one query
+    startup_start = time.perf_counter()
+    loaded_states = await load_states_async(crypto_symbols)
+    crypto_data.update(loaded_states)
+
+    # New symbols start from the current price, fetched for all of them in one batched snapshot.
+    # Their trading_state rows are written by the first flush_changed_state().
+    new_symbols = [symbol for symbol in crypto_symbols if symbol not in crypto_data]
+    if new_symbols:
+        now = time.time()
+        for symbol, initial_price in zip(new_symbols, await get_prices(new_symbols)):
+            if not initial_price:
+                print(f"🚨 Failed to fetch initial {symbol} price. Skipping {symbol}.")
+                continue
+            crypto_data[symbol] = {
+                **new_price_tiers(coins_config[symbol], [initial_price], [(price_bucket(now), initial_price)] if HISTORY_BUCKET_SECONDS else ()),
+                "initial_price": initial_price,
+                "total_trades": 0,
+                "total_profit": 0.0,
+            }
+            print(f"🔍 Monitoring {symbol}... Initial Price: ${initial_price}")
 
-                            # 🔥 Save Weighted Avg Buy Price After Sell
-                            save_weighted_avg_buy_price(symbol, None)  # Reset buy price after sell
+    for symbol in crypto_symbols:
+        if symbol not in crypto_data:
+            continue
+        crypto_data[symbol]["indicators"] = seed_indicators(
+            coins_config[symbol], crypto_data[symbol]["price_history"].tolist(), long_term_closes(symbol)
+        )
+        if symbol in loaded_states:
+            saved_state[symbol] = state_values(symbol)  # Just loaded, nothing to write yet
 
-                            # Send Telegram notification incl. total profit from this trade
-                            message = f"🚀 *SOLD {sell_amount:.4f} {symbol}* at *${current_price:.{price_precision}f}* USDC, *Total Profit: {sell_profit:.2f}* USDC"
-                            send_telegram_notification(message)
-                            crypto_data[symbol]["manual_cmd"] = None
+    startup_seconds = time.perf_counter() - startup_start
+    observe("phase_seconds", startup_seconds, phase="startup")
+    print(f"⚡ Warm start: {len(loaded_states)} symbols loaded from the database, {len(crypto_data) - len(loaded_states)} new, in {startup_seconds:.2f}s.")
 
-                        else:
-                            print(f"🚫  - Sell order failed for {symbol}!")
+    listener_task = asyncio.create_task(manual_commands_listener()) if MANUAL_COMMANDS_LISTEN else None
+    try:
+        if MARKET_DATA_MODE == "websocket":
+            await run_websocket_loop()
+        else:
+            await run_polling_loop()
+    finally:
+        if listener_task:
+            listener_task.cancel()
+
+async def refresh_balances():
+    """Fetch, log and persist the account balances.
+
+    Only call it between batches: fresh balances include all earlier buys, so the quote reservation is reset.
+    """
+    global quote_reserved, balances_stale
+    balances = await get_balances()
+    quote_reserved = 0.0
+    balances_stale = False
+
+    # Log balances
+    print("💰 Available Balances:")
+    for currency, balance in balances.items():
+        print(f"  - {currency}: {balance}")
+
+    # Stored with the cycle's other changes (flush_changed_state)
+    track_balances(balances)
+    return balances
 
-            else:
-                deviation = abs(current_price - moving_avg)  # Calculate deviation
-                deviation_percentage = (deviation / moving_avg) * 100  # Convert to percentage
-                message = f"🚀 Large deviation for {symbol} - {deviation_percentage:.2f}%, Current Price: {current_price:.{price_precision}f} USDC"
-                print(f"🔥  - {symbol} Skipping trade: Price deviation too high!")
-                print(f"📊  - Moving Average: {moving_avg:.{price_precision}f}, Current Price: {current_price:.{price_precision}f}")
-                print(f"📉  - Deviation: {deviation:.2f} ({deviation_percentage:.2f}%)")
-                # send_telegram_notification(message)
+def poll_interval(symbol, balances):
+    """Seconds until `symbol` is polled again.
+
+    Fixed at POLL_INTERVAL unless adaptive_polling is set. Then the interval scales
+    with POLL_TARGET_VOLATILITY / volatility (the streaming calculate_volatility
+    value), is multiplied by POLL_HELD_FACTOR while we hold the coin, and is
+    clamped to POLL_MIN_INTERVAL..POLL_MAX_INTERVAL.
+    """
+    if not POLL_ADAPTIVE:
+        return POLL_INTERVAL
+    data = crypto_data.get(symbol)
+    if not data or "indicators" not in data:
+        return POLL_INTERVAL
+
+    volatility = abs(data["indicators"]["values"]["volatility"] or 0.0)
+    if volatility > 0:  # Also False for NaN
+        interval = POLL_INTERVAL * POLL_TARGET_VOLATILITY / volatility
+    else:
+        interval = POLL_MAX_INTERVAL  # Flat price
+
+    last_price = data["price_history"][-1] if data["price_history"] else 0.0
+    if balances.get(symbol, 0.0) * last_price >= 1 or get_avg_buy_price(symbol) is not None:
+        interval *= POLL_HELD_FACTOR  # Holding it: react faster to sell signals
+    return min(POLL_MAX_INTERVAL, max(POLL_MIN_INTERVAL, interval))
+
+def next_aligned_tick(period, now=None):
+    """The next wall-clock multiple of `period` seconds, so ticks land on the same seconds whatever the work takes."""
+    now = time.time() if now is None else now
+    return (math.floor(now / period) + 1) * period
+
+def next_slot(scheduled, interval, now):
+    """Next poll time after `scheduled`, skipping slots already in the past. Returns (time, missed slots)."""
+    missed = 0
+    slot = scheduled + interval
+    while slot <= now:
+        slot += interval
+        missed += 1
+    return slot, missed
+
+async def run_polling_loop():
+    """Poll prices and trade on them, each symbol on its own fixed-rate schedule (see poll_interval).
+
+    Poll times advance from the scheduled slot, not from when the work finished, so
+    the period does not drift with processing time. Missed slots are reported as
+    overruns. Symbols still waiting POLL_CYCLE_DEADLINE seconds after a tick are
+    deferred to the next tick, where they go first.
+    """
+    tick_period = POLL_MIN_INTERVAL if POLL_ADAPTIVE else POLL_INTERVAL
+    first_tick = next_aligned_tick(POLL_INTERVAL)
+    scheduled = {symbol: first_tick for symbol in crypto_symbols}  # Slot each symbol is (over)due for
+    next_poll = dict(scheduled)  # When to process it (a deferred symbol waits for the next tick)
+    balances = None
+    last_refresh = 0.0
+    while True:
+        tick = min(next_poll.values(), default=next_aligned_tick(tick_period))
+        wait = tick - time.time()
+        if wait > 0:
+            try:
+                await asyncio.wait_for(manual_command_event.wait(), wait)  # Wait until the next symbol is due
+            except asyncio.TimeoutError:
+                pass
+        manual_command_event.clear()
+        deadline = tick + POLL_CYCLE_DEADLINE
+        connections_before = db_stats["connections_opened"]
+        cycle_start = time.perf_counter()
+
+        # Balances and manual commands: every cycle with a fixed interval, else when stale or after an order
+        if not POLL_ADAPTIVE or balances is None or balances_stale or time.monotonic() - last_refresh >= MARKET_DATA_BALANCE_REFRESH:
+            with timed("phase_seconds", phase="balances"):
+                balances = await refresh_balances()
+
+            # 🧠 Refresh manual commands for this cycle
+            with timed("phase_seconds", phase="manual_commands"):
+                await process_manual_commands()
+            last_refresh = time.monotonic()
+
+        # Symbols due now (or within the batch window) plus any with a pending manual command, longest waiting first
+        now = time.time()
+        due = sorted(
+            (symbol for symbol in crypto_symbols
+             if next_poll[symbol] <= now + POLL_BATCH_WINDOW or crypto_data.get(symbol, {}).get("manual_cmd")),
+            key=lambda symbol: scheduled[symbol],
+        )
 
-            print(f"📊  - {symbol} Avg buy price: {actual_buy_price} | Slope: {price_slope} | Performance - Total Trades: {crypto_data[symbol]['total_trades']} | Total Profit: ${crypto_data[symbol]['total_profit']:.2f}")
-            crypto_data[symbol]["manual_cmd"] = None  # Set to None at the start of each cycle
+        # Fetch prices for the due symbols in one batched snapshot
+        with timed("phase_seconds", phase="prices"):
+            prices = await get_prices(due)
+
+        results = await process_symbols(zip(due, prices), balances, deadline)
+        traded = any(results.values())
+        await flush_changed_state()
+        missed = 0
+        deferred = [symbol for symbol in due if symbol not in results]
+        now = time.time()
+        for symbol in results:
+            if scheduled[symbol] <= now + POLL_BATCH_WINDOW:  # Not just here for a manual command
+                scheduled[symbol], symbol_missed = next_slot(scheduled[symbol], poll_interval(symbol, balances), now)
+                missed += symbol_missed
+            next_poll[symbol] = scheduled[symbol]
+            if DEBUG_MODE and POLL_ADAPTIVE:
+                print(f"⏱️ {symbol}: next poll in {next_poll[symbol] - now:.1f}s")
+        observe("phase_seconds", time.perf_counter() - cycle_start, phase="cycle")
+
+        if deferred:
+            # Past the deadline: leave the rest for the next tick instead of delaying it
+            next_tick = next_aligned_tick(tick_period)
+            for symbol in deferred:
+                next_poll[symbol] = next_tick
+            increment("symbols_deferred_total", len(deferred))
+            print(f"⏳ Cycle deadline ({POLL_CYCLE_DEADLINE:.1f}s) reached: deferred {len(deferred)} symbols ({', '.join(deferred[:5])}{', ...' if len(deferred) > 5 else ''}) to the next tick.")
+        if missed:
+            increment("cycle_overruns_total")
+            increment("missed_polls_total", missed)
+            print(f"⚠️ Cycle overran: took {time.time() - tick:.1f}s, {missed} poll slots missed. Consider a longer poll_interval or fewer coins.")
+
+        if traded:
+            balances = None  # Orders changed the balances, refresh before the next batch
 
-            # Save state after each coin's update
-            save_state(symbol, crypto_data[symbol]["initial_price"], crypto_data[symbol]["total_trades"], crypto_data[symbol]["total_profit"])
+        if DEBUG_MODE:
+            print(f"🗄️ DB connections opened this cycle: {db_stats['connections_opened'] - connections_before} (pool max: {DB_POOL_MAX})")
+            print(f"🗄️ Price buffer: {len(price_buffer)} rows waiting, oldest {price_buffer_oldest_row_age():.1f}s")
+
+async def run_websocket_loop():
+    """Trade on ticker updates, coalesced into micro-batches of MARKET_DATA_COALESCE seconds."""
+    feed_task = asyncio.create_task(ticker_feed(crypto_symbols))
+    balances = None
+    last_refresh = 0.0
+    try:
+        while True:
+            await ticker_event.wait()
+            await asyncio.sleep(MARKET_DATA_COALESCE)  # Let a burst of ticks settle into one batch
+            ticker_event.clear()
+            if feed_task.done():
+                feed_task.result()  # Surface an unexpected feed crash
+
+            cycle_start = time.perf_counter()
+            if balances is None or balances_stale or time.monotonic() - last_refresh >= MARKET_DATA_BALANCE_REFRESH:
+                with timed("phase_seconds", phase="balances"):
+                    balances = await refresh_balances()
+                with timed("phase_seconds", phase="manual_commands"):
+                    await process_manual_commands()
+                last_refresh = time.monotonic()
+
+            batch = [symbol for symbol in crypto_symbols if symbol in ticker_updated]
+            ticker_updated.clear()
+
+            for symbol in batch:
+                if symbol in crypto_data:
+                    crypto_data[symbol]["quote"] = ticker_prices[symbol]
+            results = await process_symbols([(symbol, ticker_prices[symbol]["price"]) for symbol in batch], balances)
+            traded = any(results.values())
+            await flush_changed_state()
+            observe("phase_seconds", time.perf_counter() - cycle_start, phase="cycle")
+
+            if traded:
+                balances = None  # Orders changed the balances, refresh before the next batch
+    finally:
+        feed_task.cancel()
 
-            crypto_data[symbol]["previous_price"] = current_price
+async def main():
+    metrics_runner = await start_metrics_server() if METRICS_ENABLED else None
+    flusher_task = asyncio.create_task(price_history_flusher())
+    reconciler_task = asyncio.create_task(position_ledger_reconciler())
+    notifier_task = asyncio.create_task(telegram_notifier())
+    try:
+        await trading_bot()
+    finally:
+        flusher_task.cancel()
+        reconciler_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await drain_order_confirmations()
+        await flush_changed_state()
+        await drain_telegram_notifications()
+        notifier_task.cancel()
+        await drain_price_history()  # Never lose buffered ticks on a clean exit
+        await close_http_session()
+        db_executor.shutdown(wait=True)  # Let queued writes finish before closing the pool
+        close_db_pool()
 
 if __name__ == "__main__":
-    asyncio.run(trading_bot())
+    asyncio.run(main())
@@ -4,7 +4,9 @@ import jwt
 import secrets
 import json
 import time
+import threading
 import psycopg2
+from psycopg2 import pool
 from datetime import datetime, timedelta
 from cryptography.hazmat.primitives import serialization
 
@@ -23,6 +25,12 @@ sell_offset_percent = config.get("sell_offset_percent", 0.3)
 cancel_hours = config.get("cancel_hours", 3)
 
 request_host = "api.coinbase.com"
+
+# Shared HTTP client settings (one keep-alive connection pool per bot process)
+HTTP_CONFIG = config.get("http", {})
+HTTP_POOL_SIZE = HTTP_CONFIG.get("pool_size", 10)  # Max open connections to Coinbase
+HTTP_KEEPALIVE_TIMEOUT = HTTP_CONFIG.get("keepalive_timeout", 60)  # Seconds an idle connection is kept
+HTTP_REQUEST_TIMEOUT = HTTP_CONFIG.get("request_timeout", 10)  # Seconds per request
 open_orders = {}
 
 # Database connection parameters
@@ -32,40 +40,158 @@ DB_NAME = config["database"]["name"]
 DB_USER = config["database"]["user"]
 DB_PASSWORD = config["database"]["password"]
 
+DB_POOL_MIN = config["database"].get("pool_min", 1)  # Connections kept open
+DB_POOL_MAX = config["database"].get("pool_max", 5)  # Upper bound of open connections
+DB_HEALTH_CHECK_AFTER = config["database"].get("health_check_after", 60)  # Ping connections idle this many seconds
+
+db_pool = None
+db_pool_lock = threading.Lock()
+db_last_used = {}  # id(connection) -> time.monotonic() when it was returned to the pool
+db_stats = {"connections_opened": 0}
+
+class CountingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that counts the physical connections it opens."""
+
+    def _connect(self, key=None):
+        db_stats["connections_opened"] += 1
+        return super()._connect(key)
+
+def is_connection_healthy(conn):
+    """Check a pooled connection, pinging it only if it has been idle for a while."""
+    if conn.closed:
+        return False
+    if time.monotonic() - db_last_used.get(id(conn), 0) < DB_HEALTH_CHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
 def get_db_connection():
-    """Connect to the PostgreSQL database."""
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
-    return conn
+    """Borrow a connection from the process-wide pool. Return it with release_db_connection()."""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is None:
+            db_pool = CountingConnectionPool(
+                DB_POOL_MIN,
+                DB_POOL_MAX,
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+
+    for _ in range(DB_POOL_MAX + 1):
+        conn = db_pool.getconn()
+        if is_connection_healthy(conn):
+            return conn
+        # Broken (e.g. server restart): drop it, the pool opens a fresh one on the next getconn()
+        db_last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No healthy database connection available")
+
+def release_db_connection(conn):
+    """Return a borrowed connection to the pool, discarding it if it is broken."""
+    try:
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()  # Never hand out a connection with a pending or failed transaction
+    except psycopg2.Error:
+        pass
+    if conn.closed:
+        db_last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    else:
+        db_last_used[id(conn)] = time.monotonic()
+        db_pool.putconn(conn)
+
+def close_db_pool():
+    """Close every pooled connection (used on shutdown)."""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is not None and not db_pool.closed:
+            db_pool.closeall()
+        db_pool = None
+
+JWT_LIFETIME = 120  # Seconds a token is valid (Coinbase maximum)
+JWT_REUSE_MARGIN = 15  # Stop reusing a cached token this many seconds before it expires
+
+private_key = None
+jwt_cache = {}  # "GET host/path" -> (token, expires_at)
+
+def get_private_key():
+    """Parse the PEM signing key once per process."""
+    global private_key
+    if private_key is None:
+        private_key = serialization.load_pem_private_key(key_secret.encode("utf-8"), password=None)
+    return private_key
 
 def build_jwt(uri):
-    """Generate a JWT token for Coinbase API authentication."""
-    private_key_bytes = key_secret.encode("utf-8")
-    private_key = serialization.load_pem_private_key(private_key_bytes, password=None)
+    """Generate a JWT token for Coinbase API authentication.
+
+    Read-only GET requests reuse a signed token for the same URI until shortly
+    before it expires. Any other method always gets a fresh token and nonce.
+    """
+    now = int(time.time())
+    cacheable = uri.startswith("GET ")
+    if cacheable:
+        cached = jwt_cache.get(uri)
+        if cached and cached[1] - JWT_REUSE_MARGIN > now:
+            return cached[0]
 
     jwt_payload = {
         "sub": key_name,
         "iss": "cdp",
-        "nbf": int(time.time()),
-        "exp": int(time.time()) + 120,
+        "nbf": now,
+        "exp": now + JWT_LIFETIME,
         "uri": uri,
     }
 
     jwt_token = jwt.encode(
         jwt_payload,
-        private_key,
+        get_private_key(),
         algorithm="ES256",
         headers={"kid": key_name, "nonce": secrets.token_hex()},
     )
-
-    return jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
-
-async def api_request(method, path, body=None):
+    jwt_token = jwt_token if isinstance(jwt_token, str) else jwt_token.decode("utf-8")
+
+    if cacheable:
+        if len(jwt_cache) > 256:
+            # Drop expired tokens (e.g. one-off order status URIs)
+            for stale_uri in [u for u, (_, exp) in jwt_cache.items() if exp <= now]:
+                del jwt_cache[stale_uri]
+        jwt_cache[uri] = (jwt_token, now + JWT_LIFETIME)
+
+    return jwt_token
+
+http_session = None
+
+async def get_http_session():
+    """Return the shared aiohttp session, creating it on first use."""
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT),
+        )
+    return http_session
+
+async def close_http_session():
+    """Close the shared aiohttp session and its pooled connections."""
+    global http_session
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+    http_session = None
+
+async def api_request(method, path, body=None, timeout=None):
     """Send authenticated requests to Coinbase API asynchronously."""
     uri = f"{method} {request_host}{path}"
     jwt_token = build_jwt(uri)
@@ -77,12 +203,16 @@ async def api_request(method, path, body=None):
     }
 
     url = f"https://{request_host}{path}"
-    async with aiohttp.ClientSession() as session:
-        async with session.request(method, url, headers=headers, json=body) as response:
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+    session = await get_http_session()
+    try:
+        async with session.request(method, url, headers=headers, json=body, timeout=request_timeout) as response:
             if response.status == 200:
                 return await response.json()
             else:
                 return {"error": await response.text()}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
 
 async def get_order_book():
     path = "/api/v3/brokerage/best_bid_ask"
@@ -128,7 +258,7 @@ def save_initial_price(symbol, price):
         print(f"❌ Error saving initial price: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def load_initial_price(symbol):
     conn = get_db_connection()
@@ -142,7 +272,7 @@ def load_initial_price(symbol):
         return None
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def save_price_history(symbol, price):
     conn = get_db_connection()
@@ -157,7 +287,7 @@ def save_price_history(symbol, price):
         print(f"💾 Error saving price: {e}")
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 async def place_limit_order(side, size, price):
     path = "/api/v3/brokerage/orders"
@@ -218,7 +348,7 @@ def get_price_signal(symbol):
         return None
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 async def cancel_order(order_id):
     path = f"/api/v3/brokerage/orders/{order_id}"
@@ -230,9 +360,12 @@ async def cancel_order(order_id):
         "CB-VERSION": "2024-02-05"
     }
     url = f"https://{request_host}{path}"
-    async with aiohttp.ClientSession() as session:
+    session = await get_http_session()
+    try:
         async with session.delete(url, headers=headers) as res:
             print(f"❌ Cancelled Order: {order_id} -> {res.status}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"🚨 Cancel failed for {order_id}: {type(e).__name__}: {e}")
 
 async def trading_bot():
     print(f"🤖 Starting USDC↔EUR limit trading on {product_id}")
@@ -315,5 +448,12 @@ async def trading_bot():
 
         await asyncio.sleep(60)
 
+async def main():
+    try:
+        await trading_bot()
+    finally:
+        await close_http_session()
+        close_db_pool()
+
 if __name__ == "__main__":
-    asyncio.run(trading_bot())
+    asyncio.run(main())
@@ -0,0 +1,274 @@
+"""
+Parameter sweep for the per-coin settings of cb-trading-db.py.
+
+Runs cb-trading-backtest.py's replay for every combination (grid) or a random
+sample (--random N) of coin settings, spread over all CPU cores. The recorded
+prices are loaded once and placed in shared memory; the worker processes read
+them through NumPy views instead of receiving a copy each. Candidates that share
+indicator windows are evaluated by the same worker, so their indicators are only
+computed once.
+
+Values per parameter are either a list (`buy_percentage=-1,-2,-3`) or an
+inclusive range (`trend_window=20:100:10`). Parameters not given keep the value
+from config.json. Sweepable: buy_percentage, sell_percentage, rebuy_discount,
+volatility_window, trend_window, macd_short_window, macd_long_window,
+macd_signal_window, rsi_period and trail_percent.
+
+Note that trail_percent only changes the trailing stop shown in the bot's logs
+(it takes no part in buy/sell decisions), and the RSI always uses 14 periods;
+rsi_period only sets how much history the bot waits for.
+
+Usage:
+    python cb-trading-sweep.py --symbols ETH --param buy_percentage=-4:-1:0.5 --param sell_percentage=1,2,3,4
+    python cb-trading-sweep.py --csv prices.csv --random 500 --param trend_window=10:200:5 --param rebuy_discount=0.5:5:0.5
+    python cb-trading-sweep.py ... --top 10 --rank-by return_over_drawdown --output best_coins.json
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+spec = importlib.util.spec_from_file_location("backtest", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cb-trading-backtest.py"))
+backtest = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(backtest)
+
+SWEEP_PARAMETERS = {
+    "buy_percentage": float,
+    "sell_percentage": float,
+    "rebuy_discount": float,
+    "volatility_window": int,
+    "trend_window": int,
+    "macd_short_window": int,
+    "macd_long_window": int,
+    "macd_signal_window": int,
+    "rsi_period": int,
+    "trail_percent": float,
+}
+DECISION_ONLY = ("trail_percent",)  # Shown in the logs, never used in a decision
+INDICATOR_KEYS = ("volatility_window", "trend_window", "macd_short_window", "macd_long_window", "macd_signal_window", "rsi_period")
+RANKINGS = ("return_pct", "realized_pnl", "return_over_drawdown")
+
+
+def parse_values(name, spec):
+    """Values of one --param: "a,b,c" or an inclusive range "start:stop:step"."""
+    cast = SWEEP_PARAMETERS[name]
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return sorted({cast(round(start + i * step, 10)) for i in range(max(count, 0))})
+    return [cast(value) for value in spec.split(",") if value.strip()]
+
+
+def is_valid(settings):
+    return (settings["macd_short_window"] < settings["macd_long_window"]
+            and min(settings[key] for key in INDICATOR_KEYS) >= 1)
+
+
+def candidates(base, grid, sample=None, seed=None):
+    """Coin settings to evaluate: every grid combination, or `sample` random ones."""
+    names = list(grid)
+    if sample:
+        rng = random.Random(seed)
+        total = 1
+        for name in names:
+            total *= len(grid[name])
+        combos, seen = [], set()
+        attempts = 0
+        while len(combos) < min(sample, total) and attempts < sample * 20:
+            attempts += 1
+            combo = tuple(rng.choice(grid[name]) for name in names)
+            if combo not in seen:
+                seen.add(combo)
+                combos.append(combo)
+    else:
+        combos = itertools.product(*(grid[name] for name in names))
+
+    settings_list = []
+    for combo in combos:
+        settings = {**base, **dict(zip(names, combo))}
+        if is_valid(settings):
+            settings_list.append(settings)
+    return settings_list
+
+
+# --- Shared price arrays -------------------------------------------------------
+
+def share_prices(raw):
+    """Copy {symbol: (timestamps, prices)} into one shared memory block. Returns the block and its layout."""
+    total = sum(len(prices) for _, prices in raw.values())
+    block = shared_memory.SharedMemory(create=True, size=max(1, 2 * total * 8))
+    shared = np.ndarray((2, total), dtype=float, buffer=block.buf)
+    layout = {}
+    offset = 0
+    for symbol, (timestamps, prices) in raw.items():
+        shared[0, offset:offset + len(prices)] = timestamps
+        shared[1, offset:offset + len(prices)] = prices
+        layout[symbol] = (offset, len(prices))
+        offset += len(prices)
+    return block, layout, total
+
+
+worker = {}  # Per worker process: shared block, read-only price views, settings and the indicator cache
+
+
+def init_worker(block_name, total, layout, options):
+    block = shared_memory.SharedMemory(name=block_name)
+    shared = np.ndarray((2, total), dtype=float, buffer=block.buf)
+    shared.flags.writeable = False
+    worker.update(
+        block=block,
+        prices={symbol: (shared[0, offset:offset + length], shared[1, offset:offset + length])
+                for symbol, (offset, length) in layout.items()},
+        options=options,
+        cache_key=None,
+        cache=None,
+    )
+
+
+def evaluate(task):
+    """Backtest one (symbol, coin settings) candidate in a worker process."""
+    symbol, settings = task
+    options = worker["options"]
+    key = (symbol,) + tuple(settings[name] for name in INDICATOR_KEYS)
+    if key != worker["cache_key"]:
+        timestamps, prices = worker["prices"][symbol]
+        worker["cache"] = backtest.prepare_series(settings, timestamps, prices, options["bucket_seconds"])
+        worker["cache_key"] = key
+
+    result = backtest.run_backtest({symbol: worker["cache"]}, {symbol: settings},
+                                   options["buy_percentage"], options["sell_percentage"],
+                                   quote=options["quote"], fee=options["fee"], slippage_bps=options["slippage_bps"])
+    stats = result["symbols"][symbol]
+    return_pct = (result["final_equity"] / options["quote"] - 1) * 100
+    return {
+        "symbol": symbol,
+        "settings": settings,
+        "trades": stats["buys"] + stats["sells"],
+        "return_pct": return_pct,
+        "realized_pnl": stats["realized_pnl"],
+        "max_drawdown": result["max_drawdown"],
+        "return_over_drawdown": return_pct / max(result["max_drawdown"] * 100, 1e-9),
+        "fees": stats["fees"],
+    }
+
+
+def sweep(raw, tasks, options, workers=None):
+    """Evaluate all (symbol, settings) tasks on a process pool; the prices are shared, not copied."""
+    # Neighbouring tasks with the same indicator windows reuse the worker's prepared series
+    tasks = sorted(tasks, key=lambda task: (task[0],) + tuple(task[1][name] for name in INDICATOR_KEYS))
+    workers = workers or os.cpu_count() or 1
+    block, layout, total = share_prices(raw)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(block.name, total, layout, options)) as pool:
+            chunksize = max(1, min(64, len(tasks) // (workers * 4) or 1))
+            return list(pool.map(evaluate, tasks, chunksize=chunksize))
+    finally:
+        block.close()
+        block.unlink()
+
+
+def coin_block(symbol, settings, base, names):
+    """The coin's config.json entry with the swept values filled in."""
+    return {symbol: {**base, **{name: settings[name] for name in names}}}
+
+
+def main(args):
+    config = backtest.load_config(args.config)
+    coins_config = config.get("coins", {})
+    wanted = args.symbols.split(",") if args.symbols else [s for s, settings in coins_config.items() if settings.get("enabled", False)]
+    bucket_seconds = config.get("history", {}).get("bucket_seconds", 30) if args.bucket_seconds is None else args.bucket_seconds
+
+    grid = {}
+    for param in args.param:
+        name, _, spec = param.partition("=")
+        if name not in SWEEP_PARAMETERS:
+            raise SystemExit(f"Unknown parameter {name!r}, choose from: {', '.join(SWEEP_PARAMETERS)}")
+        if name in DECISION_ONLY:
+            print(f"⚠️ {name} does not change any buy/sell decision (it only sets the trailing stop shown in the logs). Keeping the configured value.")
+            continue
+        grid[name] = parse_values(name, spec)
+    if not grid:
+        raise SystemExit("Nothing to sweep, add at least one --param name=values")
+
+    started = time.perf_counter()
+    if args.csv or args.parquet:
+        raw = backtest.load_prices_file(args.csv or args.parquet, set(wanted))
+    else:
+        raw = backtest.load_prices_db(config["database"], wanted, args.start, args.end)
+    raw = {symbol: prices for symbol, prices in raw.items() if symbol in coins_config}
+
+    bases = {symbol: {"trail_percent": 0.5, **coins_config[symbol]} for symbol in raw}
+    tasks = [(symbol, settings) for symbol in raw for settings in candidates(bases[symbol], grid, args.random, args.seed)]
+    options = {
+        "bucket_seconds": bucket_seconds,
+        "buy_percentage": config.get("buy_percentage", 10),
+        "sell_percentage": config.get("sell_percentage", 10),
+        "quote": args.quote,
+        "fee": args.fee,
+        "slippage_bps": args.slippage_bps,
+    }
+    loaded = time.perf_counter()
+    results = sweep(raw, tasks, options, args.workers)
+    finished = time.perf_counter()
+
+    best_blocks = {}
+    for symbol in raw:
+        ranked = sorted((r for r in results if r["symbol"] == symbol), key=lambda r: r[args.rank_by], reverse=True)
+        if not ranked:
+            continue
+        best_blocks.update(coin_block(symbol, ranked[0]["settings"], coins_config[symbol], grid))
+
+        if args.json:
+            for rank, result in enumerate(ranked[:args.top], 1):
+                print(json.dumps({"rank": rank, **{k: v for k, v in result.items() if k != "settings"},
+                                  "params": {name: result["settings"][name] for name in grid}}))
+            continue
+
+        print(f"\n🏆 {symbol}: top {min(args.top, len(ranked))} of {len(ranked)} (ranked by {args.rank_by})")
+        header = " ".join(f"{name:>18}" for name in grid)
+        print(f"{'#':>3} {header} {'Trades':>7} {'Return %':>9} {'Max DD %':>9} {'Realized':>10}")
+        for rank, result in enumerate(ranked[:args.top], 1):
+            values = " ".join(f"{result['settings'][name]:>18g}" for name in grid)
+            print(f"{rank:>3} {values} {result['trades']:>7} {result['return_pct']:>9.2f} "
+                  f"{result['max_drawdown'] * 100:>9.2f} {result['realized_pnl']:>10.2f}")
+
+    if not args.json:
+        print(f"\n⏱️ {len(tasks)} backtests on {args.workers or os.cpu_count()} workers in {finished - loaded:.1f}s "
+              f"({len(tasks) / max(finished - loaded, 1e-9):.1f}/sec), prices loaded in {loaded - started:.1f}s")
+        print("\n📋 Best settings (paste into the \"coins\" block of config.json):")
+        print(json.dumps(best_blocks, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(best_blocks, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.json", help="bot configuration (coins, percentages, database)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", help="symbol,timestamp,price rows instead of the database")
+    source.add_argument("--parquet", help="Parquet file with symbol, timestamp and price columns")
+    parser.add_argument("--symbols", help="comma separated symbols (default: enabled coins)")
+    parser.add_argument("--start", help="first timestamp to load from the database")
+    parser.add_argument("--end", help="load database rows before this timestamp")
+    parser.add_argument("--bucket-seconds", type=float, help="long-term MA bucket size (default: history.bucket_seconds)")
+    parser.add_argument("--param", action="append", default=[], help="name=v1,v2,... or name=start:stop:step (repeatable)")
+    parser.add_argument("--random", type=int, help="evaluate this many random combinations instead of the full grid")
+    parser.add_argument("--seed", type=int, help="random seed for --random")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all CPU cores)")
+    parser.add_argument("--quote", type=float, default=1000.0, help="starting USDC balance per backtest")
+    parser.add_argument("--fee", type=float, default=0.006, help="fee as a fraction of the order notional")
+    parser.add_argument("--slippage-bps", type=float, default=0.0, help="fill price moved against the order, in basis points")
+    parser.add_argument("--rank-by", choices=RANKINGS, default="return_pct", help="ranking metric")
+    parser.add_argument("--top", type=int, default=20, help="rows per symbol in the ranked table")
+    parser.add_argument("--output", help="write the best coin config block(s) to this JSON file")
+    parser.add_argument("--json", action="store_true", help="emit the ranked results as one JSON object per line")
+    main(parser.parse_args())
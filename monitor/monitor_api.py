@@ -1,4 +1,5 @@
 # monitor_api.py
+import json
 from fastapi import APIRouter, HTTPException
 from fastapi import Body
 from db import get_db_connection, load_config
@@ -202,7 +203,12 @@ def create_manual_command(
             cur.execute("""
                 INSERT INTO manual_commands (symbol, action, amount)
                 VALUES (%s, %s, %s)
+                RETURNING id
             """, (symbol, action, amount))
+            command_id = cur.fetchone()[0]
+            # Wake up the bot (delivered on commit); it still polls as a fallback
+            cur.execute("SELECT pg_notify('manual_commands', %s)",
+                        (json.dumps({"id": command_id, "symbol": symbol, "action": action}),))
             conn.commit()
         return { "status": "success" }
     except Exception as e:
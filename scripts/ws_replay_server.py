@@ -0,0 +1,197 @@
+"""
+Local stand-in for the Coinbase Advanced Trade WebSocket ticker feed.
+
+Replays recorded feed messages (one JSON message per line, e.g. the file written
+by cb-trading-db.py with `market_data.record_path` set) or, with --synthetic,
+generates random-walk ticks. Each client gets its own sequence_num counter, only
+the products it subscribed to and, once it subscribes to `heartbeats`, one
+heartbeat per second, just like the real feed. Subscriptions can change at any
+time during the connection.
+
+Point the bot at it with:
+    "market_data": {"mode": "websocket", "ws_url": "ws://127.0.0.1:8765"}
+
+Usage:
+    python scripts/ws_replay_server.py --file ticks.jsonl [--speed 10] [--loop]
+    python scripts/ws_replay_server.py --synthetic ETH-USDC,XRP-USDC [--interval 0.5]
+
+Fault injection to exercise the bot's recovery paths:
+    --skip-every N        skip a sequence number every N messages (gap detection)
+    --disconnect-after N  drop the connection after N messages (reconnect/resubscribe)
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timezone
+
+from aiohttp import WSMsgType, web
+
+
+def utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value.rstrip("Z")[:26]).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def load_recording(path):
+    """Return [(epoch_seconds, tickers)] for every ticker message in the recording."""
+    recording = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            message = json.loads(line)
+            if message.get("channel") != "ticker":
+                continue
+            tickers = [t for event in message.get("events", []) for t in event.get("tickers", [])]
+            if tickers:
+                recording.append((parse_time(message.get("timestamp")), tickers))
+    return recording
+
+
+async def recorded_ticks(recording, speed, loop):
+    while True:
+        previous = None
+        for timestamp, tickers in recording:
+            if previous is not None and timestamp is not None:
+                await asyncio.sleep(max(0.0, timestamp - previous) / speed)
+            previous = timestamp if timestamp is not None else previous
+            yield tickers
+        if not loop:
+            return
+
+
+async def synthetic_ticks(product_ids, interval):
+    prices = {product_id: 100.0 for product_id in product_ids}
+    while True:
+        await asyncio.sleep(interval)
+        tickers = []
+        for product_id in product_ids:
+            prices[product_id] *= 1 + random.gauss(0, 0.002)
+            price = prices[product_id]
+            tickers.append({
+                "type": "ticker",
+                "product_id": product_id,
+                "price": f"{price:.6f}",
+                "best_bid": f"{price * 0.9995:.6f}",
+                "best_ask": f"{price * 1.0005:.6f}",
+            })
+        yield tickers
+
+
+def make_app(args):
+    recording = load_recording(args.file) if args.file else None
+    synthetic = args.synthetic.split(",") if args.synthetic else []
+
+    async def feed(request):
+        ws = web.WebSocketResponse(heartbeat=15)
+        await ws.prepare(request)
+        subscribed = set()
+        heartbeats = False
+        ticker_subscribed = asyncio.Event()
+        send_lock = asyncio.Lock()  # Keeps sequence_num in wire order across the tasks below
+        sequence = 0
+
+        async def send(message, skip=0):
+            nonlocal sequence
+            async with send_lock:
+                sequence += skip  # Simulate lost messages
+                message["sequence_num"] = sequence
+                sequence += 1
+                await ws.send_json(message)
+
+        async def read_requests():
+            """Handle (un)subscribe messages for the whole connection. Returns when the client goes away."""
+            nonlocal heartbeats
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    request_data = json.loads(msg.data)
+                except json.JSONDecodeError:
+                    request_data = {}
+                channel = request_data.get("channel")
+                subscribe = request_data.get("type") == "subscribe"
+                if request_data.get("type") not in ("subscribe", "unsubscribe") or channel not in ("ticker", "heartbeats"):
+                    await send({"type": "error", "message": f"unsupported request: {msg.data}"})
+                    continue
+                if channel == "heartbeats":
+                    heartbeats = subscribe
+                elif subscribe:
+                    subscribed.update(request_data.get("product_ids", []))
+                else:
+                    subscribed.difference_update(request_data.get("product_ids", []))
+                if subscribed:
+                    ticker_subscribed.set()
+                print(f"▶️ Client subscriptions: ticker {sorted(subscribed)}, heartbeats {'on' if heartbeats else 'off'}")
+                current = {"ticker": sorted(subscribed)}
+                if heartbeats:
+                    current["heartbeats"] = ["heartbeats"]
+                await send({"channel": "subscriptions", "timestamp": utc_now(), "events": [{"subscriptions": current}]})
+
+        async def send_heartbeats():
+            """One heartbeats message per second while subscribed, like the real feed."""
+            counter = 0
+            while True:
+                await asyncio.sleep(1)
+                if heartbeats:
+                    counter += 1
+                    await send({"channel": "heartbeats", "timestamp": utc_now(),
+                                "events": [{"current_time": utc_now(), "heartbeat_counter": counter}]})
+
+        async def stream_ticks():
+            await ticker_subscribed.wait()  # Start the replay once the client asked for tickers
+            source = recorded_ticks(recording, args.speed, args.loop) if recording else synthetic_ticks(synthetic, args.interval)
+            sent = 0
+            async for tickers in source:
+                tickers = [t for t in tickers if t.get("product_id") in subscribed]
+                if not tickers:
+                    continue
+                sent += 1
+                skip = 1 if args.skip_every and sent % args.skip_every == 0 else 0
+                await send({"channel": "ticker", "timestamp": utc_now(),
+                            "events": [{"type": "update", "tickers": tickers}]}, skip)
+                if args.disconnect_after and sent >= args.disconnect_after:
+                    print("✂️ Dropping client connection")
+                    return
+
+        reader = asyncio.create_task(read_requests())
+        streamer = asyncio.create_task(stream_ticks())
+        heartbeat = asyncio.create_task(send_heartbeats())
+        try:
+            # The stream ends when the client closes, the replay runs out or --disconnect-after hits
+            await asyncio.wait({reader, streamer, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (reader, streamer, heartbeat):
+                task.cancel()
+            await asyncio.gather(reader, streamer, heartbeat, return_exceptions=True)
+        print("⏹️ Client connection closed")
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/", feed)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="recorded feed messages (JSONL)")
+    source.add_argument("--synthetic", help="comma separated product ids to simulate, e.g. ETH-USDC,XRP-USDC")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier for recordings")
+    parser.add_argument("--loop", action="store_true", help="restart the recording when it ends")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between synthetic ticks")
+    parser.add_argument("--skip-every", type=int, default=0, help="skip a sequence number every N messages")
+    parser.add_argument("--disconnect-after", type=int, default=0, help="drop the connection after N messages")
+    args = parser.parse_args()
+    web.run_app(make_app(args), host=args.host, port=args.port)
@@ -0,0 +1,205 @@
+"""
+Buy/sell rules of cb-trading-db.py, free of network, database and logging.
+
+process_symbol() in cb-trading-db.py and the backtester (cb-trading-backtest.py)
+both call evaluate_trade(), so a backtest replays exactly the decisions the live
+bot would take for the same prices and indicator values.
+"""
+
+
+def buy_quote_cost(quote_balance, buy_percentage):
+    """Quote currency (USDC) to spend on a buy: `buy_percentage`% of the available balance."""
+    return round((buy_percentage / 100) * quote_balance, 2)
+
+
+def sell_order_amount(holdings, sell_percentage, precision):
+    """Amount to sell: `sell_percentage`% of the holdings, rounded, never more than is available."""
+    sell_amount = round((sell_percentage / 100) * holdings, precision)
+    safe_margin = 10 ** -precision  # Smallest allowed unit (e.g., 0.000001 for 6 decimals)
+    return min(sell_amount, holdings - safe_margin)  # Avoid over-selling
+
+
+def evaluate_trade(state, confirmation, settings, current_price, indicators, actual_buy_price, holdings, quote_balance, now):
+    """Decide whether to buy, sell or hold `current_price`.
+
+    `state` is the symbol's crypto_data record (initial_price, rising_streak,
+    falling_streak, last_buy_time, manual_cmd) and `confirmation` its
+    macd_confirmation counters. Both are updated in place exactly like the live
+    loop does: the MACD confirmation decays, and initial_price drifts towards the
+    long-term MA (uptrend) or the current price (downtrend, no holdings).
+
+    `indicators` holds the values produced by update_indicators() plus "stoch_k"
+    and "stoch_d". `now` is the tick time in epoch seconds.
+
+    Returns a dict with "action" ("BUY", "SELL" or None), "in_range" (price close
+    to the moving average), "initial_price_adjusted" (("up" or "down", old, new) or None) and the
+    intermediate values and conditions used for logging.
+    """
+    factor = min(1.5, max(0.5, 1 + abs(indicators["volatility"])))  # Cap extreme changes
+    dynamic_buy_threshold = settings["buy_percentage"] * factor
+    dynamic_sell_threshold = settings["sell_percentage"] * factor
+    initial_price = state["initial_price"]
+    price_change = ((current_price - initial_price) / initial_price) * 100
+
+    if actual_buy_price is not None:
+        expected_buy_price = actual_buy_price
+        expected_sell_price = actual_buy_price * (1 + dynamic_sell_threshold / 100)
+    else:
+        expected_buy_price = initial_price * (1 + dynamic_buy_threshold / 100)
+        expected_sell_price = initial_price * (1 + dynamic_sell_threshold / 100)
+
+    # Only trade when the price is close to the moving average (or on a manual command)
+    moving_avg = indicators["moving_avg"]
+    manual_cmd = state.get("manual_cmd")
+    if not ((moving_avg and abs(current_price - moving_avg) < (0.05 * moving_avg)) or manual_cmd is not None):
+        return {
+            "action": None,
+            "in_range": False,
+            "initial_price_adjusted": None,
+            "price_change": price_change,
+            "dynamic_buy_threshold": dynamic_buy_threshold,
+            "dynamic_sell_threshold": dynamic_sell_threshold,
+            "expected_buy_price": expected_buy_price,
+            "expected_sell_price": expected_sell_price,
+        }
+
+    macd_line = indicators["macd_line"]
+    signal_line = indicators["signal_line"]
+    rsi = indicators["rsi"]
+    long_term_ma = indicators["long_term_ma"]
+    k = indicators["stoch_k"]
+    d = indicators["stoch_d"]
+    bollinger_mid, bollinger_upper, bollinger_lower = indicators["bollinger"]
+
+    # MACD Buy Signal: MACD line crosses above Signal line
+    macd_buy_signal = macd_line is not None and signal_line is not None and macd_line > signal_line
+
+    # RSI Buy Signal: RSI is below 35 (oversold)
+    rsi_buy_signal = rsi is not None and rsi < 35
+
+    # MACD Sell Signal: MACD line crosses below Signal line
+    macd_sell_signal = macd_line is not None and signal_line is not None and macd_line < signal_line
+
+    # RSI Sell Signal: RSI is above 70 (overbought)
+    rsi_sell_signal = rsi is not None and rsi > 65
+
+    # MACD Confirmation Rule with decay instead of full reset
+    if macd_buy_signal:
+        confirmation["buy"] += 1
+        confirmation["sell"] = max(0, confirmation["sell"] - 1)
+    elif macd_sell_signal:
+        confirmation["sell"] += 1
+        confirmation["buy"] = max(0, confirmation["buy"] - 1)
+    else:
+        confirmation["buy"] = max(0, confirmation["buy"] - 1)
+        confirmation["sell"] = max(0, confirmation["sell"] - 1)
+
+    # Check how long since the last buy
+    time_since_last_buy = now - state.get("last_buy_time", 0)
+
+    initial_price_adjusted = None
+
+    # 🔥 Gradual Adjustments: Move `initial_price` 10% closer to `long_term_ma` during a sustained >5% uptrend
+    if (
+        time_since_last_buy > 900
+        and price_change >= dynamic_sell_threshold
+        and current_price > initial_price * 1.05
+        and current_price > long_term_ma  # Confirm Uptrend
+        ):
+        state["initial_price"] = 0.9 * initial_price + 0.1 * long_term_ma
+        initial_price_adjusted = ("up", initial_price, state["initial_price"])
+
+    # 🔽 Adjust Initial Price Downwards in a Sustained Downtrend (If Holdings < 1 USDC)
+    elif (
+        time_since_last_buy > 3600 and  # Time check
+        holdings * current_price < 1 and  # Holdings worth less than $1 USDC
+        current_price < initial_price * 0.95 # Prevent premature resets
+    ):
+        state["initial_price"] = 0.9 * initial_price + 0.1 * current_price  # Move closer to the current price
+        initial_price_adjusted = ("down", initial_price, state["initial_price"])
+
+    # ----------------- BUY decision -----------------
+    cond_bollinger_primary = (bollinger_lower is None or current_price < bollinger_lower)
+
+    cond_stoch_part = (k is None or d is None or (k < 0.2 and k > d))
+    cond_bollinger_stoch = ((bollinger_mid is None or current_price < bollinger_mid) and cond_stoch_part)
+
+    cond_entry_band = (cond_bollinger_primary or cond_bollinger_stoch)
+
+    cond_price_thresh = (
+        price_change <= dynamic_buy_threshold
+        and actual_buy_price is None
+    )
+
+    cond_rebuy_discount = (
+        actual_buy_price is not None
+        and current_price < actual_buy_price * (1 - settings["rebuy_discount"] / 100.0)
+    )
+
+    cond_trend = (current_price < long_term_ma)
+    cond_cooldown = (time_since_last_buy > 120)
+    cond_streak = (state.get("rising_streak", 0) > 1)
+    cond_balance = (quote_balance > 0)
+    cond_manual = (manual_cmd == "BUY")
+
+    auto_buy_condition = (
+        cond_entry_band
+        and (cond_price_thresh or cond_rebuy_discount)
+        and cond_trend
+        and cond_cooldown
+        and cond_streak
+        and cond_balance
+    )
+
+    # ----------------- SELL decision -----------------
+    sell_condition = (
+        ((
+            (
+                macd_sell_signal
+                and confirmation["sell"] >= 3  # ✅ At least 3 positives signals
+                and (k is None or d is None or (k > 0.8 and k < d))  # ✅ Overbought and bearish cross
+                and (bollinger_upper is None or current_price > bollinger_mid)  # ✅ Bollinger confirms price is still warm
+            )
+            or
+            (
+                (bollinger_upper is not None and current_price > bollinger_upper)  # ✅ Bollinger confirms price is hot
+            )
+        )
+        and actual_buy_price is not None  # ✅ Ensure actual_buy_price is valid before using it
+        and current_price > actual_buy_price * (1 + (dynamic_sell_threshold / 100))  # ✅ Profit percentage wanted based on sell threshold
+        and state.get("falling_streak", 0) > 1  # ✅ Ensure we’re not in a rising streak
+        and holdings > 0  # ✅ Ensure we have balance
+        )
+        or manual_cmd == "SELL"  # Manual sell command
+    )
+
+    if auto_buy_condition or cond_manual:
+        action = "BUY"
+    elif sell_condition:
+        action = "SELL"
+    else:
+        action = None
+
+    return {
+        "action": action,
+        "in_range": True,
+        "initial_price_adjusted": initial_price_adjusted,
+        "price_change": price_change,
+        "dynamic_buy_threshold": dynamic_buy_threshold,
+        "dynamic_sell_threshold": dynamic_sell_threshold,
+        "expected_buy_price": expected_buy_price,
+        "expected_sell_price": expected_sell_price,
+        "macd_buy_signal": macd_buy_signal,
+        "rsi_buy_signal": rsi_buy_signal,
+        "macd_sell_signal": macd_sell_signal,
+        "rsi_sell_signal": rsi_sell_signal,
+        "time_since_last_buy": time_since_last_buy,
+        "cond_entry_band": cond_entry_band,
+        "cond_price_thresh": cond_price_thresh,
+        "cond_rebuy_discount": cond_rebuy_discount,
+        "cond_trend": cond_trend,
+        "cond_cooldown": cond_cooldown,
+        "cond_streak": cond_streak,
+        "cond_balance": cond_balance,
+        "cond_manual": cond_manual,
+    }